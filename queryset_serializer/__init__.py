@@ -4,6 +4,8 @@ __all__ = [
     "QuerySetSerializer",
 ]
 
+default_app_config = "queryset_serializer.apps.QuerySetSerializerConfig"
+
 __title__ = "queryset-serializer"
 __version__ = "1.0.4"
 __author__ = "Maurice Benink"
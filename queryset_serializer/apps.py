@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class QuerySetSerializerConfig(AppConfig):
+    name = 'queryset_serializer'
+    verbose_name = 'QuerySet serializer'
+
+    def ready(self):
+        # the materialized serializers register themselves when their module is imported, the changes of their
+        # objects are only tracked in processes that imported them
+        from queryset_serializer.materialized import autodiscover
+        autodiscover()
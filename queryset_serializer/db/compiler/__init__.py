@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Prefetch
+from django.db.models.lookups import In
+from django.db.models.query import ModelIterable
+
+from queryset_serializer.db.models import (get_prefetch_queryset,
+                                           is_traversed,
+                                           set_prefetch_queryset)
+
+
+class SQLTemplate:
+    """
+    The compiled sql of a prefetch query, the query of the next parents only differs in the values of the IN
+    """
+    def __init__(self, sql, prefix, suffix, state):
+        """
+
+        :param sql: str
+        :param prefix: tuple, the parameters before the IN
+        :param suffix: tuple, the parameters after the IN
+        :param state: dict, the attributes of the compiler that the iterables read (select, klass_info, ...)
+        """
+        self.sql = sql
+        self.prefix = prefix
+        self.suffix = suffix
+        self.state = state
+
+    @classmethod
+    def from_compiler(cls, compiler, in_sql, in_params):
+        """
+        :param compiler: SQLCompiler
+        :param in_sql: str, the compiled IN lookup
+        :param in_params: list, the parameters of the IN lookup
+        :return: tuple[SQLTemplate | None, tuple[str, list]], None when the IN can't be found back in the sql
+        """
+        sql, params = compiler.as_sql()
+        state = {
+            name: getattr(compiler, name)
+            for name in ('select', 'klass_info', 'annotation_col_map', 'col_count', 'has_extra_select')
+        }
+        # a literal %% would make counting the placeholders before the IN unreliable
+        if sql.count(in_sql) != 1 or '%%' in sql:
+            return None, (sql, params)
+        start = sql[:sql.index(in_sql)].count('%s')
+        end = start + len(in_params)
+        if tuple(params[start:end]) != tuple(in_params):
+            return None, (sql, params)
+        return cls(sql, tuple(params[:start]), tuple(params[end:]), state), (sql, params)
+
+    def apply(self, compiler, in_params):
+        """
+        Let the compiler run the template instead of compiling the query
+        :param compiler: SQLCompiler
+        :param in_params: list
+        :return: SQLCompiler
+        """
+        compiler.__dict__.update(self.state)
+        params = self.prefix + tuple(in_params) + self.suffix
+        compiler.as_sql = lambda *args, **kwargs: (self.sql, params)
+        return compiler
+
+
+class SQLTemplateCache:
+    """
+    Least recently used cache of the sql templates, keyed by serializer / lookup, database and the compiled IN
+    (so by the amount of parameters of the IN)
+    """
+    def __init__(self, max_size=512):
+        """
+
+        :param max_size: int
+        """
+        self.max_size = max_size
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        :param key: tuple
+        :return: SQLTemplate | None
+        """
+        with self._lock:
+            template = self.templates.get(key)
+            if template is None:
+                self.misses += 1
+                return None
+            self.templates.move_to_end(key)
+            self.hits += 1
+            return template
+
+    def set(self, key, template):
+        """
+        :param key: tuple
+        :param template: SQLTemplate
+        :return: None
+        """
+        with self._lock:
+            self.templates[key] = template
+            self.templates.move_to_end(key)
+            while len(self.templates) > self.max_size:
+                self.templates.popitem(last=False)
+
+    def clear(self):
+        """
+        :return: None
+        """
+        with self._lock:
+            self.templates.clear()
+            self.hits = self.misses = 0
+
+
+sql_templates = SQLTemplateCache()
+
+
+def get_compiler(query, using, key):
+    """
+    Get a compiler for the prefetch query that runs a cached sql template when the query has been compiled before,
+    only the IN that django adds for the parents gets compiled
+    :param query: Query
+    :param using: str
+    :param key: Hashable, the plan node of the query
+    :return: SQLCompiler | None, None when the query is not a prefetch query that can be templated
+    """
+    children = query.where.children
+    if query.where.negated or not children or not isinstance(children[-1], In):
+        return None
+    compiler = query.get_compiler(using=using)
+    try:
+        in_sql, in_params = compiler.compile(children[-1])
+    except EmptyResultSet:
+        return None
+    cache_key = (key, using, in_sql)
+    template = sql_templates.get(cache_key)
+    if template is not None:
+        return template.apply(compiler, in_params)
+    template, compiled = SQLTemplate.from_compiler(compiler, in_sql, in_params)
+    if template is not None:
+        sql_templates.set(cache_key, template)
+    # the query has just been compiled, don't let the iterable compile it again
+    compiler.as_sql = lambda *args, **kwargs: compiled
+    return compiler
+
+
+class CompiledIterableMixin:
+    """
+    Runs the prefetch query from a cached sql template, the rows become ordinary model instances.
+    Use compiled_iterable to get a subclass for a specific plan node
+    """
+    key = None
+
+    def __iter__(self):
+        query = self.queryset.query
+        compiler = get_compiler(query, self.queryset.db, self.key)
+        if compiler is not None:
+            # the query of the iterable is a clone that only this iterable uses
+            query.get_compiler = lambda *args, **kwargs: compiler
+        yield from super().__iter__()
+
+
+@lru_cache(maxsize=None)
+def compiled_iterable(iterable_class, key):
+    """
+    The iterable class is copied to every clone of a queryset, so the plan node is stored on the class
+    :param iterable_class: type[ModelIterable]
+    :param key: Hashable
+    :return: type[CompiledIterableMixin]
+    """
+    if issubclass(iterable_class, CompiledIterableMixin):
+        return iterable_class
+    return type(f'Compiled{iterable_class.__name__}', (CompiledIterableMixin, iterable_class), {'key': key})
+
+
+def compile_prefetch(prefetch, model, sender, traversed=()):
+    """
+    Give the prefetch a queryset that runs from a cached sql template. A lookup an earlier lookup already goes through
+    is fetched by that lookup, django compiles its query as usual
+    :param prefetch: str | Prefetch
+    :param model: type[models.Model], the model the prefetch starts from
+    :param sender: type, the serializer, the templates are cached per serializer and lookup
+    :param traversed: Collection[str], the levels the earlier lookups go through, see get_traversed_lookups
+    :return: str | Prefetch
+    """
+    if is_traversed(prefetch, traversed):
+        return prefetch
+    queryset = get_prefetch_queryset(prefetch, model)
+    if queryset is None or not issubclass(queryset._iterable_class, ModelIterable):
+        return prefetch
+    lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+    queryset._iterable_class = compiled_iterable(queryset._iterable_class, (sender, lookup))
+    return set_prefetch_queryset(prefetch, queryset)
@@ -0,0 +1,122 @@
+import datetime
+import hashlib
+
+from django.db.models.constants import LOOKUP_SEP
+
+from queryset_serializer.db.models import get_related_field
+
+
+class QuerySetFingerprint:
+    """
+    Fingerprint of a queryset and its relations, computed with one query per branch. Every branch gets a digest of
+    its rows per root row, a relation that moves to another root row changes the digest even though the related row
+    isn't saved. A branch with a version field only fetches the keys and the version, an update in place doesn't
+    change the keys so a branch without a version field fetches all its columns instead.
+    If the fingerprint didn't change, the serialized data didn't change
+    """
+    def __init__(self, queryset, lookups, version_fields, extra=''):
+        """
+
+        :param queryset: models.QuerySet
+        :param lookups: list[str], all relations that are serialized
+        :param version_fields: tuple[str], names of fields that change when a row changes (updated_at, version)
+        :param extra: str, will be part of the etag
+        """
+        self.queryset = queryset
+        self.lookups = lookups
+        self.version_fields = version_fields
+        self.extra = extra
+        self._aggregates = None
+
+    def _get_base_queryset(self):
+        """
+        A queryset over the same rows without ordering, a sliced queryset gets evaluated to its primary keys
+        :return: models.QuerySet
+        """
+        model = self.queryset.model
+        if self.queryset.query.low_mark or self.queryset.query.high_mark is not None:
+            return model._base_manager.using(self.queryset.db).filter(
+                pk__in=list(self.queryset.values_list('pk', flat=True))
+            )
+        return self.queryset.order_by()
+
+    def _get_version_field(self, model):
+        """
+        :param model: type[models.Model]
+        :return: str | None
+        """
+        names = {field.name for field in model._meta.concrete_fields}
+        return next((name for name in self.version_fields if name in names), None)
+
+    def _get_branch(self, base, model, lookup=None):
+        """
+        :param base: models.QuerySet, see _get_base_queryset
+        :param model: type[models.Model], the model at the end of the lookup
+        :param lookup: str | None, None for the root
+        :return: dict[str, object]
+        """
+        prefix = f'{lookup}{LOOKUP_SEP}' if lookup else ''
+        version_field = self._get_version_field(model)
+        if version_field is not None:
+            columns = [f'{prefix}pk', f'{prefix}{version_field}']
+        else:
+            columns = [f'{prefix}{field.name}' for field in model._meta.concrete_fields]
+        # the root key is part of every row, a relation that moves to another root row changes the digest as well
+        rows = base.values_list('pk', *columns).order_by('pk', f'{prefix}pk')
+        digest, count, versions = hashlib.sha1(), 0, []
+        for row in rows.iterator():
+            digest.update(repr(row).encode('utf-8'))
+            count += 1
+            if version_field is not None and row[-1] is not None:
+                versions += [row[-1]]
+        branch = {'count': count, 'rows': digest.hexdigest()}
+        if version_field is not None:
+            branch['version'] = max(versions, default=None)
+        return branch
+
+    def aggregates(self):
+        """
+        The aggregates of every branch, the root is stored under None
+        :return: dict[str | None, dict[str, object]]
+        """
+        if self._aggregates is None:
+            base = self._get_base_queryset()
+            self._aggregates = {None: self._get_branch(base, base.model)}
+            for lookup in self.lookups:
+                field = get_related_field(base.model, lookup)
+                # a GenericForeignKey can't be joined, these are not part of the fingerprint (see complete)
+                if field is None:
+                    continue
+                self._aggregates[lookup] = self._get_branch(base, field.related_model, lookup)
+        return self._aggregates
+
+    @property
+    def complete(self):
+        """
+        A GenericForeignKey can't be joined, when the serializer uses one a change of its objects doesn't change the
+        fingerprint
+        :return: bool
+        """
+        return all(get_related_field(self.queryset.model, lookup) is not None for lookup in self.lookups)
+
+    @property
+    def etag(self):
+        """
+        :return: str
+        """
+        value = repr((self.extra, sorted(
+            (lookup or '', sorted(aggregates.items())) for lookup, aggregates in self.aggregates().items()
+        )))
+        return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+    @property
+    def last_modified(self):
+        """
+        The highest datetime version of all branches, None when a branch has no datetime version (its changes
+        wouldn't be newer than the version of the others)
+        :return: datetime.datetime | None
+        """
+        versions = [aggregates.get('version') for aggregates in self.aggregates().values()]
+        if not versions or not all(isinstance(version, datetime.datetime) for version in versions):
+            return None
+        return max(versions)
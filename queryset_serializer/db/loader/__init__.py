@@ -0,0 +1,280 @@
+from django.core import exceptions
+from django.db import models
+from django.db.models.constants import LOOKUP_SEP
+
+from queryset_serializer.db.models import get_lookup_field
+
+
+class RelationLoader:
+    """
+    Loads `to one` relations at the end of prefetch branches. Instead of one query per branch, the keys of every
+    branch that points to the same model get collected and fetched with a single query per model.
+    The fetched instances are shared between all branches
+    """
+    def __init__(self, nodes, prefix=''):
+        """
+
+        :param nodes: list[RelationNode], the `to one` leaf nodes that should be loaded
+        :param prefix: str, prefix used on the to_attr of the prefetched relations
+        """
+        self.nodes = nodes
+        self.prefix = prefix
+
+    def _get_related(self, obj, name):
+        """
+        Get the related object(s) of a relation, prefers the prefetched to_attr over the relation itself
+        :param obj: models.Model
+        :param name: str
+        :return: list[models.Model]
+        """
+        if self.prefix and hasattr(obj, self.prefix + name):
+            value = getattr(obj, self.prefix + name)
+        else:
+            try:
+                value = getattr(obj, name)
+            except exceptions.ObjectDoesNotExist:
+                return []
+        if isinstance(value, models.Manager):
+            value = value.all()
+        if value is None:
+            return []
+        return list(value) if isinstance(value, (list, tuple, models.QuerySet)) else [value]
+
+    def _get_parents(self, instances, path):
+        """
+        Walk the path and collect all instances that hold the last relation of the path
+        :param instances: list[models.Model]
+        :param path: tuple[str]
+        :return: list[models.Model]
+        """
+        for name in path:
+            instances = [related for obj in instances for related in self._get_related(obj, name)]
+        return instances
+
+    def load(self, instances):
+        """
+        Load all the nodes for the given instances
+        :param instances: list[models.Model]
+        :return: list[models.Model]
+        """
+        # {(model, target_field, database): {'keys': set, 'parents': [(field, parent)]}}
+        batches = {}
+        for node in self.nodes:
+            parents = self._get_parents(instances, node.path[:-1])
+            if not parents:
+                continue
+            field = parents[0]._meta.get_field(node.name)
+            if not (field.many_to_one or field.one_to_one) or not field.concrete:
+                # reverse `to one` relations can not be batched by key, prefetch these the regular way
+                models.prefetch_related_objects(parents, models.Prefetch(
+                    node.name, queryset=field.related_model._default_manager.using(parents[0]._state.db)
+                ))
+                continue
+            for parent in parents:
+                if field.is_cached(parent):
+                    continue
+                batch = batches.setdefault((field.related_model, field.target_field, parent._state.db), {
+                    'keys': set(), 'parents': []
+                })
+                value = getattr(parent, field.attname)
+                if value is not None:
+                    batch['keys'].add(value)
+                batch['parents'] += [(field, parent)]
+
+        for (model, target_field, database), batch in batches.items():
+            related = {
+                getattr(obj, target_field.attname): obj for obj in model._base_manager.using(database).filter(**{
+                    f'{target_field.name}__in': batch['keys']
+                })
+            } if batch['keys'] else {}
+            for field, parent in batch['parents']:
+                field.set_cached_value(parent, related.get(getattr(parent, field.attname)))
+        return instances
+
+
+class GenericRelationLoader(RelationLoader):
+    """
+    Loads GenericForeignKey relations. The keys get grouped by content type and every content type is fetched with
+    one query, prepare can apply the select / prefetch plan of the serializer used for that model
+    """
+    def __init__(self, nodes, prefix='', prepare=None):
+        """
+
+        :param nodes: list[RelationNode], nodes with RelationNode.generic set
+        :param prefix: str, prefix used on the to_attr of the prefetched relations
+        :param prepare: Callable[[serializer_class, models.QuerySet], Iterable[models.Model]]
+        """
+        super().__init__(nodes, prefix)
+        self.prepare = prepare
+
+    def load(self, instances):
+        """
+        Load all the generic nodes for the given instances
+        :param instances: list[models.Model]
+        :return: list[models.Model]
+        """
+        # imported here, contenttypes is only required when generic relations are used
+        from django.contrib.contenttypes.models import ContentType
+
+        # {(content_type_id, database, node): {'keys': set, 'parents': [(field, parent)]}}
+        batches = {}
+        for node in self.nodes:
+            parents = self._get_parents(instances, node.path[:-1])
+            if not parents:
+                continue
+            field = parents[0]._meta.get_field(node.name)
+            ct_attname = parents[0]._meta.get_field(field.ct_field).get_attname()
+            for parent in parents:
+                content_type_id, key = getattr(parent, ct_attname), getattr(parent, field.fk_field)
+                if content_type_id is None or key is None or field.is_cached(parent):
+                    continue
+                batch = batches.setdefault((content_type_id, parent._state.db, node), {'keys': set(), 'parents': []})
+                batch['keys'].add(key)
+                batch['parents'] += [(field, parent)]
+
+        for (content_type_id, database, node), batch in batches.items():
+            # get_for_id is served from the ContentType cache
+            model = ContentType.objects.db_manager(database).get_for_id(content_type_id).model_class()
+            if model is None:
+                continue
+            queryset = model._base_manager.using(database).filter(pk__in=batch['keys'])
+            serializer_class = node.generic.get(model)
+            if serializer_class is not None and self.prepare is not None:
+                queryset = self.prepare(serializer_class, queryset)
+            related = {obj.pk: obj for obj in queryset}
+            for field, parent in batch['parents']:
+                field.set_cached_value(parent, related.get(model._meta.pk.to_python(getattr(parent, field.fk_field))))
+        return instances
+
+
+def column_values_attr(name):
+    """
+    The private attribute ColumnRelationLoader stores the column values of a relation under
+    :param name: str
+    :return: str
+    """
+    return f'_column_values_{name}'
+
+
+def get_column_values(instance, name):
+    """
+    :param instance: object
+    :param name: str
+    :return: list[RelatedValues] | None, None when the relation was not loaded as columns
+    """
+    return getattr(instance, '__dict__', {}).get(column_values_attr(name))
+
+
+class RelatedValues:
+    """
+    Stand-in for a related instance of which only some columns are fetched
+    """
+    def __init__(self, values):
+        """
+
+        :param values: dict[str, object], the fetched columns and pk
+        """
+        self.__dict__.update(values)
+
+    def __repr__(self):
+        return f'<RelatedValues pk={self.pk!r}>'
+
+
+class ColumnRelationLoader(RelationLoader):
+    """
+    Loads `many` relations of which only some columns (usually the primary key) are serialized. The columns are
+    fetched with one values_list query per relation, for a ManyToMany only the through table is queried when only
+    the primary key is needed. No model instances are built, a list of RelatedValues is stored under a private
+    attribute (see column_values_attr) which only the fields of the serializer read (see ColumnValuesMixin), the
+    relation itself stays untouched
+    """
+    def _get_queryset(self, field, columns, database):
+        """
+        Get the values_list queryset (parent key, primary key, *columns) of the relation
+        :param field: models.ManyToManyField | models.ManyToOneRel | models.ManyToManyRel
+        :param columns: tuple[str]
+        :param database: str
+        :return: tuple[models.QuerySet, str, str], the queryset, the filter on the parent keys and the attname of
+            the parent key on the parent
+        """
+        related_model = field.related_model
+        ordering = [value for value in related_model._meta.ordering if isinstance(value, str) and value != '?']
+        if field.one_to_many:
+            fk = field.field
+            queryset = related_model._default_manager.using(database).values_list(
+                fk.attname, 'pk', *columns
+            ).order_by(*ordering)
+            return queryset, f'{fk.attname}__in', fk.target_field.attname
+
+        m2m = field if field.concrete else field.field
+        source, target = (m2m.m2m_field_name(), m2m.m2m_reverse_field_name()) if field.concrete else (
+            m2m.m2m_reverse_field_name(), m2m.m2m_field_name()
+        )
+        through = m2m.remote_field.through
+        source_fk, target_fk = through._meta.get_field(source), through._meta.get_field(target)
+        pk_names = {'pk', related_model._meta.pk.name, related_model._meta.pk.attname}
+        # the primary key is the foreign key on the through table, only the other columns need a join
+        values = [
+            target_fk.attname if column in pk_names else f'{target}{LOOKUP_SEP}{column}' for column in columns
+        ]
+        queryset = through._base_manager.using(database).values_list(
+            source_fk.attname, target_fk.attname, *values
+        ).order_by(*[
+            f"{'-' if value.startswith('-') else ''}{target}{LOOKUP_SEP}{value.lstrip('-')}" for value in ordering
+        ])
+        return queryset, f'{source_fk.attname}__in', source_fk.target_field.attname
+
+    @staticmethod
+    def _is_supported(field):
+        """
+        Only plain relations with a default manager that doesn't filter can be fetched without the related model
+        :param field: models.Field | models.ForeignObjectRel
+        :return: bool
+        """
+        if not (field.many_to_many or field.one_to_many) or field.related_model is None:
+            return False
+        if field.one_to_many and (field.concrete or not isinstance(field.field, models.ForeignKey)):
+            # a GenericRelation
+            return False
+        manager = type(field.related_model._default_manager)
+        return manager.get_queryset is models.Manager.get_queryset
+
+    def load(self, instances):
+        """
+        Load all the column nodes for the given instances
+        :param instances: list[models.Model]
+        :return: list[models.Model]
+        """
+        for node in self.nodes:
+            parents = self._get_parents(instances, node.path[:-1])
+            if not parents:
+                continue
+            try:
+                field = get_lookup_field(type(parents[0]), node.name, True)
+            except exceptions.FieldDoesNotExist:
+                # not a relation (a property), the serializer reads the attribute itself
+                continue
+            if not self._is_supported(field):
+                models.prefetch_related_objects(parents, node.name)
+                continue
+            # the name django stores the prefetched relation under, a relation that is already prefetched is read
+            # by the fields as usual
+            cache_name = field.field.remote_field.get_cache_name() if field.one_to_many else (
+                field.name if field.concrete else field.field.related_query_name()
+            )
+            attr = column_values_attr(node.name)
+            parents = [
+                parent for parent in parents if attr not in parent.__dict__ and
+                cache_name not in getattr(parent, '_prefetched_objects_cache', {})
+            ]
+            if not parents:
+                continue
+
+            queryset, key_filter, key_attname = self._get_queryset(field, node.columns, parents[0]._state.db)
+            keys = {getattr(parent, key_attname) for parent in parents} - {None}
+            related = {}
+            for key, pk, *values in queryset.filter(**{key_filter: keys}) if keys else []:
+                related.setdefault(key, []).append(RelatedValues(dict(zip(node.columns, values), pk=pk)))
+            for parent in parents:
+                parent.__dict__[attr] = related.get(getattr(parent, key_attname), [])
+        return instances
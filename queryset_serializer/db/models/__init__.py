@@ -1,5 +1,30 @@
-from django.db.models import Prefetch
+import copy
+import time
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Manager, Prefetch, QuerySet
 from django.db.models.constants import LOOKUP_SEP
+from django.db.models.fields.reverse_related import ForeignObjectRel
+from django.db.models.lookups import In
+from django.db.models.query import ModelIterable
+
+from queryset_serializer.signals import branch_fetched
+
+
+@lru_cache(maxsize=None)
+def prefix_lookup(lookup, prefix, to_attr=None):
+    """
+    Compute the prefixed prefetch_to and to_attr of a lookup, the lookups of a serializer are static
+    so this only has to be computed once per lookup
+    :param lookup: str
+    :param prefix: str
+    :param to_attr: str
+    :return: tuple[str, str]
+    """
+    path = lookup.split(LOOKUP_SEP)
+    to_attr = prefix + (to_attr or path[-1])
+    return LOOKUP_SEP.join([prefix + part for part in path[:-1]] + [to_attr]), to_attr
 
 
 class SerializerPrefetch(Prefetch):
@@ -34,10 +59,360 @@ class SerializerPrefetch(Prefetch):
         :return:
         """
 
-        # set the value to_attr or the last key of self.prefetch_through
-        to_attr = to_attr or self.prefetch_through.split(LOOKUP_SEP)[-1]
-        # combine every key expect the last of self.prefetch_through and apply the prefix, add the to_attr as last key
-        self.prefetch_to = LOOKUP_SEP.join(
-            [prefix + trough for trough in self.prefetch_through.split(LOOKUP_SEP)[:-1]] + [prefix + to_attr]
+        # set the value to_attr or the last key of self.prefetch_through, combine every key expect the last of
+        # self.prefetch_through and apply the prefix, add the to_attr as last key
+        self.prefetch_to, self.to_attr = prefix_lookup(self.prefetch_through, prefix, to_attr)
+
+
+class InstrumentedModelIterable(ModelIterable):
+    """
+    ModelIterable that sends the branch_fetched signal once all rows are fetched.
+    Use instrumented_iterable to get a subclass for a specific serializer / lookup
+    """
+    sender = None
+    lookup = None
+
+    def __iter__(self):
+        start, rows = time.perf_counter(), 0
+        for obj in super().__iter__():
+            rows += 1
+            yield obj
+        branch_fetched.send(
+            sender=self.sender, lookup=self.lookup, queries=1, rows=rows, duration=time.perf_counter() - start
         )
-        self.to_attr = prefix + to_attr
+
+
+@lru_cache(maxsize=None)
+def instrumented_iterable(sender, lookup=None):
+    """
+    The iterable class is copied to every clone of a queryset, so the branch information is stored on the class
+    :param sender: type
+    :param lookup: str
+    :return: type[InstrumentedModelIterable]
+    """
+    return type('InstrumentedModelIterable', (InstrumentedModelIterable,), {'sender': sender, 'lookup': lookup})
+
+
+def get_related_field(model, lookup):
+    """
+    Follow the lookup from the model and return the field at the end of it
+    :param model: type[models.Model]
+    :param lookup: str
+    :return: models.Field | models.ForeignObjectRel | None
+    """
+    field = None
+    for name in lookup.split(LOOKUP_SEP):
+        if model is None:
+            return None
+        field = model._meta.get_field(name)
+        model = getattr(field, 'related_model', None)
+    return field if model is not None else None
+
+
+def resolve_lookup(model, lookup, accessor=False):
+    """
+    Follow the lookup from the model and return every field on the way. select_related follows the names of the
+    fields, prefetch_related follows the attributes of the instances (the accessor of a reverse relation)
+    :param model: type[models.Model]
+    :param lookup: str
+    :param accessor: bool, True for a prefetch lookup
+    :return: list[models.Field | models.ForeignObjectRel | GenericForeignKey]
+    """
+    fields = []
+    for name in lookup.split(LOOKUP_SEP):
+        if model is None:
+            path = LOOKUP_SEP.join(field.name for field in fields)
+            raise FieldDoesNotExist(f"'{path}' can't be followed to '{name}'")
+        field = get_lookup_field(model, name, accessor)
+        fields += [field]
+        model = getattr(field, 'related_model', None)
+    return fields
+
+
+def get_lookup_field(model, name, accessor=False):
+    """
+    Get the field of a single relation, see resolve_lookup
+    :param model: type[models.Model]
+    :param name: str
+    :param accessor: bool, True for the name of an attribute (prefetch_related)
+    :return: models.Field | models.ForeignObjectRel | GenericForeignKey
+    """
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        field = None
+    if accessor and isinstance(field, ForeignObjectRel) and field.get_accessor_name() != name:
+        raise FieldDoesNotExist(
+            f"{model._meta.label} has no attribute '{name}', the relation is prefetched as "
+            f"'{field.get_accessor_name()}'"
+        )
+    if field is None and accessor:
+        field = next((rel for rel in model._meta.related_objects if rel.get_accessor_name() == name), None)
+    if field is None:
+        raise FieldDoesNotExist(f"{model._meta.label} has no relation '{name}'")
+    return field
+
+
+def is_relation_loaded(instance, name, to_attr=None):
+    """
+    Check if following the relation of the instance doesn't query: it is selected, prefetched or stored in to_attr
+    :param instance: models.Model
+    :param name: str, the name of the attribute (prefetch_related)
+    :param to_attr: str | None
+    :return: bool
+    """
+    if to_attr is not None and to_attr in instance.__dict__:
+        return True
+    try:
+        field = get_lookup_field(type(instance), name, True)
+    except FieldDoesNotExist:
+        # not a relation (a property), there is nothing to load
+        return True
+    if not (field.many_to_many or field.one_to_many):
+        return field.is_cached(instance)
+    if isinstance(field, ForeignObjectRel):
+        # the reverse side of a foreign key / ManyToManyField
+        cache_name = field.get_cache_name() if field.one_to_many else field.field.related_query_name()
+    else:
+        cache_name = field.name
+    return cache_name in getattr(instance, '_prefetched_objects_cache', {})
+
+
+def get_prefetch_queryset(prefetch, model):
+    """
+    Get a copy of the queryset of the prefetch, or the queryset django would use when the prefetch has none
+    :param prefetch: str | Prefetch
+    :param model: type[models.Model], the model the prefetch starts from
+    :return: models.QuerySet | None, None when the lookup can't be followed (GenericForeignKey)
+    """
+    if isinstance(prefetch, Prefetch) and prefetch.queryset is not None:
+        return prefetch.queryset.all()
+    try:
+        field = get_related_field(model, prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch)
+    except FieldDoesNotExist:
+        # lookups can go trough the to_attr of other prefetches, these can't be followed on the model
+        return None
+    if field is None:
+        return None
+    # the same querysets django uses when no queryset is given
+    forward = (field.many_to_one or field.one_to_one) and field.concrete
+    manager = field.related_model._base_manager if forward else field.related_model._default_manager
+    return manager.all()
+
+
+def resolve_prefetch_queryset(prefetch_queryset, queryset, context=None):
+    """
+    Get the base queryset of a prefetch from a Meta.prefetch_queryset
+    :param prefetch_queryset: models.QuerySet | models.Manager | Callable[[models.QuerySet, dict], models.QuerySet]
+    :param queryset: models.QuerySet, the queryset django would use for the prefetch
+    :param context: dict | None, the context of the serializer
+    :return: models.QuerySet
+    """
+    if isinstance(prefetch_queryset, (QuerySet, Manager)):
+        return prefetch_queryset.all()
+    return prefetch_queryset(queryset, context or {})
+
+
+def set_prefetch_queryset(prefetch, queryset):
+    """
+    Get a prefetch with the queryset set, a Prefetch object gets copied so the given object stays unchanged
+    :param prefetch: str | Prefetch
+    :param queryset: models.QuerySet
+    :return: Prefetch
+    """
+    if not isinstance(prefetch, Prefetch):
+        return Prefetch(prefetch, queryset=queryset)
+    prefetch = copy.copy(prefetch)
+    prefetch.queryset = queryset
+    return prefetch
+
+
+def get_traversed_lookups(prefetch_list):
+    """
+    The levels the prefetches go through, see is_traversed
+    :param prefetch_list: Iterable[str | Prefetch]
+    :return: frozenset[str]
+    """
+    traversed = set()
+    for prefetch in prefetch_list:
+        path = (prefetch.prefetch_to if isinstance(prefetch, Prefetch) else prefetch).split(LOOKUP_SEP)
+        traversed.update(LOOKUP_SEP.join(path[:index]) for index in range(1, len(path) + 1))
+    return frozenset(traversed)
+
+
+def is_traversed(prefetch, traversed):
+    """
+    Check if an earlier lookup already goes through the level of the prefetch. Django prefetches that level with
+    the earlier lookup and doesn't accept a queryset for it anymore ("lookup was already seen with a different
+    queryset"), a lookup without queryset has to stay without one
+    :param prefetch: str | Prefetch
+    :param traversed: Collection[str], see get_traversed_lookups
+    :return: bool
+    """
+    if isinstance(prefetch, Prefetch):
+        return prefetch.queryset is None and prefetch.prefetch_to in traversed
+    return prefetch in traversed
+
+
+def route_prefetch(prefetch, model, alias, force=True, traversed=()):
+    """
+    Make the prefetch read from the given database alias instead of the database the router picks. A lookup an
+    earlier lookup already goes through is fetched by that lookup, from the database of the instances it starts from
+    :param prefetch: str | Prefetch
+    :param model: type[models.Model], the model the prefetch starts from
+    :param alias: str
+    :param force: bool, if False a queryset that already has a database keeps it
+    :param traversed: Collection[str], the levels the earlier lookups go through, see get_traversed_lookups
+    :return: str | Prefetch
+    """
+    if is_traversed(prefetch, traversed):
+        return prefetch
+    queryset = get_prefetch_queryset(prefetch, model)
+    if queryset is None or (not force and queryset._db is not None):
+        return prefetch
+    return set_prefetch_queryset(prefetch, queryset.using(alias))
+
+
+def route_lookups(prefetch_list, model, alias, force=True):
+    """
+    Route the prefetches like route_prefetch, including the levels they go through. Django fetches such a level with
+    the database the router picks, the level gets a routed prefetch in front of the lookup (unless an earlier lookup
+    already goes through it)
+    :param prefetch_list: list[str | Prefetch]
+    :param model: type[models.Model], the model the prefetches start from
+    :param alias: str
+    :param force: bool, see route_prefetch
+    :return: list[str | Prefetch]
+    """
+    routed, traversed = [], frozenset()
+    for prefetch in prefetch_list:
+        path = (prefetch.prefetch_to if isinstance(prefetch, Prefetch) else prefetch).split(LOOKUP_SEP)
+        for index in range(1, len(path)):
+            level = route_prefetch(LOOKUP_SEP.join(path[:index]), model, alias, force, traversed)
+            # a level that can't be routed (the to_attr of an earlier prefetch) is left to the lookup
+            if isinstance(level, Prefetch):
+                routed += [level]
+                traversed |= get_traversed_lookups([level])
+        routed += [route_prefetch(prefetch, model, alias, force, traversed)]
+        traversed |= get_traversed_lookups([prefetch])
+    return routed
+
+
+def instrument_prefetch(prefetch, model, sender, traversed=()):
+    """
+    Give the prefetch an instrumented queryset, so the fetched rows of this branch will be reported. A lookup an
+    earlier lookup already goes through is fetched by that lookup and isn't reported
+    :param prefetch: str | Prefetch
+    :param model: type[models.Model], the model the prefetch starts from
+    :param sender: type
+    :param traversed: Collection[str], the levels the earlier lookups go through, see get_traversed_lookups
+    :return: str | Prefetch
+    """
+    if is_traversed(prefetch, traversed):
+        return prefetch
+    queryset = get_prefetch_queryset(prefetch, model)
+    if queryset is None or queryset._iterable_class is not ModelIterable:
+        return prefetch
+    lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+    queryset._iterable_class = instrumented_iterable(sender, lookup)
+    return set_prefetch_queryset(prefetch, queryset)
+
+
+class LargeInQuerySetMixin:
+    """
+    The prefetch of a relation filters the related rows with an IN over the keys of all parents. A queryset with
+    this mixin splits an IN with more than in_threshold values into chunks of in_threshold values, one query per
+    chunk. When parent_queryset is set the IN gets replaced with a subquery over the parents instead.
+    Use large_in_prefetch to give a prefetch such a queryset
+    """
+    in_threshold = None
+    parent_queryset = None
+    parent_column = None
+
+    def _get_large_in(self):
+        """
+        :return: tuple[int, In] | tuple[None, None], the index in the where clause and the largest IN lookup
+        """
+        found, size = (None, None), self.in_threshold
+        for index, child in enumerate(self.query.where.children):
+            if isinstance(child, In) and child.rhs_is_direct_value() and len(child.rhs) > size:
+                found, size = (index, child), len(child.rhs)
+        return found
+
+    def _replace_in(self, index, lookup, rhs):
+        """
+        :param index: int
+        :param lookup: In
+        :param rhs: list | Query
+        :return: models.QuerySet
+        """
+        clone = self._chain()
+        clone.query.where.children[index] = type(lookup)(lookup.lhs, rhs)
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.parent_queryset, clone.parent_column = self.parent_queryset, self.parent_column
+        return clone
+
+    def _fetch_all(self):
+        if self._result_cache is None and self.in_threshold:
+            index, lookup = self._get_large_in()
+            if lookup is not None:
+                if self.parent_queryset is not None:
+                    querysets = [self._replace_in(
+                        index, lookup, self.parent_queryset.order_by().values(self.parent_column).query
+                    )]
+                else:
+                    values = list(lookup.rhs)
+                    querysets = [
+                        self._replace_in(index, lookup, values[start:start + self.in_threshold])
+                        for start in range(0, len(values), self.in_threshold)
+                    ]
+                self._result_cache = [obj for queryset in querysets for obj in queryset._iterable_class(queryset)]
+        super()._fetch_all()
+
+
+@lru_cache(maxsize=None)
+def large_in_queryset_class(base, in_threshold):
+    """
+    :param base: type[models.QuerySet]
+    :param in_threshold: int
+    :return: type[models.QuerySet]
+    """
+    return type(base.__name__, (LargeInQuerySetMixin, base), {'in_threshold': in_threshold})
+
+
+def large_in_prefetch(prefetch, model, in_threshold, parent_queryset=None, traversed=()):
+    """
+    Give the prefetch a queryset that splits the IN over the keys of the parents into chunks of in_threshold values
+    when there are more than in_threshold parents. With a parent_queryset a relation on the first level replaces
+    the IN with a subquery over the parent_queryset instead
+    :param prefetch: str | Prefetch
+    :param model: type[models.Model], the model the prefetch starts from
+    :param in_threshold: int
+    :param parent_queryset: models.QuerySet | None, the queryset of the model the prefetch starts from
+    :param traversed: Collection[str], the levels the earlier lookups go through, see get_traversed_lookups
+    :return: str | Prefetch
+    """
+    if is_traversed(prefetch, traversed):
+        return prefetch
+    queryset = get_prefetch_queryset(prefetch, model)
+    if queryset is None:
+        return prefetch
+    queryset.__class__ = large_in_queryset_class(type(queryset), in_threshold)
+
+    lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+    # a sliced queryset can not be used as subquery (on every database)
+    if parent_queryset is not None and LOOKUP_SEP not in lookup and parent_queryset.query.can_filter():
+        field = get_related_field(model, lookup)
+        if field.concrete and (field.many_to_one or field.one_to_one):
+            # the IN contains the values of the foreign key of the parents
+            parent_column = field.attname
+        elif field.one_to_many or field.one_to_one:
+            # the IN contains the values of the field the foreign key of the related model points to
+            parent_column = field.field_name
+        else:
+            parent_column = 'pk'
+        queryset.parent_queryset, queryset.parent_column = parent_queryset, parent_column
+    return set_prefetch_queryset(prefetch, queryset)
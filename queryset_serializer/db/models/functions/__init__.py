@@ -0,0 +1,55 @@
+from django.db.models import Func, Subquery, TextField, Value
+
+
+class JSONObject(Func):
+    """
+    Builds a json object in the database, json_object on SQLite and json_build_object on PostgreSQL
+    """
+    function = 'json_object'
+    output_field = TextField()
+
+    def __init__(self, **fields):
+        expressions = []
+        for key, value in fields.items():
+            expressions += [Value(key), value]
+        super().__init__(*expressions, output_field=TextField())
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='json_build_object', **extra_context)
+
+
+class JSONBoolean(Func):
+    """
+    Renders a boolean column as json true / false, SQLite stores booleans as integers
+    """
+    template = "json(CASE %(expressions)s WHEN 1 THEN 'true' WHEN 0 THEN 'false' END)"
+    output_field = TextField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='%(expressions)s', **extra_context)
+
+
+class JSONSubquery(Subquery):
+    """
+    A subquery selecting a single json value, json() makes sure it is embedded as json instead of as a string
+    """
+    template = 'json((%(subquery)s))'
+    output_field = TextField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='(%(subquery)s)', **extra_context)
+
+
+class JSONArraySubquery(Subquery):
+    """
+    Aggregates the `_json` column of every row in the subquery into a json array
+    """
+    template = "json((SELECT json_group_array(json(_sq._json)) FROM (%(subquery)s) _sq))"
+    output_field = TextField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template="(SELECT COALESCE(json_agg(_sq._json), '[]'::json) FROM (%(subquery)s) _sq)",
+            **extra_context
+        )
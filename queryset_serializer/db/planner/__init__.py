@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class BranchStats:
+    """
+    Bounded window of observations of one branch of a plan
+    """
+    def __init__(self, window):
+        """
+
+        :param window: int, amount of observations that are kept
+        """
+        self.observations = deque(maxlen=window)
+
+    def add(self, rows, distinct, duration=None):
+        """
+        :param rows: int, rows of the root queryset
+        :param distinct: int, distinct related objects of the branch
+        :param duration: float | None, seconds it took to fetch
+        :return: None
+        """
+        self.observations.append((rows, distinct, duration))
+
+    def __len__(self):
+        return len(self.observations)
+
+    def _mean(self, index):
+        values = [observation[index] for observation in self.observations if observation[index] is not None]
+        return sum(values) / len(values) if values else None
+
+    @property
+    def rows(self):
+        return self._mean(0)
+
+    @property
+    def distinct(self):
+        return self._mean(1)
+
+    @property
+    def duration(self):
+        return self._mean(2)
+
+
+class AdaptivePlanner:
+    """
+    Decides per serializer if a `to one` relation is joined (select_related) or prefetched, based on the observed
+    cardinalities. A joined relation repeats all its columns for every row of the root, a prefetched relation only
+    fetches every distinct row once but costs an extra query:
+        joined: rows * width cells
+        prefetched: distinct * width cells + query_cost
+    The stats are kept in memory, bounded by window (observations per branch) and max_branches
+    """
+    def __init__(self, window=50, max_branches=1000, query_cost=2000, min_observations=5):
+        """
+
+        :param window: int, amount of observations kept per branch
+        :param max_branches: int, amount of branches kept, the least recently used branch is dropped first
+        :param query_cost: int, cost of an extra query expressed in fetched cells (rows * columns)
+        :param min_observations: int, amount of observations needed before a branch gets re-planned
+        """
+        self.window = window
+        self.max_branches = max_branches
+        self.query_cost = query_cost
+        self.min_observations = min_observations
+        self._stats = OrderedDict()
+        self._decisions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, key, lookup, rows, distinct, duration=None):
+        """
+        :param key: object, identifies the serializer
+        :param lookup: str | None, None for the root queryset
+        :param rows: int
+        :param distinct: int
+        :param duration: float | None
+        :return: None
+        """
+        with self._lock:
+            stats = self._stats.pop((key, lookup), None) or BranchStats(self.window)
+            stats.add(rows, distinct, duration)
+            self._stats[(key, lookup)] = stats
+            while len(self._stats) > self.max_branches:
+                self._stats.popitem(last=False)
+
+    def stats(self, key, lookup):
+        """
+        :param key: object
+        :param lookup: str | None
+        :return: BranchStats | None
+        """
+        with self._lock:
+            return self._stats.get((key, lookup))
+
+    def should_prefetch(self, key, lookup, width):
+        """
+        Decide if the `to one` relation should be prefetched instead of joined, the decision is kept so it can be
+        inspected with explain. To prevent flipping a prefetched relation only goes back to a join when it would
+        save twice the query cost
+        :param key: object
+        :param lookup: str
+        :param width: int, amount of columns of the related model
+        :return: bool
+        """
+        # the stats are read and the decision is written under the lock, observe changes the stats concurrently
+        with self._lock:
+            previous = self._decisions.get((key, lookup))
+            prefetch = previous is not None and previous['strategy'] == 'prefetch'
+            stats = self._stats.get((key, lookup))
+            if stats is None or len(stats) < self.min_observations:
+                return prefetch
+            rows, distinct, duration, observations = stats.rows, stats.distinct, stats.duration, len(stats)
+
+            saved_cells = (rows - distinct) * width
+            if prefetch:
+                prefetch = saved_cells * 2 > self.query_cost
+            else:
+                prefetch = saved_cells > self.query_cost
+
+            self._decisions[(key, lookup)] = {
+                'key': key, 'lookup': lookup, 'strategy': 'prefetch' if prefetch else 'select',
+                'rows': rows, 'distinct': distinct, 'width': width, 'saved_cells': saved_cells,
+                'duration': duration, 'observations': observations,
+            }
+            while len(self._decisions) > self.max_branches:
+                self._decisions.popitem(last=False)
+        return prefetch
+
+    def explain(self, key=None):
+        """
+        The decisions made by the planner, for debugging
+        :param key: object | None, only the decisions of this serializer
+        :return: list[dict]
+        """
+        with self._lock:
+            return [
+                dict(decision) for decision in self._decisions.values() if key is None or decision['key'] is key
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._decisions.clear()
+
+
+def observed_iterable(base, observer, lookup=None):
+    """
+    Subclass of the iterable class of a queryset which hands the fetched instances to the observer
+    :param base: type[ModelIterable], the iterable class should yield model instances
+    :param observer: Callable[[str | None, list[models.Model], float], None]
+    :param lookup: str | None, None for the root queryset
+    :return: type[ModelIterable]
+    """
+    class ObservedModelIterable(base):
+        def __iter__(self):
+            start, instances = time.perf_counter(), []
+            for obj in super().__iter__():
+                instances += [obj]
+                yield obj
+            observer(lookup, instances, time.perf_counter() - start)
+
+    return ObservedModelIterable
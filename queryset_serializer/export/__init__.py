@@ -0,0 +1,166 @@
+import gzip
+import json
+import os
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ExportCheckpoint:
+    """
+    The state of an export after the last batch that was written completely: the last primary key, the amount of
+    rows and the size of the output file. Saved as json, replaced atomically
+    """
+    def __init__(self, path, serializer=None, last_pk=None, rows=0, offset=0, done=False):
+        """
+
+        :param path: str
+        :param serializer: str, name of the serializer class that wrote the export
+        :param last_pk: object
+        :param rows: int
+        :param offset: int, size of the output file in bytes
+        :param done: bool
+        """
+        self.path = path
+        self.serializer = serializer
+        self.last_pk = last_pk
+        self.rows = rows
+        self.offset = offset
+        self.done = done
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: str
+        :return: ExportCheckpoint, an empty checkpoint when the file doesn't exist
+        """
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path) as file:
+            return cls(path, **json.load(file))
+
+    def save(self):
+        """
+        :return: None
+        """
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({
+                'serializer': self.serializer, 'last_pk': self.last_pk, 'rows': self.rows, 'offset': self.offset,
+                'done': self.done,
+            }, file, cls=DjangoJSONEncoder)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class NDJSONExporter:
+    """
+    Exports a queryset with a QuerySetSerializer to gzip compressed NDJSON (one json object per line).
+    The queryset is walked in primary key order in batches, the plan of the serializer is applied per batch.
+    Every batch is written as a gzip member of its own (concatenated members are a valid gzip file) and a checkpoint
+    is saved after it, an interrupted export resumes after the last complete batch
+    """
+    def __init__(self, serializer_class, queryset, path, checkpoint_path=None, batch_size=2000, context=None,
+                 compresslevel=6):
+        """
+
+        :param serializer_class: type[QuerySetSerializer]
+        :param queryset: models.QuerySet
+        :param path: str, the .ndjson.gz file
+        :param checkpoint_path: str | None, defaults to {path}.checkpoint
+        :param batch_size: int
+        :param context: dict | None, context of the serializer
+        :param compresslevel: int
+        """
+        self.serializer_class = serializer_class
+        self.queryset = queryset
+        self.path = path
+        self.checkpoint_path = checkpoint_path or f'{path}.checkpoint'
+        self.batch_size = batch_size
+        self.context = context or {}
+        self.compresslevel = compresslevel
+
+    @property
+    def name(self):
+        return f'{self.serializer_class.__module__}.{self.serializer_class.__qualname__}'
+
+    def _get_remaining(self, last_pk):
+        """
+        :param last_pk: object | None
+        :return: models.QuerySet
+        """
+        queryset = self.queryset if last_pk is None else self.queryset.filter(pk__gt=last_pk)
+        return queryset.order_by('pk')
+
+    def _serialize(self, last_pk):
+        """
+        Serialize the next batch
+        :param last_pk: object | None
+        :return: tuple[bytes, int, object], the lines, amount of rows and the last primary key
+        """
+        serializer = self.serializer_class(
+            self._get_remaining(last_pk)[:self.batch_size], many=True, context=self.context
+        )
+        data = serializer.data
+        if not data:
+            return b'', 0, last_pk
+        lines = ''.join(
+            json.dumps(row, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n' for row in data
+        )
+        # the queryset got evaluated by serializing it
+        return lines.encode('utf-8'), len(data), serializer.instance[len(data) - 1].pk
+
+    def _open(self, offset):
+        """
+        Open the output and drop everything written after the checkpoint (a batch that was interrupted)
+        :param offset: int
+        :return: binary file object
+        """
+        file = open(self.path, 'r+b' if offset and os.path.exists(self.path) else 'wb')
+        file.truncate(offset)
+        file.seek(offset)
+        return file
+
+    def run(self, progress=None):
+        """
+        Export the queryset, starting after the checkpoint when there is one
+        :param progress: Callable[[dict], None] | None, called after every batch with the rows, total rows,
+            rows per second and the estimated seconds left
+        :return: ExportCheckpoint
+        """
+        checkpoint = ExportCheckpoint.load(self.checkpoint_path)
+        if checkpoint.serializer not in (None, self.name):
+            raise ValueError(f'{self.checkpoint_path} is a checkpoint of {checkpoint.serializer}, not of {self.name}')
+        if checkpoint.done:
+            return checkpoint
+        checkpoint.serializer = self.name
+
+        total = checkpoint.rows + self._get_remaining(checkpoint.last_pk).count()
+        start, exported = time.perf_counter(), 0
+        with self._open(checkpoint.offset) as file:
+            while True:
+                lines, rows, last_pk = self._serialize(checkpoint.last_pk)
+                if not rows:
+                    break
+                file.write(gzip.compress(lines, self.compresslevel))
+                file.flush()
+                os.fsync(file.fileno())
+
+                checkpoint.last_pk, checkpoint.rows, checkpoint.offset = last_pk, checkpoint.rows + rows, file.tell()
+                checkpoint.save()
+
+                exported += rows
+                rate = exported / max(time.perf_counter() - start, 1e-9)
+                if progress is not None:
+                    progress({
+                        'rows': checkpoint.rows, 'total': max(total, checkpoint.rows), 'rows_per_second': rate,
+                        'eta': max(total - checkpoint.rows, 0) / rate, 'offset': checkpoint.offset,
+                    })
+                if rows < self.batch_size:
+                    break
+
+        checkpoint.done = True
+        checkpoint.save()
+        return checkpoint
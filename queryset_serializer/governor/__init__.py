@@ -0,0 +1,207 @@
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.db import connections
+from django.db.models import Prefetch
+from django.db.models.query import ModelIterable
+
+from queryset_serializer.db.models import (get_prefetch_queryset,
+                                           is_traversed,
+                                           set_prefetch_queryset)
+
+# the options of the Meta that are budgets, see DefaultMetaQuerySetSerializer
+BUDGETS = ('max_rows', 'max_branch_rows', 'max_queries', 'max_duration')
+
+# the governor of the serialization that is running, per thread / task
+_active_governor = ContextVar('queryset_serializer_governor', default=None)
+
+
+def get_governor():
+    """
+    :return: ResourceGovernor | None, the governor of the serialization that is running
+    """
+    return _active_governor.get()
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised as soon as a serialization goes over one of its budgets, before the rest of the rows are fetched
+    """
+    def __init__(self, budget, limit, usage, sender=None, lookup=None):
+        """
+
+        :param budget: str, one of BUDGETS
+        :param limit: int | float
+        :param usage: dict, see ResourceGovernor.usage
+        :param sender: type, the root serializer class
+        :param lookup: str | None, the branch that went over max_branch_rows
+        """
+        self.budget = budget
+        self.limit = limit
+        self.usage = usage
+        self.sender = sender
+        self.lookup = lookup
+        name = getattr(sender, '__name__', 'serializer')
+        branch = f' (branch {lookup})' if lookup is not None else ''
+        super().__init__(f'{name} exceeded {budget}={limit}{branch}, usage: {usage}')
+
+
+class ResourceGovernor:
+    """
+    Enforces the budgets of a serialization while it runs. The rows are counted while they are read from the cursor
+    (see governed_iterable), the queries are counted before they are executed and the time is checked with every row,
+    query and serialized item. Can be used as context manager, everything inside the block counts
+
+    Example:
+        with ResourceGovernor(max_queries=10, max_duration=2) as governor:
+            MySerializer(queryset, many=True).data
+        logger.info('serialized with %s', governor.usage())
+    """
+    def __init__(self, max_rows=None, max_branch_rows=None, max_queries=None, max_duration=None, sender=None):
+        """
+
+        :param max_rows: int | None, rows of the root queryset
+        :param max_branch_rows: int | None, rows per prefetched branch (over all parents)
+        :param max_queries: int | None
+        :param max_duration: float | None, seconds
+        :param sender: type, the root serializer class
+        """
+        self.max_rows = max_rows
+        self.max_branch_rows = max_branch_rows
+        self.max_queries = max_queries
+        self.max_duration = max_duration
+        self.sender = sender
+        self.rows = 0
+        self.branch_rows = {}
+        self.queries = 0
+        self.start = None
+        self._token = None
+        self._stack = None
+
+    @classmethod
+    def from_meta(cls, meta, sender=None, overrides=None):
+        """
+        :param meta: the (scoped) Meta of the serializer, see get_meta
+        :param sender: type
+        :param overrides: dict[str, object], the budgets of override_config, they take precedence over the meta
+        :return: ResourceGovernor | None, None when no budget is configured
+        """
+        overrides = overrides or {}
+        budgets = {name: overrides.get(name, getattr(meta, name, None)) for name in BUDGETS}
+        if all(value is None for value in budgets.values()):
+            return None
+        return cls(sender=sender, **budgets)
+
+    @property
+    def duration(self):
+        """
+        :return: float, seconds since the governor got entered
+        """
+        return 0.0 if self.start is None else time.perf_counter() - self.start
+
+    def usage(self):
+        """
+        The current usage next to the budgets, can be logged
+        :return: dict
+        """
+        return {
+            'rows': self.rows,
+            'branch_rows': dict(self.branch_rows),
+            'queries': self.queries,
+            'duration': self.duration,
+            'budgets': {name: getattr(self, name) for name in BUDGETS},
+        }
+
+    def _exceeded(self, budget, lookup=None):
+        return BudgetExceeded(budget, getattr(self, budget), self.usage(), self.sender, lookup)
+
+    def check_duration(self):
+        if self.max_duration is not None and self.duration > self.max_duration:
+            raise self._exceeded('max_duration')
+
+    def add_row(self, lookup=None):
+        """
+        Count a fetched row, lookup is None for the root queryset
+        :param lookup: str | None
+        :return: None
+        """
+        if lookup is None:
+            self.rows += 1
+            if self.max_rows is not None and self.rows > self.max_rows:
+                raise self._exceeded('max_rows')
+        else:
+            self.branch_rows[lookup] = rows = self.branch_rows.get(lookup, 0) + 1
+            if self.max_branch_rows is not None and rows > self.max_branch_rows:
+                raise self._exceeded('max_branch_rows', lookup)
+        self.check_duration()
+
+    def _execute(self, execute, sql, params, many, context):
+        self.queries += 1
+        if self.max_queries is not None and self.queries > self.max_queries:
+            raise self._exceeded('max_queries')
+        self.check_duration()
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _active_governor.set(self)
+        self._stack = ExitStack()
+        if self.max_queries is not None or self.max_duration is not None:
+            for connection in connections.all():
+                self._stack.enter_context(connection.execute_wrapper(self._execute))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stack.close()
+        _active_governor.reset(self._token)
+
+
+class GovernedIterableMixin:
+    """
+    Counts the rows against the active governor while they are read, so a budget stops the fetch early.
+    Use governed_iterable to get a subclass for a specific iterable / lookup
+    """
+    lookup = None
+
+    def __iter__(self):
+        governor = get_governor()
+        if governor is None:
+            yield from super().__iter__()
+            return
+        for obj in super().__iter__():
+            governor.add_row(self.lookup)
+            yield obj
+
+
+@lru_cache(maxsize=None)
+def governed_iterable(iterable_class, lookup=None):
+    """
+    The iterable class is copied to every clone of a queryset, so the branch information is stored on the class
+    :param iterable_class: type[ModelIterable]
+    :param lookup: str | None, None for the root queryset
+    :return: type[GovernedIterableMixin]
+    """
+    if issubclass(iterable_class, GovernedIterableMixin):
+        return iterable_class
+    return type(f'Governed{iterable_class.__name__}', (GovernedIterableMixin, iterable_class), {'lookup': lookup})
+
+
+def govern_prefetch(prefetch, model, traversed=()):
+    """
+    Give the prefetch a queryset that counts its rows against the active governor. A lookup an earlier lookup already
+    goes through is fetched by that lookup, its rows are not counted (the queries are)
+    :param prefetch: str | Prefetch
+    :param model: type[models.Model], the model the prefetch starts from
+    :param traversed: Collection[str], the levels the earlier lookups go through, see get_traversed_lookups
+    :return: str | Prefetch
+    """
+    if is_traversed(prefetch, traversed):
+        return prefetch
+    queryset = get_prefetch_queryset(prefetch, model)
+    if queryset is None or not issubclass(queryset._iterable_class, ModelIterable):
+        return prefetch
+    lookup = prefetch.prefetch_through if isinstance(prefetch, Prefetch) else prefetch
+    queryset._iterable_class = governed_iterable(queryset._iterable_class, lookup)
+    return set_prefetch_queryset(prefetch, queryset)
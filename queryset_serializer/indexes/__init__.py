@@ -0,0 +1,188 @@
+from django.contrib.contenttypes.fields import GenericRelation
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, router
+from django.db.models import ManyToManyField, ManyToManyRel
+from django.db.models.fields.reverse_related import ForeignObjectRel
+
+from queryset_serializer.db.models import resolve_lookup
+from queryset_serializer.warmup import get_serializer_classes
+
+
+class IndexRequirement:
+    """
+    The columns of a table a branch of a plan filters (prefetch) or joins (select) on
+    """
+    def __init__(self, lookup, kind, model, columns):
+        """
+
+        :param lookup: str
+        :param kind: str, select or prefetch
+        :param model: type[models.Model], the model of the table (the through model of a many to many relation)
+        :param columns: tuple[str], the columns that are compared together (in any order)
+        """
+        self.lookup = lookup
+        self.kind = kind
+        self.model = model
+        self.columns = columns
+        # indexed, non-leading or missing, see check
+        self.status = None
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    def check(self, constraints):
+        """
+        An index covers the columns when they are its leading columns
+        :param constraints: dict, the constraints of the table (DatabaseIntrospection.get_constraints)
+        :return: IndexRequirement
+        """
+        indexes = [
+            constraint['columns'] for constraint in constraints.values()
+            if constraint['index'] or constraint['unique'] or constraint['primary_key']
+        ]
+        columns = set(self.columns)
+        if any(set(index[:len(columns)]) == columns for index in indexes):
+            self.status = 'indexed'
+        elif any(columns.issubset(index) for index in indexes):
+            self.status = 'non-leading'
+        else:
+            self.status = 'missing'
+        return self
+
+    def suggestion(self):
+        """
+        :return: str, the Meta.indexes entry that would cover the columns
+        """
+        fields = [
+            next((field.name for field in self.model._meta.concrete_fields if field.column == column), column)
+            for column in self.columns
+        ]
+        name = f"{self.model._meta.model_name[:10]}_{'_'.join(fields)}"[:26]
+        suggestion = f"models.Index(fields={fields!r}, name='{name}_idx') in {self.model.__name__}.Meta.indexes"
+        if self.model._meta.auto_created:
+            suggestion += ' (auto created through model, give the relation a through model)'
+        return suggestion
+
+    def __str__(self):
+        return f"{self.kind} '{self.lookup}' uses {self.table} ({', '.join(self.columns)})"
+
+
+class IndexReport:
+    """
+    The columns every branch of the plan of a serializer filters / joins on, checked against the indexes of the
+    database
+    """
+    def __init__(self, serializer_class, using=None):
+        """
+
+        :param serializer_class: type[QuerySetSerializer]
+        :param using: str | None, the database alias, None for the database the router picks per model
+        """
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.using = using
+        self.requirements = []
+
+    @property
+    def name(self):
+        return f'{self.serializer_class.__module__}.{self.serializer_class.__qualname__}'
+
+    @property
+    def missing(self):
+        return [requirement for requirement in self.requirements if requirement.status == 'missing']
+
+    @property
+    def non_leading(self):
+        return [requirement for requirement in self.requirements if requirement.status == 'non-leading']
+
+    def check(self, constraints=None):
+        """
+        :param constraints: dict | None, {(database alias, table): constraints}, shared between reports
+        :return: IndexReport
+        """
+        constraints = {} if constraints is None else constraints
+        seen = set()
+        for node in self.serializer_class.database_plan.nodes():
+            if node.generic:
+                continue
+            for requirement in get_requirements(self.model, node.lookup, node.select):
+                key = (requirement.table, requirement.columns)
+                if key in seen:
+                    continue
+                seen.add(key)
+                using = self.using or router.db_for_read(requirement.model)
+                if (using, requirement.table) not in constraints:
+                    constraints[using, requirement.table] = get_constraints(using, requirement.table)
+                self.requirements += [requirement.check(constraints[using, requirement.table])]
+        return self
+
+    def __str__(self):
+        lines = [
+            f'{self.name} ({self.model._meta.label}): {len(self.requirements)} branches, '
+            f'{len(self.missing)} missing, {len(self.non_leading)} non-leading indexes'
+        ]
+        for requirement in self.missing + self.non_leading:
+            lines += [f'  {requirement.status}: {requirement}, add {requirement.suggestion()}']
+        return '\n'.join(lines)
+
+
+def get_requirements(model, lookup, select):
+    """
+    The columns the last relation of the lookup is filtered / joined on. A prefetch filters the table of the related
+    model on its foreign key (or the through table of a many to many relation on the key of the parents), a select
+    joins on the primary key (or a unique column) of the related model. The prefetch of a GenericForeignKey filters
+    on primary keys, it has no requirements
+    :param model: type[models.Model]
+    :param lookup: str
+    :param select: bool
+    :return: list[IndexRequirement]
+    """
+    try:
+        field = resolve_lookup(model, lookup, not select)[-1]
+    except FieldDoesNotExist:
+        # the lookup goes trough a GenericForeignKey or doesn't exist (see warmup_serializers)
+        return []
+    kind = 'select' if select else 'prefetch'
+    if isinstance(field, GenericRelation):
+        related = field.related_model._meta
+        columns = (related.get_field(field.content_type_field_name).column,
+                   related.get_field(field.object_id_field_name).column)
+        return [IndexRequirement(lookup, kind, field.related_model, columns)]
+    if isinstance(field, ManyToManyField):
+        through = field.remote_field.through
+        return [IndexRequirement(lookup, kind, through, (through._meta.get_field(field.m2m_field_name()).column,))]
+    if isinstance(field, ManyToManyRel):
+        through = field.through
+        column = through._meta.get_field(field.field.m2m_reverse_field_name()).column
+        return [IndexRequirement(lookup, kind, through, (column,))]
+    if isinstance(field, ForeignObjectRel):
+        return [IndexRequirement(lookup, kind, field.related_model, (field.field.column,))]
+    if getattr(field, 'target_field', None) is not None:
+        return [IndexRequirement(lookup, kind, field.related_model, (field.target_field.column,))]
+    return []
+
+
+def get_constraints(using, table):
+    """
+    :param using: str
+    :param table: str
+    :return: dict, see DatabaseIntrospection.get_constraints
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        return connection.introspection.get_constraints(cursor, table)
+
+
+def advise_indexes(serializer_classes=None, modules=('serializers',), using=None):
+    """
+    Check the filter / join columns of every branch of the plans against the indexes of the database
+    :param serializer_classes: list[type[QuerySetSerializer]] | None, None for every serializer that can be found
+    :param modules: tuple[str], see get_serializer_classes
+    :param using: str | None, the database alias, None for the database the router picks per model
+    :return: list[IndexReport]
+    """
+    if serializer_classes is None:
+        serializer_classes = get_serializer_classes(modules)
+    constraints = {}
+    return [IndexReport(serializer_class, using).check(constraints) for serializer_class in serializer_classes]
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from queryset_serializer.indexes import advise_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        'List the columns every select / prefetch of the QuerySetSerializer plans filters or joins on and report the '
+        'ones without an index (or only a non-leading one), with the Meta.indexes entry that would cover them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'serializers', nargs='*',
+            help='Dotted paths of the serializers, every serializer that can be found when empty'
+        )
+        parser.add_argument(
+            '--module', action='append', dest='modules', default=None,
+            help='Module that gets imported from every installed app to find serializers (default: serializers)'
+        )
+        parser.add_argument('--database', default=None, help='Database alias, the router decides per model by default')
+        parser.add_argument('--fail-on-missing', action='store_true', help='Fail when an index is missing')
+
+    def handle(self, *args, **options):
+        serializer_classes = [import_string(path) for path in options['serializers']] or None
+        modules = tuple(options['modules'] or ('serializers',))
+        reports = advise_indexes(serializer_classes, modules, options['database'])
+        for report in reports:
+            self.stdout.write(str(report))
+
+        missing = sum(len(report.missing) for report in reports)
+        non_leading = sum(len(report.non_leading) for report in reports)
+        summary = f'{len(reports)} serializers, {missing} missing, {non_leading} non-leading indexes'
+        if missing and options['fail_on_missing']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from queryset_serializer.export import NDJSONExporter
+
+
+class Command(BaseCommand):
+    help = (
+        'Export every row of the model of a QuerySetSerializer to gzip compressed NDJSON, '
+        'an interrupted export resumes from its checkpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('serializer', help='Dotted path of the serializer')
+        parser.add_argument('path', help='Output file (.ndjson.gz)')
+        parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default: {path}.checkpoint)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--database', default=None, help='Database alias the rows are read from')
+
+    def handle(self, *args, **options):
+        serializer_class = import_string(options['serializer'])
+        queryset = serializer_class.Meta.model._default_manager.using(options['database']).all()
+        exporter = NDJSONExporter(
+            serializer_class, queryset, options['path'], options['checkpoint'], options['batch_size']
+        )
+        checkpoint = exporter.run(self.report)
+        self.stdout.write(self.style.SUCCESS(f'{checkpoint.rows} rows, {checkpoint.offset} bytes'))
+
+    def report(self, progress):
+        self.stdout.write(
+            f"{progress['rows']}/{progress['total']} rows, {progress['rows_per_second']:.0f} rows/s, "
+            f"eta {progress['eta']:.0f}s"
+        )
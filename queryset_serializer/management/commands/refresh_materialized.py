@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from queryset_serializer.materialized import autodiscover, get_materializer
+
+
+class Command(BaseCommand):
+    help = 'Render the representations of the dirty objects of the materialized serializers again'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'serializers', nargs='*',
+            help='Dotted paths of the materialized serializers, every registered serializer when empty'
+        )
+        parser.add_argument(
+            '--module', action='append', dest='modules', default=None,
+            help='Module that gets imported from every installed app to find serializers (default: serializers)'
+        )
+        parser.add_argument('--database', default=None, help='Database of the objects, the router decides by default')
+        parser.add_argument('--rebuild', action='store_true', help='Render every object, not only the dirty ones')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum amount of objects per serializer')
+
+    def handle(self, *args, **options):
+        materializers = []
+        for path in options['serializers']:
+            materializer = get_materializer(import_string(path))
+            if materializer is None:
+                raise CommandError(f'{path} is not materialized')
+            materializers += [materializer]
+
+        if not materializers:
+            materializers = autodiscover(tuple(options['modules'] or ('serializers',)))
+
+        total = 0
+        for materializer in materializers:
+            if options['rebuild']:
+                rendered = materializer.rebuild(options['database'])
+            else:
+                rendered = materializer.refresh(options['limit'], options['database'])
+            total += rendered
+            self.stdout.write(f'{materializer.key}: {rendered} objects rendered')
+        self.stdout.write(self.style.SUCCESS(f'{total} objects rendered'))
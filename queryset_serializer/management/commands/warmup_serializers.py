@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from queryset_serializer.warmup import get_serializer_classes, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Check the select / prefetch paths of every QuerySetSerializer against the models, precompute their plans '
+        'and print the depth and predicted amount of queries per serializer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'serializers', nargs='*',
+            help='Dotted paths of the serializers, every serializer that can be found when empty'
+        )
+        parser.add_argument(
+            '--module', action='append', dest='modules', default=None,
+            help='Module that gets imported from every installed app to find serializers (default: serializers)'
+        )
+        parser.add_argument('--fail-on-warning', action='store_true', help='Treat warnings as errors')
+
+    def handle(self, *args, **options):
+        if options['serializers']:
+            serializer_classes = [import_string(path) for path in options['serializers']]
+        else:
+            serializer_classes = get_serializer_classes(tuple(options['modules'] or ('serializers',)))
+
+        reports = warm_up(serializer_classes, raise_errors=False)
+        for report in reports:
+            self.stdout.write(str(report))
+
+        errors = sum(len(report.errors) for report in reports)
+        warnings = sum(len(report.warnings) for report in reports)
+        summary = f'{len(reports)} serializers, {errors} errors, {warnings} warnings'
+        if errors or (warnings and options['fail_on_warning']):
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
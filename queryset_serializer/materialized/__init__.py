@@ -0,0 +1,287 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models.fields.reverse_related import ForeignObjectRel
+from django.db.models.signals import (m2m_changed, post_save, pre_delete,
+                                      pre_save)
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+from rest_framework.renderers import JSONRenderer
+
+from queryset_serializer.db.models import resolve_lookup
+from queryset_serializer.models import (DirtyRepresentation,
+                                        MaterializedRepresentation)
+
+# {serializer class: Materializer}, see materialize
+_registry = {}
+
+
+def get_materializer(serializer_class):
+    """
+    :param serializer_class: type[QuerySetSerializer]
+    :return: Materializer | None, a subclass is not materialized by the materializer of its parent
+    """
+    return serializer_class.__dict__.get('_materializer')
+
+
+def autodiscover(modules=('serializers',)):
+    """
+    Import the given modules of every installed app, a serializer is only registered (and its changes are only
+    tracked) once its module has been imported. Called from AppConfig.ready, so every process tracks the changes
+    :param modules: tuple[str], module names that get imported from every installed app
+    :return: list[Materializer]
+    """
+    for module in modules:
+        autodiscover_modules(module)
+    return list(_registry.values())
+
+
+def materialize(serializer_class=None, **kwargs):
+    """
+    Store the representation of every object of the serializer and keep it up to date, can be used as decorator.
+    Changes of the models in the relation tree of the serializer mark the affected objects as dirty,
+    Materializer.refresh renders them again (see the refresh_materialized command)
+    :param serializer_class: type[QuerySetSerializer]
+    :param kwargs: see Materializer
+    :return: type[QuerySetSerializer]
+    """
+    if serializer_class is None:
+        return lambda cls: materialize(cls, **kwargs)
+    serializer_class._materializer = _registry[serializer_class] = Materializer(serializer_class, **kwargs)
+    return serializer_class
+
+
+class Materializer:
+    """
+    Stores the json of the representation of every object in MaterializedRepresentation, a list of these objects can
+    be rendered by concatenating the stored json without prefetching or serializing anything.
+    The representation is rendered without request, a serializer that depends on the context can't be materialized
+    """
+    def __init__(self, serializer_class, version=1, queryset=None, context=None, batch_size=500):
+        """
+
+        :param serializer_class: type[QuerySetSerializer]
+        :param version: int, change this when the representation changes, the stored json of other versions is stale
+        :param queryset: models.QuerySet, the objects are rendered from this queryset (for example with annotations)
+        :param context: dict, the context the serializer gets
+        :param batch_size: int, the amount of objects that are rendered / read at once
+        """
+        self.serializer_class = serializer_class
+        self.key = f'{serializer_class.__module__}.{serializer_class.__qualname__}'
+        self.model = serializer_class.Meta.model
+        self.version = version
+        self.queryset = queryset
+        self.context = context if context is not None else {'request': None}
+        self.batch_size = batch_size
+        self._paths = None
+
+    def get_queryset(self, using=None):
+        """
+        :param using: str | None, the database of the objects, None lets the router decide
+        :return: models.QuerySet
+        """
+        queryset = self.queryset.all() if self.queryset is not None else self.model._default_manager.all()
+        return queryset if using is None else queryset.using(using)
+
+    @property
+    def paths(self):
+        """
+        The query paths from the root model to every model in the relation tree of the serializer.
+        A GenericForeignKey can't be followed in a query, changes of its objects are not tracked
+        :return: dict[type[models.Model], list[str]], '' for the root model
+        """
+        if self._paths is None:
+            paths = {self.model._meta.concrete_model: ['']}
+            for node in self.serializer_class.database_plan.nodes():
+                if node.generic:
+                    continue
+                try:
+                    fields = resolve_lookup(self.model, node.lookup, accessor=True)
+                except FieldDoesNotExist:
+                    continue
+                model = getattr(fields[-1], 'related_model', None)
+                if model is None or any(not hasattr(field, 'get_internal_type') and
+                                        not isinstance(field, ForeignObjectRel) for field in fields):
+                    continue
+                path = '__'.join(
+                    field.field.related_query_name() if isinstance(field, ForeignObjectRel) else field.name
+                    for field in fields
+                )
+                paths.setdefault(model._meta.concrete_model, []).append(path)
+            self._paths = paths
+        return self._paths
+
+    def affected(self, model, pks, using=None):
+        """
+        The primary keys of the root objects of which the representation includes the objects
+        :param model: type[models.Model]
+        :param pks: Iterable[object]
+        :param using: str | None
+        :return: set[str]
+        """
+        pks = [pk for pk in pks if pk is not None]
+        affected = set()
+        for path in self.paths.get(model._meta.concrete_model, []) if pks else []:
+            if not path:
+                affected.update(str(pk) for pk in pks)
+                continue
+            affected.update(str(pk) for pk in self.model._base_manager.using(using).filter(**{
+                f'{path}__pk__in': pks
+            }).values_list('pk', flat=True).distinct())
+        return affected
+
+    def mark(self, object_pks, using=None):
+        """
+        Add the objects to the dirty queue, the queue is stored in the database of the objects
+        :param object_pks: Iterable[str]
+        :param using: str | None, the database of the objects, None lets the router decide
+        :return: None
+        """
+        DirtyRepresentation.objects.db_manager(using).bulk_create([
+            DirtyRepresentation(serializer=self.key, object_pk=object_pk) for object_pk in set(object_pks)
+        ])
+
+    def rebuild(self, using=None):
+        """
+        Mark every object as dirty and render all representations
+        :param using: str | None, the database of the objects, None lets the router decide
+        :return: int, the amount of rendered objects
+        """
+        self.mark((str(pk) for pk in self.get_queryset(using).values_list('pk', flat=True)), using)
+        return self.refresh(using=using)
+
+    def refresh(self, limit=None, using=None):
+        """
+        Render the representations of the objects in the dirty queue. An object that changes during the refresh is
+        marked again, its entry stays in the queue
+        :param limit: int | None, stop after this amount of objects
+        :param using: str | None, the database of the objects, None lets the router decide
+        :return: int, the amount of rendered objects
+        """
+        rendered = 0
+        dirty = DirtyRepresentation.objects.using(using).filter(serializer=self.key)
+        while limit is None or rendered < limit:
+            object_pks = set(dirty.order_by().values_list('object_pk', flat=True).distinct()[:self.batch_size])
+            if not object_pks:
+                break
+            # the entries that exist before rendering, an object marked while it gets rendered will be rendered again
+            entries = list(dirty.filter(object_pk__in=object_pks).values_list('pk', flat=True))
+            with transaction.atomic(using=using):
+                self._store(object_pks, using)
+                dirty.filter(pk__in=entries).delete()
+            rendered += len(object_pks)
+        return rendered
+
+    def render(self, object_pks, using=None):
+        """
+        Serialize the objects and render their json
+        :param object_pks: Iterable[str]
+        :param using: str | None, the database of the objects, None lets the router decide
+        :return: dict[str, str], the json by primary key
+        """
+        serializer = self.serializer_class(
+            self.get_queryset(using).filter(pk__in=list(object_pks)), many=True, context=self.context
+        )
+        renderer = JSONRenderer()
+        data = serializer.data
+        rows = zip(serializer.instance, data)
+        return {str(instance.pk): renderer.render(item).decode('utf-8') for instance, item in rows}
+
+    def _store(self, object_pks, using=None):
+        """
+        :param object_pks: set[str]
+        :param using: str | None
+        :return: None
+        """
+        rendered = self.render(object_pks, using)
+        stored = MaterializedRepresentation.objects.using(using).filter(serializer=self.key, object_pk__in=object_pks)
+        # the objects that don't exist anymore
+        stored.exclude(object_pk__in=list(rendered)).delete()
+        existing = {row.object_pk: row for row in stored.filter(object_pk__in=list(rendered)).only('pk', 'object_pk')}
+        now = timezone.now()
+        for object_pk, row in existing.items():
+            row.data, row.version, row.updated_at = rendered[object_pk], self.version, now
+        MaterializedRepresentation.objects.db_manager(using).bulk_update(
+            existing.values(), ['data', 'version', 'updated_at']
+        )
+        MaterializedRepresentation.objects.db_manager(using).bulk_create([
+            MaterializedRepresentation(serializer=self.key, object_pk=object_pk, data=data, version=self.version)
+            for object_pk, data in rendered.items() if object_pk not in existing
+        ])
+
+    def stream_json(self, queryset):
+        """
+        Yields the json of the queryset from the stored representations, in the order of the queryset.
+        Objects without a current representation (dirty, not stored yet or of another version) are serialized
+        :param queryset: models.QuerySet
+        :return: Iterator[bytes]
+        """
+        yield b'['
+        separator = b''
+        pks = iter(queryset.values_list('pk', flat=True).iterator())
+        while True:
+            chunk = [str(pk) for _, pk in zip(range(self.batch_size), pks)]
+            if not chunk:
+                break
+            fragments = dict(MaterializedRepresentation.objects.using(queryset.db).filter(
+                serializer=self.key, version=self.version, object_pk__in=chunk
+            ).exclude(object_pk__in=DirtyRepresentation.objects.using(queryset.db).filter(
+                serializer=self.key, object_pk__in=chunk
+            ).values('object_pk')).values_list('object_pk', 'data'))
+            missing = [object_pk for object_pk in chunk if object_pk not in fragments]
+            if missing:
+                fragments.update(self.render(missing, queryset.db))
+            for object_pk in chunk:
+                if object_pk in fragments:
+                    yield separator + fragments[object_pk].encode('utf-8')
+                    separator = b','
+        yield b']'
+
+
+def _changed(instance, using, models_pks=()):
+    """
+    Mark the root objects of every materializer the changed objects are part of
+    :param instance: models.Model
+    :param using: str
+    :param models_pks: Iterable[tuple[type[models.Model], Iterable[object]]], other changed objects
+    :return: None
+    """
+    for materializer in _registry.values():
+        affected = materializer.affected(type(instance), [instance.pk], using)
+        for model, pks in models_pks:
+            affected |= materializer.affected(model, pks, using)
+        affected |= instance.__dict__.get('_materialized_affected', {}).pop(materializer.key, set())
+        if affected:
+            materializer.mark(affected, using)
+
+
+def _pre_save(sender, instance, raw=False, using=None, **kwargs):
+    # the objects the instance belonged to before the change, for example when a foreign key gets changed
+    if not _registry or instance._state.adding or instance.pk is None:
+        return
+    for materializer in _registry.values():
+        if instance._meta.concrete_model in materializer.paths:
+            instance.__dict__.setdefault('_materialized_affected', {})[materializer.key] = materializer.affected(
+                sender, [instance.pk], using
+            )
+
+
+def _post_save(sender, instance, using=None, **kwargs):
+    if _registry:
+        _changed(instance, using)
+
+
+def _pre_delete(sender, instance, using=None, **kwargs):
+    # before the relations get removed
+    if _registry:
+        _changed(instance, using)
+
+
+def _m2m_changed(sender, instance, action, model=None, pk_set=None, using=None, **kwargs):
+    if _registry and action in ('post_add', 'post_remove', 'pre_clear'):
+        _changed(instance, using, [(model, pk_set or ())])
+
+
+pre_save.connect(_pre_save, dispatch_uid='queryset_serializer.materialized')
+post_save.connect(_post_save, dispatch_uid='queryset_serializer.materialized')
+pre_delete.connect(_pre_delete, dispatch_uid='queryset_serializer.materialized')
+m2m_changed.connect(_m2m_changed, dispatch_uid='queryset_serializer.materialized')
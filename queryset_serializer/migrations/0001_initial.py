@@ -0,0 +1,41 @@
+# Generated by Django 2.2.9 on 2026-10-19 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyRepresentation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serializer', models.CharField(max_length=255)),
+                ('object_pk', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MaterializedRepresentation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serializer', models.CharField(max_length=255)),
+                ('object_pk', models.CharField(max_length=64)),
+                ('data', models.TextField()),
+                ('version', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('serializer', 'object_pk')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dirtyrepresentation',
+            index=models.Index(fields=['serializer', 'object_pk'], name='queryset_se_seriali_df3e63_idx'),
+        ),
+    ]
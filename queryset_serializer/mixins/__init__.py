@@ -0,0 +1,56 @@
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag)
+from rest_framework import mixins, status
+from rest_framework.response import Response
+
+
+class ConditionalListModelMixin(mixins.ListModelMixin):
+    """
+    List a queryset, but answer 304 Not Modified when the fingerprint of the queryset
+    (see QuerySetSerializer.fingerprint) matches the If-None-Match / If-Modified-Since header.
+    In that case nothing gets prefetched or serialized. When the fingerprint can't see every relation (a
+    GenericForeignKey) the list is always serialized.
+    The serializer class should be a QuerySetSerializer
+    """
+    def get_fingerprint(self, request):
+        """
+        :param request: Request
+        :return: QuerySetFingerprint
+        """
+        return self.get_serializer_class().fingerprint(
+            self.filter_queryset(self.get_queryset()), request.get_full_path()
+        )
+
+    @staticmethod
+    def is_not_modified(request, etag, last_modified):
+        """
+        :param request: Request
+        :param etag: str
+        :param last_modified: datetime.datetime | None
+        :return: bool
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = [value[2:] if value.startswith('W/') else value for value in parse_etags(if_none_match)]
+            return etag in etags or '*' in etags
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return bool(if_modified_since and last_modified and int(last_modified.timestamp()) <= if_modified_since)
+
+    def list(self, request, *args, **kwargs):
+        fingerprint = self.get_fingerprint(request)
+        if not fingerprint.complete:
+            # a change of a generic relation wouldn't change the etag
+            return super().list(request, *args, **kwargs)
+        etag = quote_etag(fingerprint.etag)
+        last_modified = fingerprint.last_modified
+        headers = {'ETag': etag}
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(last_modified.timestamp())
+
+        if self.is_not_modified(request, etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response = super().list(request, *args, **kwargs)
+        for key, value in headers.items():
+            response[key] = value
+        return response
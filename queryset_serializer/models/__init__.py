@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class MaterializedRepresentation(models.Model):
+    """
+    The stored representation of a single object, per serializer (see queryset_serializer.materialized)
+    """
+    serializer = models.CharField(max_length=255)
+    object_pk = models.CharField(max_length=64)
+    # the json of the representation of the object
+    data = models.TextField()
+    # the version of the materializer the representation got rendered with, other versions are stale
+    version = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('serializer', 'object_pk')
+
+
+class DirtyRepresentation(models.Model):
+    """
+    Queue of the objects of which the stored representation has to be rendered again. An object can be in the queue
+    more than once, a change during a refresh is kept since only the entries that were read get removed
+    """
+    serializer = models.CharField(max_length=255)
+    object_pk = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['serializer', 'object_pk'])]
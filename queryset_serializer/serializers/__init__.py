@@ -1,20 +1,136 @@
+import copy
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable, Sequence
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.query import ModelIterable
 from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 
-from queryset_serializer.db.models import SerializerPrefetch
+from queryset_serializer.db.compiler import compile_prefetch
+from queryset_serializer.db.fingerprint import QuerySetFingerprint
+from queryset_serializer.db.loader import (ColumnRelationLoader,
+                                           GenericRelationLoader,
+                                           RelationLoader)
+from queryset_serializer.db.models import (SerializerPrefetch,
+                                           get_prefetch_queryset,
+                                           get_related_field,
+                                           get_traversed_lookups,
+                                           instrument_prefetch,
+                                           instrumented_iterable,
+                                           is_relation_loaded,
+                                           large_in_prefetch, resolve_lookup,
+                                           resolve_prefetch_queryset,
+                                           route_lookups, route_prefetch,
+                                           set_prefetch_queryset)
+from queryset_serializer.governor import (BUDGETS, ResourceGovernor,
+                                          get_governor, govern_prefetch,
+                                          governed_iterable)
+from queryset_serializer.serializers.columnar import ColumnarExporter
+from queryset_serializer.serializers.generic import GenericQuerySetSerializer
+from queryset_serializer.serializers.hyperlink import template_hyperlinks
+from queryset_serializer.serializers.lazy import LazyReturnList
 from queryset_serializer.serializers.model import PrefetchToAttrSerializerList
+from queryset_serializer.serializers.plan import RelationPlan
+from queryset_serializer.serializers.relations import read_column_values
+from queryset_serializer.serializers.validators import UniqueBatch
+from queryset_serializer.signals import (encoded, has_listeners,
+                                         plan_prepared, serialized)
+
+
+# the options of override_config, per thread / task. The budgets only apply to a single call, they are kept apart so
+# they don't get a scoped meta of their own
+_config_overrides = ContextVar('queryset_serializer_config', default=None)
+_budget_overrides = ContextVar('queryset_serializer_budgets', default=None)
+
+# the options that are only read when the serializer class gets created, override_config can't change them
+CLASS_OPTIONS = ('id_only_relations',)
+
+# the ids of the instances BatchedListSerializer loaded the plan of a nested serializer for, while it serializes them
+_batched_instances = ContextVar('queryset_serializer_batched', default=frozenset())
+
+# the model fields of which the value a values_list query returns is what the serializer field represents, the
+# `many` relations that only serialize these (or the primary key) are loaded as columns (see id_only_relations)
+VALUE_COLUMN_FIELDS = (
+    models.AutoField, models.BigAutoField, models.BooleanField, models.CharField, models.DateField,
+    models.DecimalField, models.DurationField, models.FloatField, models.IntegerField, models.NullBooleanField,
+    models.TextField, models.TimeField, models.UUIDField,
+)
 
 
 def get_meta(cls):
     """
-    Will try and find the serializer class PrefetchMeta
+    Will try and find the serializer class PrefetchMeta, the options of override_config take precedence
+    (the attrs of a class that is being created are never overridden)
     :param cls:
     :return:
     """
     if isinstance(cls, dict):
         return cls.get('Meta', Config.meta_class)
-    else:
-        return getattr(cls, 'Meta', Config.meta_class)
+    meta = getattr(cls, 'Meta', Config.meta_class)
+    overrides = _config_overrides.get()
+    return get_scoped_meta(meta, overrides) if overrides else meta
+
+
+@lru_cache(maxsize=128)
+def get_scoped_meta(meta, overrides):
+    """
+    Subclass of the meta with the overridden options, there is one class per meta and configuration so everything
+    that gets cached per meta (for example the field templates, see share_field_templates) is kept per configuration.
+    The field templates are stored on the scoped meta itself, they are dropped together with it
+    :param meta: type
+    :param overrides: tuple[tuple[str, object]]
+    :return: type
+    """
+    return type(meta.__name__, (meta,), dict(overrides, scoped_options=overrides, scoped_field_templates={}))
+
+
+def get_budget_overrides():
+    """
+    The budgets set by override_config for the current thread / task
+    :return: dict[str, object]
+    """
+    return dict(_budget_overrides.get() or ())
+
+
+@contextmanager
+def override_config(**options):
+    """
+    Override options of the Meta of every serializer for the current thread / task only, the serializer has to be
+    created and serialized inside the block:
+        with override_config(prefetch_listing=PrefetchSerializerList):
+            data = MySerializer(queryset, many=True).data
+    The budgets (see ResourceGovernor) only apply to the call, the other options get a scoped Meta per configuration.
+    The options that are only read when the class gets created (CLASS_OPTIONS) are rejected
+    :param options: the options of DefaultMetaQuerySetSerializer
+    :return: None
+    """
+    unknown = [name for name in options if not hasattr(DefaultMetaQuerySetSerializer, name)]
+    if unknown:
+        raise TypeError(f'Unknown options: {", ".join(unknown)}')
+    fixed = [name for name in options if name in CLASS_OPTIONS]
+    if fixed:
+        raise TypeError(f'Options can only be set in the Meta of the serializer: {", ".join(fixed)}')
+    # the scoped metas are cached per configuration, a list (fingerprint_version_fields) is stored as tuple
+    options = {name: tuple(value) if isinstance(value, list) else value for name, value in options.items()}
+    unhashable = [name for name, value in options.items() if not isinstance(value, Hashable)]
+    if unhashable:
+        raise TypeError(f'Options must be hashable: {", ".join(unhashable)}')
+    budgets = {name: options.pop(name) for name in BUDGETS if name in options}
+    current = _config_overrides.get() or ()
+    token = _config_overrides.set(tuple(sorted({**dict(current), **options}.items())) or None)
+    budget_token = _budget_overrides.set(tuple({**get_budget_overrides(), **budgets}.items()) or None)
+    try:
+        yield
+    finally:
+        _budget_overrides.reset(budget_token)
+        _config_overrides.reset(token)
 
 
 def get_meta_val(meta, variable):
@@ -36,23 +152,231 @@ class _QuerySetSerializer(serializers.ModelSerializer):
     pass
 
 
+def copy_field(field):
+    """
+    Shallow copy of an unbound field, the fields that are bound to the field (the child of a ListSerializer /
+    ListField / ManyRelatedField) are copied as well and bound to the copy
+    :param field: fields.Field
+    :return: fields.Field
+    """
+    clone = copy.copy(field)
+    # the fields of a nested serializer are bound to the serializer, the copy has to build its own
+    clone.__dict__.pop('fields', None)
+    # validators and defaults with set_context (UniqueValidator, CurrentUserDefault) store the state of the request,
+    # these can't be shared
+    if '_validators' in clone.__dict__:
+        clone._validators = [
+            copy.copy(validator) if hasattr(validator, 'set_context') else validator for validator in clone._validators
+        ]
+    if hasattr(clone.__dict__.get('default'), 'set_context'):
+        clone.default = copy.copy(clone.default)
+    for name in ('error_messages', 'style'):
+        if isinstance(clone.__dict__.get(name), dict):
+            setattr(clone, name, dict(clone.__dict__[name]))
+    for name in ('child', 'child_relation'):
+        child = clone.__dict__.get(name)
+        if isinstance(child, serializers.Field):
+            child = copy_field(child)
+            child.parent = clone
+            setattr(clone, name, child)
+    return clone
+
+
 def check_parent(self):
-    parent_is_not_none = self.parent is not None
-    parent_is_not_instance = not isinstance(self.parent, (Config.meta_class.base_serializer_class,
-                                                          Config.meta_class.list_serializer_class))
-    return parent_is_not_none and parent_is_not_instance
+    if self.parent is None:
+        return False
+    # the (scoped) options of the serializer, for a list serializer those of its child
+    meta = get_meta(type(self.child if isinstance(self, serializers.ListSerializer) else self))
+    return not isinstance(self.parent, (get_meta_val(meta, 'base_serializer_class'),
+                                        get_meta_val(meta, 'list_serializer_class')))
 
 
 class QuerySetListSerializer(serializers.ListSerializer):
     def get_attribute(self, curr_obj):
         if check_parent(self):
-            curr_obj = self.child._check_value(curr_obj, True)
+            curr_obj = self.child._check_value(curr_obj, True, self.context)
         return super().get_attribute(curr_obj)
 
     def to_representation(self, data):
-        if check_parent(self):
-            data = self.child._check_value(data, True)
-        return super().to_representation(data)
+        # checked once per call, nothing gets measured when nothing is subscribed
+        instrumented = self.parent is None and has_listeners(serialized)
+        start = time.perf_counter() if instrumented else None
+
+        with self.child._govern() if self.parent is None else nullcontext() as governor:
+            if check_parent(self):
+                data = self.child._check_value(data, True, self.context)
+            elif self.parent is None:
+                data = self.child._prefetch_deferred(data, self.context)
+            if self.parent is None or check_parent(self):
+                data = self.child._load_batched(data)
+            ret = super().to_representation(data) if governor is None else self._governed_representation(data)
+        if governor is not None:
+            self.budget_usage = governor.usage()
+
+        if instrumented:
+            serialized.send(sender=type(self.child), duration=time.perf_counter() - start, items=len(ret))
+        return ret
+
+    def to_internal_value(self, data):
+        # the unique validators of the child check all items with one query per constraint, see UniqueBatch
+        if not isinstance(data, list) or not get_meta_val(get_meta(type(self.child)), 'batch_unique_validation'):
+            return super().to_internal_value(data)
+        with UniqueBatch.collect(self.child, data):
+            return super().to_internal_value(data)
+
+    def _governed_representation(self, data):
+        """
+        The same as ListSerializer.to_representation, but the max_duration budget is checked with every item
+        :param data: models.QuerySet | models.Manager | list[models.Model]
+        :return: list[dict]
+        """
+        governor = get_governor()
+        ret = []
+        for item in data.all() if isinstance(data, models.Manager) else data:
+            governor.check_duration()
+            ret += [self.child.to_representation(item)]
+        return ret
+
+    @property
+    def data(self):
+        """
+        When lazy_representation is enabled the root list serializer returns a LazyReturnList, the rows get fetched
+        but the items are only serialized when they are read
+        :return: ReturnList | LazyReturnList
+        """
+        lazy = self.parent is None and get_meta_val(get_meta(type(self.child)), 'lazy_representation')
+        if not lazy or hasattr(self, 'initial_data') or self.instance is None:
+            return super().data
+        if not hasattr(self, '_data'):
+            self._data = self.lazy_representation(self.instance)
+        return self._data
+
+    def lazy_representation(self, data):
+        """
+        Fetch the rows and load the batched relations, without serializing anything yet
+        :param data: models.QuerySet | models.Manager | list[models.Model]
+        :return: LazyReturnList
+        """
+        with self.child._govern() as governor:
+            data = self.child._load_batched(self.child._prefetch_deferred(data, self.context))
+            instances = list(data.all() if isinstance(data, models.Manager) else data)
+        if governor is not None:
+            self.budget_usage = governor.usage()
+        return LazyReturnList(instances, self.child.to_representation, serializer=self)
+
+    def stream_json(self):
+        """
+        Yields the json encoded data in chunks. When the prefetch_listing is able to let the database render the json
+        (see DatabaseJSONSerializerList) the rows will never be loaded into models or dicts,
+        otherwise this falls back to rendering serializer.data
+        :return: Iterator[bytes]
+        """
+        chunks = self.child._stream_json(self.instance)
+        if chunks is None:
+            return iter([JSONRenderer().render(self.data)])
+        return chunks
+
+    def columnar(self, chunk_size=2000):
+        """
+        Export the data column wise instead of as a dict per row, to one nested serializers become prefixed columns
+        and many relations become list columns. See ColumnarExporter.columns / to_csv / to_arrow
+        :param chunk_size: int, amount of rows fetched (and prefetched) at once
+        :return: ColumnarExporter
+        """
+        return ColumnarExporter(self, chunk_size)
+
+    @property
+    def encoded_data(self):
+        """
+        :return: bytes
+        """
+        instrumented = has_listeners(encoded)
+        start = time.perf_counter() if instrumented else None
+        data = b''.join(self.stream_json())
+        if instrumented:
+            encoded.send(sender=type(self.child), duration=time.perf_counter() - start, size=len(data))
+        return data
+
+
+class BatchedListSerializer(serializers.ListSerializer):
+    """
+    List serializer for plain (non QuerySetSerializer) serializers that have QuerySetSerializers as fields.
+    Normally every nested QuerySetSerializer would apply its plan per row, this class first fetches the relation and
+    the plan of the nested serializers for all rows at once. Use it as `list_serializer_class` in the Meta of the
+    plain serializer
+    """
+    def to_representation(self, data):
+        instances = list(data.all() if isinstance(data, models.Manager) else data)
+        batched = self.prefetch_nested(self.child, instances)
+        # the nested serializers don't apply their plan again for these instances (see QuerySetSerializer._check_value)
+        token = _batched_instances.set(_batched_instances.get() | batched)
+        try:
+            return super().to_representation(instances)
+        finally:
+            _batched_instances.reset(token)
+
+    @staticmethod
+    def _get_nested(serializer):
+        """
+        Get the nested QuerySetSerializers of the serializer which source is a relation of a model
+        :param serializer: serializers.Serializer
+        :return: list[tuple[str, QuerySetSerializer]]
+        """
+        meta = get_meta(serializer)
+        model = getattr(meta, 'model', None)
+        if model is None:
+            return []
+        nested = []
+        for field in serializer.fields.values():
+            # the source of a many field is set on the list serializer
+            source = field.source
+            if isinstance(field, serializers.ListSerializer):
+                field = field.child
+            if not isinstance(field, QuerySetSerializer) or source in (None, '*') or '.' in source:
+                continue
+            try:
+                related_field = get_related_field(model, source)
+            except FieldDoesNotExist:
+                # a property or method, this can't be prefetched
+                continue
+            if related_field is not None:
+                nested += [(source, field)]
+        return nested
+
+    @classmethod
+    def prefetch_nested(cls, serializer, instances):
+        """
+        Prefetch the relations of the nested QuerySetSerializers and their plans for all instances at once
+        :param serializer: serializers.Serializer
+        :param instances: list[models.Model]
+        :return: frozenset[int], the ids of the related instances the plans are loaded for
+        """
+        instances = [instance for instance in instances if isinstance(instance, models.Model)]
+        batched = set()
+        if not instances:
+            return frozenset()
+        for source, field in cls._get_nested(serializer):
+            prefetch_queryset = getattr(getattr(field, 'Meta', None), 'prefetch_queryset', None)
+            if prefetch_queryset is not None:
+                queryset = resolve_prefetch_queryset(
+                    prefetch_queryset, get_prefetch_queryset(source, type(instances[0])), serializer.context
+                )
+                source = models.Prefetch(source, queryset=queryset)
+            models.prefetch_related_objects(instances, source)
+            source = getattr(source, 'prefetch_to', source)
+            related = []
+            for instance in instances:
+                value = getattr(instance, source)
+                if isinstance(value, models.Manager):
+                    related += list(value.all())
+                elif value is not None:
+                    related += [value]
+            batched.update(id(instance) for instance in related)
+            related = [instance for instance in related if not field._is_prefetched(instance)]
+            if related:
+                field._prefetch_instances(related, serializer.context)
+                field._load_batched(related)
+        return frozenset(batched)
 
 
 class DefaultMetaQuerySetSerializer:
@@ -76,6 +400,65 @@ class DefaultMetaQuerySetSerializer:
     # If you don't want this use the class PrefetchSerializerList instead (this will only prefetch
     prefetch_listing = PrefetchToAttrSerializerList
 
+    # Load the `to one` relations at the end of prefetch branches in one query per model (over all branches)
+    # instead of one query per branch, the loaded instances are shared between the branches
+    batch_to_one_relations = False
+
+    # Fields that change whenever a row changes, the first one found on a model is used for its fingerprint
+    fingerprint_version_fields = ('updated_at', 'modified', 'last_modified', 'version')
+
+    # Database alias the whole plan (root queryset, selects and every prefetch) is read from, for example a read
+    # replica. When None the prefetches are read from the database of the root queryset if it has one (.using())
+    database_alias = None
+
+    # When a prefetch filters on more parents than this threshold, the IN over the keys of the parents gets split in
+    # chunks of this size (SQLite allows at most 999 variables by default). None disables this
+    large_prefetch_threshold = None
+
+    # Above the threshold filter the relations of the first level with a subquery over the root queryset instead of
+    # with chunks of keys
+    large_prefetch_subquery = False
+
+    # Cache the compiled sql of the prefetch queries per serializer and lookup, the next prefetches of the same
+    # relation only compile the IN over their parents. Prefetches with a callable prefetch_queryset are compiled
+    # every time, their query can depend on the context
+    cache_prefetch_sql = False
+
+    # Fetch `many` relations that are only serialized as ids (PrimaryKeyRelatedField(many=True), SlugRelatedField or
+    # a nested serializer with a single column as field) with a values_list query, without building model instances.
+    # The values are stored next to the relation, the relation itself is not prefetched
+    id_only_relations = False
+
+    # serializer.data of a root list serializer returns a LazyReturnList, the rows are fetched but every item is only
+    # serialized when it is read (for consumers that only read a part of the data, or only its length)
+    lazy_representation = False
+
+    # Budgets of a serialization, enforced while the plan is executed and the data is serialized. Going over one
+    # raises BudgetExceeded, the rows are counted while they are read so the fetch stops early. None is no budget.
+    # Only the budgets of the root serializer apply, use override_config to set them for a single call
+    # rows of the root queryset
+    max_rows = None
+    # rows per prefetched branch, over all parents
+    max_branch_rows = None
+    # queries over all databases
+    max_queries = None
+    # seconds
+    max_duration = None
+
+    # Hyperlinked fields reverse the url pattern of their view name once per serializer instance and fill in the
+    # lookup value of every row, instead of calling reverse() per row. The urls are the same
+    templated_urls = True
+
+    # Build the fields of a serializer once per class and give every instance shallow copies, instead of letting
+    # every instance deep copy and introspect them. The templates are built from the first instance, only enable
+    # this when get_fields / get_extra_kwargs don't depend on the instance (context)
+    share_field_templates = False
+
+    # Validating a list checks the unique / unique together constraints of all items with one query per constraint
+    # instead of a query per item, duplicates within the list get the same error as a value that already exists.
+    # Only constraints over integers, uuids, booleans and (with an exact collation) text are batched
+    batch_unique_validation = False
+
 
 class Config:
     meta_class = DefaultMetaQuerySetSerializer
@@ -99,7 +482,10 @@ class QuerySetMetaSerializer(serializers.SerializerMetaclass):
 
         cls._set_prefetch_fields(attrs)
         cls._set_source_prefetch_serializers(attrs)
-        return super(serializers.SerializerMetaclass, cls).__new__(cls, name, bases, attrs)
+        new_cls = super(serializers.SerializerMetaclass, cls).__new__(cls, name, bases, attrs)
+        if has_listeners(plan_prepared):
+            plan_prepared.send(sender=new_cls, cached=False, **attrs['database_relations'])
+        return new_cls
 
     @classmethod
     def _set_source_prefetch_serializers(mcs, attrs) -> None:
@@ -131,25 +517,156 @@ class QuerySetMetaSerializer(serializers.SerializerMetaclass):
 
         # could possibly also be done with Prefetch object and then in the queryset parameter selecting / prefetching
         # the child its parameters. Not sure about outcome and if that will prefetch everything in one go or chuncks
+
+        # the relations are collected in a trie, this way the same relation mentioned twice (for example trough
+        # two nested serializers on the same relation, or a select that is also prefetched) only gets fetched once
+        plan = RelationPlan.from_relations(attrs['database_relations'])
+        id_only = get_meta_val(get_meta(attrs), 'id_only_relations')
         for has_many, field_name, obj in mcs._get_related_prefetches(attrs):
-            if not has_many:
-                # if the relations has `to one` then we can copy its relations in the same way
-                attrs['database_relations']['select'] += (
-                    [field_name] + [f'{field_name}__{rel}' for rel in obj.database_relations['select']]
-                )
-                attrs['database_relations']['prefetch'] += (
-                    [f'{field_name}__{rel}' for rel in obj.database_relations['prefetch']]
-                )
-            else:
-                # if the relations is `to many` then even the selects need to be moved to prefetch since now it will
-                # result into multiple fields
-                attrs['database_relations']['prefetch'] += (
-                    [field_name] + [f'{field_name}__{rel}' for rel in (
-                        obj.database_relations['select'] + obj.database_relations['prefetch']
-                    )]
-                )
+            fields = getattr(getattr(obj, 'Meta', None), 'fields', None)
+            # a `many` relation that only serializes its ids doesn't need the related instances
+            columns = mcs._get_serializer_columns(obj) if has_many and id_only else None
+            if columns is not None:
+                plan.add(field_name, False, fields, columns)
+                continue
+            # if the relations has `to one` then its selects can be copied as selects, if the relation is `to many`
+            # then even the selects need to be moved to prefetch since now it will result into multiple fields
+            child_plan = getattr(obj, 'database_plan', None)
+            if not isinstance(child_plan, RelationPlan):
+                child_plan = RelationPlan.from_relations(obj.database_relations)
+            node = plan.graft(field_name, child_plan, has_many, fields)
+            # the relation is prefetched from the queryset of the child serializer, its own plan is applied on top
+            prefetch_queryset = getattr(getattr(obj, 'Meta', None), 'prefetch_queryset', None)
+            if prefetch_queryset is not None:
+                node.queryset = prefetch_queryset
+
+        # PrimaryKeyRelatedField(many=True) / SlugRelatedField(many=True) / HyperlinkedRelatedField are otherwise
+        # fetched per row
+        model = getattr(get_meta(attrs), 'model', None)
+        for field_name, obj in attrs['_declared_fields'].items():
+            columns = mcs._get_related_field_columns(obj, model, obj.source or field_name) if id_only else None
+            select = mcs._get_hyperlinked_select(obj) if columns is None else None
+            if columns is None and select is None:
+                continue
+            source = obj.source or field_name
+            if source == '*' or '.' in source:
+                continue
+            if columns is not None:
+                plan.add(source, False, columns=columns)
+            elif mcs._is_relation(model, source):
+                plan.add(source, select)
+
+        # a GenericForeignKey can not be prefetched with the plan of the related serializer, these get loaded
+        # per content type after the queryset has been fetched (see QuerySetSerializer._load_batched)
+        for field_name, obj in attrs['_declared_fields'].items():
+            if isinstance(obj, GenericQuerySetSerializer):
+                plan.add_generic(obj.source or field_name, obj.serializers)
+
+        attrs['database_plan'] = plan
+        attrs['database_relations'] = plan.as_relations()
         return attrs['database_relations']
 
+    @classmethod
+    def _get_related_field_columns(mcs, obj, model, source):
+        """
+        The columns of the related model a `many` related field serializes
+        :param obj: serializers.Field
+        :param model: type[models.Model] | None
+        :param source: str
+        :return: tuple[str] | None, None when the field needs the related instances
+        """
+        if not isinstance(obj, serializers.ManyRelatedField) or not mcs._is_relation(model, source):
+            return None
+        related_model = resolve_lookup(model, source, accessor=True)[-1].related_model
+        to_representation = type(obj.child_relation).to_representation
+        if to_representation is serializers.PrimaryKeyRelatedField.to_representation:
+            return 'pk',
+        slug_field = getattr(obj.child_relation, 'slug_field', None)
+        if to_representation is serializers.SlugRelatedField.to_representation:
+            return (slug_field,) if mcs._is_value_column(related_model, slug_field) else None
+        # the url only needs the lookup_field (and the pk)
+        lookup_field = getattr(obj.child_relation, 'lookup_field', None)
+        if mcs._get_hyperlinked_select(obj) is not None and mcs._is_value_column(related_model, lookup_field):
+            return lookup_field,
+        return None
+
+    @staticmethod
+    def _is_value_column(model, name):
+        """
+        Only the primary key and columns of which the fetched value is the same as the attribute of the instance can
+        be serialized without the instance (a FileField needs its storage for the url, a property isn't a column)
+        :param model: type[models.Model]
+        :param name: str
+        :return: bool
+        """
+        if name == 'pk':
+            return True
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        if not field.concrete or field.is_relation:
+            return False
+        return field.primary_key or isinstance(field, VALUE_COLUMN_FIELDS)
+
+    @staticmethod
+    def _get_hyperlinked_select(obj):
+        """
+        If a hyperlinked field needs the related instance(s), these are selected / prefetched
+        :param obj: serializers.Field
+        :return: bool | None, True for a `to one` relation, False for a `many` relation, None when no instances are
+            needed (a `to one` relation linked by pk only needs the foreign key)
+        """
+        many = isinstance(obj, serializers.ManyRelatedField)
+        relation = obj.child_relation if many else obj
+        if not isinstance(relation, serializers.HyperlinkedRelatedField) or (
+            isinstance(relation, serializers.HyperlinkedIdentityField) or
+            type(relation).to_representation is not serializers.HyperlinkedRelatedField.to_representation or
+            type(relation).get_url is not serializers.HyperlinkedRelatedField.get_url
+        ):
+            return None
+        if many:
+            return False
+        return None if relation.use_pk_only_optimization() else True
+
+    @staticmethod
+    def _is_relation(model, lookup):
+        """
+        :param model: type[models.Model] | None
+        :param lookup: str
+        :return: bool, if the lookup can be selected / prefetched from the model
+        """
+        if model is None:
+            return False
+        try:
+            field = resolve_lookup(model, lookup, accessor=True)[-1]
+        except FieldDoesNotExist:
+            return False
+        return getattr(field, 'related_model', None) is not None
+
+    @classmethod
+    def _get_serializer_columns(mcs, obj):
+        """
+        The column a nested serializer serializes, when it only has a single field that is a column of its model
+        (for example fields = ('id',))
+        :param obj: QuerySetSerializer
+        :return: tuple[str] | None, None when the serializer needs the related instances
+        """
+        meta = getattr(obj, 'Meta', None)
+        fields = getattr(meta, 'fields', None)
+        model = getattr(meta, 'model', None)
+        if model is None or not isinstance(fields, (list, tuple)) or len(fields) != 1 or obj._declared_fields:
+            return None
+        if getattr(meta, 'extra_kwargs', None) or getattr(meta, 'prefetch_queryset', None) is not None:
+            return None
+        if obj.database_plan.children:
+            return None
+        if type(obj).to_representation is not QuerySetSerializer.to_representation:
+            return None
+        if not mcs._is_value_column(model, fields[0]):
+            return None
+        return ('pk',) if fields[0] == 'pk' else (model._meta.get_field(fields[0]).name,)
+
     @classmethod
     def _get_related_prefetches(mcs, attrs):
         """
@@ -176,55 +693,459 @@ class QuerySetMetaSerializer(serializers.SerializerMetaclass):
 class QuerySetSerializer(_QuerySetSerializer, metaclass=QuerySetMetaSerializer):
     # attribute that stores the relations of the serializer
     database_relations = {'select': [], 'prefetch': []}
+    # the trie from which database_relations is rendered
+    database_plan = RelationPlan()
+    # set on the unbound children of a GenericQuerySetSerializer, these are part of the serialization of their field
+    nested = False
+
+    def get_fields(self):
+        """
+        DRF builds the fields for every instance: the declared fields get deep copied and the model fields get
+        introspected. When share_field_templates is enabled the fields are built once per class, these templates are
+        never bound and every instance gets shallow copies of them
+        :return: OrderedDict[str, fields.Field]
+        """
+        cls = type(self)
+        meta = get_meta(cls)
+        if not get_meta_val(meta, 'share_field_templates'):
+            return self._build_fields(meta)
+        # stored on the class itself, a subclass has fields of its own. The sources of the fields depend on the
+        # prefetch_listing, so an overridden configuration gets templates of its own
+        scoped = getattr(meta, 'scoped_options', None) is not None
+        templates = meta.scoped_field_templates.get(cls) if scoped else cls.__dict__.get('_field_templates')
+        if templates is None:
+            templates = self._build_fields(meta)
+            if scoped:
+                meta.scoped_field_templates[cls] = templates
+            else:
+                cls._field_templates = templates
+        return OrderedDict((name, copy_field(field)) for name, field in templates.items())
+
+    def _build_fields(self, meta):
+        """
+        Build the fields the way DRF does and prepare them for the (scoped) configuration
+        :param meta: type
+        :return: OrderedDict[str, fields.Field]
+        """
+        fields = super().get_fields()
+        if get_meta_val(meta, 'templated_urls'):
+            template_hyperlinks(fields)
+        read_column_values(fields, type(self).database_plan)
+        return type(self)._set_scoped_sources(fields, meta)
+
+    @classmethod
+    def _set_scoped_sources(cls, fields, meta):
+        """
+        The prefetch_listing of the class set the sources of the prefetched fields when the class got created
+        (see set_serializer_sources), within override_config the sources are set by the overridden prefetch_listing
+        :param fields: OrderedDict[str, fields.Field], unbound fields that are not shared yet
+        :param meta: type
+        :return: OrderedDict[str, fields.Field]
+        """
+        if getattr(meta, 'scoped_options', None) is None:
+            return fields
+        own_prefix = get_meta_val(getattr(cls, 'Meta', Config.meta_class), 'prefetch_to_attr_prefix')
+        prefetch = cls.database_relations['prefetch'][::]
+        sourced = {
+            name: field for name, field in fields.items()
+            if name in prefetch and field.source in (None, f'{own_prefix}{name}')
+        }
+        for field in sourced.values():
+            field.source = None
+            field._kwargs.pop('source', None)
+        get_meta_val(meta, 'prefetch_listing').set_serializer_sources(
+            prefetch, sourced, get_meta_val(meta, 'prefetch_to_attr_prefix')
+        )
+        return fields
 
     def to_representation(self, instance):
-        if check_parent(self):
-            instance = self._check_value(instance, False)
-        return super().to_representation(instance)
+        root = self.parent is None and not self.nested
+        instrumented = root and has_listeners(serialized)
+        start = time.perf_counter() if instrumented else None
+
+        with self._govern() if root else nullcontext() as governor:
+            if check_parent(self):
+                instance = self._check_value(instance, False, self.context)
+            elif root:
+                instance = self._prefetch_deferred(instance, self.context)
+            ret = super().to_representation(instance)
+        if governor is not None:
+            self.budget_usage = governor.usage()
+
+        if instrumented:
+            serialized.send(sender=type(self), duration=time.perf_counter() - start, items=1)
+        return ret
 
     @classmethod
-    def _check_value(cls, value, multi_model=True):
+    def _check_value(cls, value, multi_model=True, context=None, defer=False):
         """
         If the value is a queryset then apply the prefetches and select related.
         if the value is not a queryset then return the value itself
         :param value:
+        :param multi_model: bool
+        :param context: dict, the context of the serializer, see Meta.prefetch_queryset
+        :param defer: bool, leave the prefetch of instances to to_representation, see _prefetch_deferred
         :return:
         """
 
         # in case it is a single model and not a queryset, then prefetches can be applied in this way to the model
         # itself. The queryset being None makes sure everything returns as if the queryset has no prefetches at all
-        if (not multi_model) and isinstance(value, models.Model):
-            models.prefetch_related_objects([value], *cls._prepare_prefetch_list())
+        if (not multi_model) and isinstance(value, models.Model) and not defer:
+            with cls._govern():
+                if id(value) not in _batched_instances.get():
+                    cls._prefetch_instances([value], context)
+                cls._load_batched(value)
+
+        # a list of models (for example a page of the pagination) gets the same treatment, the batched relations are
+        # loaded by the list serializer (see QuerySetListSerializer.to_representation)
+        if multi_model and isinstance(value, Iterable) and not isinstance(value, (
+            models.QuerySet, models.Manager, models.Model, str, bytes, dict
+        )):
+            instances = value if isinstance(value, Sequence) else list(value)
+            if instances and not defer and all(isinstance(instance, models.Model) for instance in instances):
+                cls._prefetch_instances(instances, context)
+            return instances
 
         if not isinstance(value, (models.QuerySet, models.Manager)):
             return value
 
         queryset = value.all() if isinstance(value, models.Manager) else value
+        batched = _batched_instances.get()
+        if queryset._result_cache is not None and all(id(instance) in batched for instance in queryset):
+            # prefetched together with the plan for all rows of the parent by BatchedListSerializer, applying the
+            # plan now would fetch the rows again
+            return queryset
+
+        queryset = cls._route_queryset(queryset)
+        instrumented = cls._send_plan_prepared()
 
-        prefetch_list = cls._prepare_prefetch_list(queryset)
+        prefetch_listing = cls._get_prefetch_listing(queryset)
         select = cls.database_relations['select'][::]
+        # a prefetch_listing can decide to prefetch some of the selects instead (see AdaptivePrefetchSerializerList)
+        if hasattr(prefetch_listing, 'select_list'):
+            select = prefetch_listing.select_list(select)
+        prefetch_list = cls._apply_prefetch_querysets(prefetch_listing.prefetch_list(), context)
+        # the levels the lookups of the user go through are prefetched by those lookups
+        traversed = get_traversed_lookups(queryset._prefetch_related_lookups)
+        if queryset._db is not None:
+            # carry the database of the root queryset into every prefetch (also the ones already on the queryset),
+            # a configured alias overrules the databases of the prefetches given by the user
+            force = get_meta_val(get_meta(cls), 'database_alias') is not None
+            queryset = queryset.prefetch_related(None).prefetch_related(
+                *route_lookups(queryset._prefetch_related_lookups, queryset.model, queryset._db, force)
+            )
+            prefetch_list = [
+                route_prefetch(prefetch, queryset.model, queryset._db, force, traversed) for prefetch in prefetch_list
+            ]
+        prefetch_list = cls._split_large_in(prefetch_list, queryset.model, queryset, traversed)
+        if instrumented:
+            prefetch_list = [
+                instrument_prefetch(prefetch, queryset.model, cls, traversed) for prefetch in prefetch_list
+            ]
+        governed = cls._has_budgets()
+        if governed:
+            prefetch_list = [govern_prefetch(prefetch, queryset.model, traversed) for prefetch in prefetch_list]
+        prefetch_list = cls._compile_prefetches(prefetch_list, queryset.model, traversed)
 
-        return queryset.select_related(
-            *select
-        ).prefetch_related(
+        # select_related() without any lookups would follow every foreign key
+        if select:
+            queryset = queryset.select_related(*select)
+        queryset = queryset.prefetch_related(
             *prefetch_list
         )
+        if instrumented and queryset._iterable_class is ModelIterable:
+            queryset._iterable_class = instrumented_iterable(cls)
+        if hasattr(prefetch_listing, 'iterable_class') and issubclass(queryset._iterable_class, ModelIterable):
+            queryset._iterable_class = prefetch_listing.iterable_class(queryset._iterable_class)
+        if governed and issubclass(queryset._iterable_class, ModelIterable):
+            queryset._iterable_class = governed_iterable(queryset._iterable_class)
+        return queryset
+
+    @classmethod
+    def _is_prefetched(cls, instance):
+        """
+        Check if every level of the plan is already loaded on the instance, for example because the user prefetched
+        it or an outer BatchedListSerializer loaded it. The generic and column relations are not checked, these are
+        loaded by _load_batched
+        :param instance: models.Model
+        :return: bool
+        """
+        loader = RelationLoader([], get_meta_val(get_meta(cls), 'prefetch_to_attr_prefix'))
+        # {path: the instances at the end of the path}, parents are checked before their children so following a
+        # relation never queries
+        loaded = {(): [instance]}
+        for node in cls.database_plan.nodes():
+            parents = loaded.get(node.path[:-1])
+            if parents is None or node.generic or node.columns_only:
+                continue
+            if not all(is_relation_loaded(parent, node.name, loader.prefix + node.name) for parent in parents):
+                return False
+            loaded[node.path] = [related for parent in parents for related in loader._get_related(parent, node.name)]
+        return True
+
+    @classmethod
+    def _prefetch_instances(cls, instances, context=None):
+        """
+        Apply the plan to instances that have already been fetched, the selects can't be joined anymore so these
+        are prefetched as well. Everything is fetched with one prefetch_related_objects call over all instances
+        :param instances: list[models.Model]
+        :param context: dict, the context of the serializer
+        :return: None
+        """
+        instrumented = cls._send_plan_prepared()
+        model = type(instances[0])
+        prefetch_list = cls.database_relations['select'][::] + cls._prepare_prefetch_list(context=context)
+        alias = get_meta_val(get_meta(cls), 'database_alias')
+        if alias is not None:
+            prefetch_list = [route_prefetch(prefetch, model, alias) for prefetch in prefetch_list]
+        if len(instances) > 1:
+            prefetch_list = cls._split_large_in(prefetch_list, model)
+        if instrumented:
+            prefetch_list = [instrument_prefetch(prefetch, model, cls) for prefetch in prefetch_list]
+        if cls._has_budgets():
+            prefetch_list = [govern_prefetch(prefetch, model) for prefetch in prefetch_list]
+        prefetch_list = cls._compile_prefetches(prefetch_list, model)
+        with cls._govern():
+            models.prefetch_related_objects(instances, *prefetch_list)
+
+    @classmethod
+    def _prefetch_deferred(cls, value, context=None):
+        """
+        Apply the plan to the instance(s) a serializer with budgets got constructed with. The root serializer does
+        this inside the governor of its to_representation, so the prefetch and the serialization share the budgets
+        :param value: object
+        :param context: dict, the context of the serializer
+        :return: object
+        """
+        if not cls._has_budgets() or isinstance(value, (models.QuerySet, models.Manager)):
+            return value
+        return cls._check_value(value, not isinstance(value, models.Model), context)
+
+    @classmethod
+    def _split_large_in(cls, prefetch_list, model, queryset=None, traversed=()):
+        """
+        Make the prefetches split large IN filters in chunks, or filter with a subquery over the queryset,
+        when large_prefetch_threshold is configured
+        :param prefetch_list: list[str | models.Prefetch]
+        :param model: type[models.Model]
+        :param queryset: models.QuerySet | None, the root queryset
+        :param traversed: Collection[str], the levels the lookups of the user go through
+        :return: list[str | models.Prefetch]
+        """
+        meta = get_meta(cls)
+        threshold = get_meta_val(meta, 'large_prefetch_threshold')
+        if not threshold:
+            return prefetch_list
+        parent_queryset = queryset if get_meta_val(meta, 'large_prefetch_subquery') else None
+        return [
+            large_in_prefetch(prefetch, model, threshold, parent_queryset, traversed) for prefetch in prefetch_list
+        ]
+
+    @classmethod
+    def _compile_prefetches(cls, prefetch_list, model, traversed=()):
+        """
+        Let the prefetches run from cached sql templates, when cache_prefetch_sql is enabled
+        :param prefetch_list: list[str | models.Prefetch]
+        :param model: type[models.Model]
+        :param traversed: Collection[str], the levels the lookups of the user go through
+        :return: list[str | models.Prefetch]
+        """
+        if not get_meta_val(get_meta(cls), 'cache_prefetch_sql'):
+            return prefetch_list
+        dynamic = {
+            lookup for lookup, node in cls.database_plan.queryset_nodes().items()
+            if not isinstance(node.queryset, (models.QuerySet, models.Manager))
+        }
+        return [
+            prefetch if (
+                prefetch.prefetch_through if isinstance(prefetch, models.Prefetch) else prefetch
+            ) in dynamic else compile_prefetch(prefetch, model, cls, traversed)
+            for prefetch in prefetch_list
+        ]
+
+    @classmethod
+    def _route_queryset(cls, queryset):
+        """
+        Move the queryset to the configured database_alias, if there is one
+        :param queryset: models.QuerySet
+        :return: models.QuerySet
+        """
+        alias = get_meta_val(get_meta(cls), 'database_alias')
+        return queryset if alias is None else queryset.using(alias)
+
+    @classmethod
+    def _send_plan_prepared(cls):
+        """
+        Send the plan_prepared signal, the plan of the class has been built when the class got created
+        :return: bool, if instrumentation is enabled for this call
+        """
+        if not has_listeners():
+            return False
+        if plan_prepared.has_listeners():
+            plan_prepared.send(sender=cls, cached=True, **cls.database_relations)
+        return True
+
+    @classmethod
+    def _has_budgets(cls):
+        """
+        :return: bool, if any of the budgets is configured (see ResourceGovernor)
+        """
+        return ResourceGovernor.from_meta(get_meta(cls), overrides=get_budget_overrides()) is not None
+
+    @classmethod
+    def _govern(cls):
+        """
+        Context in which the budgets of the serializer are enforced, when a governor is already active (the
+        serializer is nested, or the caller governs the whole call) that one is used
+        :return: ResourceGovernor | nullcontext, entering gives the governor or None
+        """
+        governor = get_governor()
+        if governor is not None:
+            return nullcontext(governor)
+        return ResourceGovernor.from_meta(get_meta(cls), sender=cls, overrides=get_budget_overrides()) or nullcontext()
+
+    def _stream_json(self, value):
+        """
+        Let the prefetch_listing render the json of the queryset, if the prefetch_listing supports it.
+        A materialized serializer (see queryset_serializer.materialized) concatenates the stored json instead
+        :param value: models.QuerySet
+        :return: Iterator[bytes] | None
+        """
+        if isinstance(value, models.Manager):
+            value = value.all()
+        if not isinstance(value, models.QuerySet):
+            return None
+        materializer = self.__class__.__dict__.get('_materializer')
+        if materializer is not None:
+            return materializer.stream_json(value)
+        prefetch_listing = self._get_prefetch_listing(value)
+        if not hasattr(prefetch_listing, 'stream_json'):
+            return None
+        return prefetch_listing.stream_json(self)
+
+    @classmethod
+    def fingerprint(cls, queryset, extra=''):
+        """
+        Fingerprint of the queryset and all relations this serializer uses, computed with aggregate queries only.
+        Can be used as ETag / Last-Modified without prefetching or serializing anything
+        :param queryset: models.QuerySet | models.Manager
+        :param extra: str, will be part of the etag (for example the request path)
+        :return: QuerySetFingerprint
+        """
+        queryset = cls._route_queryset(queryset.all() if isinstance(queryset, models.Manager) else queryset)
+        return QuerySetFingerprint(
+            queryset,
+            cls.database_relations['select'] + cls.database_relations['prefetch'],
+            get_meta_val(get_meta(cls), 'fingerprint_version_fields'),
+            f'{cls.__module__}.{cls.__qualname__}:{extra}'
+        )
 
     @classmethod
-    def _prepare_prefetch_list(cls, queryset=None):
+    def _load_batched(cls, value):
+        """
+        Load the relations that are not prefetched by django for the instance(s): the batched `to one` relations,
+        the GenericForeignKey relations and the `many` relations that are only serialized as ids.
+        A queryset will be evaluated to do so
+        :param value: models.Model | models.QuerySet | list[models.Model]
+        :return: models.Model | models.QuerySet | list[models.Model]
+        """
+        meta = get_meta(cls)
+        batch_to_one = get_meta_val(meta, 'batch_to_one_relations')
+        generic_nodes = cls.database_plan.generic_nodes()
+        column_nodes = cls.database_plan.column_nodes()
+        if not (batch_to_one or generic_nodes or column_nodes):
+            return value
+        if isinstance(value, models.Manager):
+            value = value.all()
+        instances = [value] if isinstance(value, models.Model) else list(value)
+        prefix = get_meta_val(meta, 'prefetch_to_attr_prefix')
+        if batch_to_one:
+            RelationLoader(cls.database_plan.batch_nodes(), prefix).load(instances)
+        if generic_nodes:
+            GenericRelationLoader(generic_nodes, prefix, cls._prepare_generic).load(instances)
+        if column_nodes:
+            ColumnRelationLoader(column_nodes, prefix).load(instances)
+        return value
+
+    @staticmethod
+    def _prepare_generic(serializer_class, queryset):
+        """
+        Apply the plan of the serializer to the queryset of a generic relation
+        :param serializer_class: QuerySetSerializer
+        :param queryset: models.QuerySet
+        :return: models.QuerySet
+        """
+        return serializer_class._load_batched(serializer_class._check_value(queryset))
+
+    @classmethod
+    def _get_prefetch_relations(cls):
+        """
+        Get the relations that should be prefetched, without the relations that will be loaded in batches
+        :return: list[str]
+        """
+        prefetch = cls.database_relations['prefetch'][::]
+        if get_meta_val(get_meta(cls), 'batch_to_one_relations'):
+            batched = {node.lookup for node in cls.database_plan.batch_nodes()}
+            prefetch = [lookup for lookup in prefetch if lookup not in batched]
+        return prefetch
+
+    @classmethod
+    def _prepare_prefetch_list(cls, queryset=None, context=None):
         """
         initiate the class to get all the prefetch_list
         :param queryset: models.QuerySet
+        :param context: dict, the context of the serializer
         :return: list[str | SerializerPrefetch]
         """
+        return cls._apply_prefetch_querysets(cls._get_prefetch_listing(queryset).prefetch_list(), context)
+
+    @classmethod
+    def _apply_prefetch_querysets(cls, prefetch_list, context=None):
+        """
+        Give the prefetches of nested serializers with a Meta.prefetch_queryset their base queryset, the prefetches
+        beneath it go trough the filtered results
+        :param prefetch_list: list[str | models.Prefetch]
+        :param context: dict, the context of the serializer
+        :return: list[str | models.Prefetch]
+        """
+        nodes = cls.database_plan.queryset_nodes()
+        if not nodes:
+            return prefetch_list
+        model = get_meta(cls).model
+        prepared, joined = [], set()
+        for prefetch in prefetch_list:
+            lookup = prefetch.prefetch_through if isinstance(prefetch, models.Prefetch) else prefetch
+            node = nodes.get(lookup)
+            # a Prefetch with a queryset of its own (given on the root queryset) is kept
+            if node is not None and getattr(prefetch, 'queryset', None) is None:
+                queryset = resolve_prefetch_queryset(node.queryset, get_prefetch_queryset(prefetch, model), context)
+                # the selects of the child serializer are joined into its queryset instead of prefetched
+                selects = node.joined_lookups()
+                if selects:
+                    queryset = queryset.select_related(*selects)
+                    joined.update(f'{lookup}{LOOKUP_SEP}{select}' for select in selects)
+                prefetch = set_prefetch_queryset(prefetch, queryset)
+            prepared += [prefetch]
+        return [
+            prefetch for prefetch in prepared
+            if (prefetch.prefetch_through if isinstance(prefetch, models.Prefetch) else prefetch) not in joined
+        ]
+
+    @classmethod
+    def _get_prefetch_listing(cls, queryset=None):
+        """
+        initiate the prefetch_listing class of the serializer
+        :param queryset: models.QuerySet
+        :return: _BasePrefetchSerializerList
+        """
         meta = get_meta(cls)
         prefetch_listing = get_meta_val(meta, 'prefetch_listing')
         # initiate the model for populating the prefetch_list, this model will return your prefetch_list
-        prefetch_listing = prefetch_listing(
-            cls.database_relations['prefetch'][::], queryset, meta, Config.meta_class
+        listing = prefetch_listing(
+            cls._get_prefetch_relations(), queryset, meta, Config.meta_class
         )
-
-        return prefetch_listing.prefetch_list()
+        listing.serializer_class = cls
+        return listing
 
     @classmethod
     def many_init(cls, *args, **kwargs):
@@ -261,13 +1182,16 @@ class QuerySetSerializer(_QuerySetSerializer, metaclass=QuerySetMetaSerializer):
         """
 
         many = kwargs.get('many', False)
+        context = kwargs.get('context')
+        # with budgets the instances are prefetched by to_representation, inside the governor of the serialization
+        defer = cls._has_budgets()
 
         args = list(args)
         if len(args) > 0:
-            args[0] = cls._check_value(args[0], many)
+            args[0] = cls._check_value(args[0], many, context, defer)
         if 'data' in kwargs:
-            kwargs['data'] = cls._check_value(kwargs['data'], many)
+            kwargs['data'] = cls._check_value(kwargs['data'], many, context, defer)
         if 'instance' in kwargs:
-            kwargs['instance'] = cls._check_value(kwargs['instance'], many)
+            kwargs['instance'] = cls._check_value(kwargs['instance'], many, context, defer)
 
         return super().__new__(cls, *args, **kwargs)
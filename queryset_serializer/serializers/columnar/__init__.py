@@ -0,0 +1,271 @@
+import csv
+import json
+from collections import OrderedDict
+from itertools import islice
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+
+class ColumnNode:
+    """
+    Flattened view of a serializer: the plain fields become columns, the fields of `to one` nested serializers become
+    columns prefixed with the name of the nested serializer, `many` fields become list columns.
+    The columns follow the order of the fields of the serializer
+    """
+    def __init__(self, serializer, prefix=''):
+        """
+
+        :param serializer: serializers.Serializer, a bound serializer
+        :param prefix: str
+        """
+        # [(name, field, ColumnNode | None)], a nested node for a `to one` nested serializer
+        self.columns = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.BaseSerializer) and not isinstance(field, serializers.ListSerializer):
+                self.columns += [(f'{prefix}{name}', field, ColumnNode(field, f'{prefix}{name}.'))]
+            else:
+                self.columns += [(f'{prefix}{name}', field, None)]
+
+    def names(self):
+        """
+        :return: list[str]
+        """
+        return [name for name, _ in self.fields()]
+
+    def fields(self):
+        """
+        :return: list[tuple[str, serializers.Field]], the field of every column
+        """
+        return [
+            column for name, field, node in self.columns
+            for column in (node.fields() if node is not None else [(name, field)])
+        ]
+
+    @staticmethod
+    def _get_attribute(field, instance):
+        """
+        :param field: serializers.Field
+        :param instance: object | None
+        :return: object | None
+        """
+        if instance is None:
+            return None
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return None
+        if attribute is None or (isinstance(attribute, PKOnlyObject) and attribute.pk is None):
+            return None
+        return attribute
+
+    def fill(self, instances, columns):
+        """
+        Build the column arrays of the instances, every nested instance is looked up once per chunk
+        :param instances: list[object | None]
+        :param columns: dict[str, list]
+        :return: dict[str, list]
+        """
+        for name, field, node in self.columns:
+            if node is not None:
+                node.fill([self._get_attribute(field, instance) for instance in instances], columns)
+                continue
+            column = []
+            for instance in instances:
+                attribute = self._get_attribute(field, instance)
+                column += [None if attribute is None else field.to_representation(attribute)]
+            columns[name] = column
+        return columns
+
+
+# the arrow types of the representations of the plain fields (not of subclasses, these can represent anything)
+ARROW_TYPES = {
+    serializers.BooleanField: 'bool_',
+    serializers.NullBooleanField: 'bool_',
+    serializers.IntegerField: 'int64',
+    serializers.FloatField: 'float64',
+    serializers.CharField: 'string',
+    serializers.EmailField: 'string',
+    serializers.SlugField: 'string',
+    serializers.URLField: 'string',
+    serializers.RegexField: 'string',
+    serializers.IPAddressField: 'string',
+}
+
+
+class ColumnarExporter:
+    """
+    Exports the data of a list serializer column wise, the rows are fetched in chunks (with the select / prefetch
+    plan of the serializer applied per chunk) and every chunk is turned into column arrays instead of a dict per row
+    """
+    def __init__(self, serializer, chunk_size=2000):
+        """
+
+        :param serializer: QuerySetListSerializer, with a queryset or list of instances
+        :param chunk_size: int
+        """
+        self.serializer = serializer
+        self.chunk_size = chunk_size
+        self.node = ColumnNode(serializer.child)
+
+    def names(self):
+        """
+        :return: list[str]
+        """
+        return self.node.names()
+
+    def _chunks(self):
+        """
+        :return: Iterator[list[models.Model]]
+        """
+        value = self.serializer.instance
+        child = self.serializer.child
+        context = self.serializer.context
+        if isinstance(value, models.Manager):
+            value = value.all()
+        if isinstance(value, models.QuerySet) and value._result_cache is None:
+            # the plan is applied the same way as for a serialization (the prefetches given by the caller, the
+            # database, large IN chunking, instrumentation), the rows are streamed and the prefetches run per chunk
+            queryset = child._check_value(value, True, context)
+            prefetch_list = queryset._prefetch_related_lookups
+            iterator = queryset.prefetch_related(None).iterator(chunk_size=self.chunk_size)
+            while True:
+                chunk = list(islice(iterator, self.chunk_size))
+                if not chunk:
+                    return
+                models.prefetch_related_objects(chunk, *prefetch_list)
+                child._load_batched(chunk)
+                yield chunk
+        else:
+            instances = list(value)
+            for start in range(0, len(instances), self.chunk_size):
+                chunk = child._check_value(instances[start:start + self.chunk_size], True, context)
+                child._load_batched(chunk)
+                yield chunk
+
+    def columns(self):
+        """
+        :return: Iterator[OrderedDict[str, list]], the column arrays per chunk
+        """
+        for chunk in self._chunks():
+            yield self.node.fill(chunk, OrderedDict())
+
+    @staticmethod
+    def _csv_value(value):
+        """
+        :param value: object
+        :return: object
+        """
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        return value
+
+    def to_csv(self, file):
+        """
+        Write the data as csv, list columns are written as json
+        :param file: text file object
+        :return: int, amount of rows written
+        """
+        writer = csv.writer(file)
+        writer.writerow(self.names())
+        rows = 0
+        for columns in self.columns():
+            for row in zip(*columns.values()):
+                writer.writerow([self._csv_value(value) for value in row])
+                rows += 1
+        return rows
+
+    @staticmethod
+    def _has_null_type(pyarrow, data_type):
+        """
+        :param pyarrow: module
+        :param data_type: pyarrow.DataType
+        :return: bool, if the type (or the type of its items / fields) is unknown, every value was null or empty
+        """
+        if pyarrow.types.is_null(data_type):
+            return True
+        if pyarrow.types.is_list(data_type) or pyarrow.types.is_large_list(data_type):
+            return ColumnarExporter._has_null_type(pyarrow, data_type.value_type)
+        if pyarrow.types.is_struct(data_type):
+            return any(ColumnarExporter._has_null_type(pyarrow, field.type) for field in data_type)
+        return False
+
+    def _arrow_types(self, pyarrow):
+        """
+        :param pyarrow: module
+        :return: OrderedDict[str, pyarrow.DataType | None], None when the type has to be inferred from the rows
+        """
+        return OrderedDict(
+            (name, getattr(pyarrow, ARROW_TYPES[type(field)])() if type(field) in ARROW_TYPES else None)
+            for name, field in self.node.fields()
+        )
+
+    def _infer_types(self, pyarrow, types, columns):
+        """
+        Give the columns of which the type isn't known yet the type of their values in the chunk
+        :param pyarrow: module
+        :param types: OrderedDict[str, pyarrow.DataType | None], see _arrow_types, gets updated
+        :param columns: OrderedDict[str, list]
+        :return: None
+        """
+        for name, values in columns.items():
+            if types[name] is not None and not self._has_null_type(pyarrow, types[name]):
+                continue
+            inferred = pyarrow.array(values).type
+            if types[name] is None or not self._has_null_type(pyarrow, inferred):
+                types[name] = inferred
+
+    @staticmethod
+    def _write_batches(pyarrow, writer, schema, chunks):
+        """
+        :param pyarrow: module
+        :param writer: pyarrow.ipc.RecordBatchStreamWriter
+        :param schema: pyarrow.Schema
+        :param chunks: list[OrderedDict[str, list]]
+        :return: int, amount of rows written
+        """
+        rows = 0
+        for columns in chunks:
+            batch = pyarrow.RecordBatch.from_pydict(columns, schema=schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+        return rows
+
+    def to_arrow(self, file):
+        """
+        Write the data as an Arrow IPC stream. The types of the plain fields are known up front, the types of the
+        other columns are inferred from the rows. The stream has a single schema, so the chunks are held back until
+        every column got a type (a column without any value keeps the null type). Requires pyarrow
+        :param file: binary file object
+        :return: int, amount of rows written
+        """
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            raise ImproperlyConfigured('pyarrow is required to export to Arrow')
+
+        types = self._arrow_types(pyarrow)
+        writer, schema, pending, rows = None, None, [], 0
+        for columns in self.columns():
+            pending += [columns]
+            if writer is None:
+                self._infer_types(pyarrow, types, columns)
+                if any(data_type is None or self._has_null_type(pyarrow, data_type) for data_type in types.values()):
+                    continue
+                schema = pyarrow.schema(list(types.items()))
+                writer = pyarrow.ipc.new_stream(file, schema)
+            rows += self._write_batches(pyarrow, writer, schema, pending)
+            pending = []
+        if writer is None:
+            # a column without any value keeps the null type, a stream without batches still needs its schema
+            schema = pyarrow.schema([(name, data_type or pyarrow.null()) for name, data_type in types.items()])
+            writer = pyarrow.ipc.new_stream(file, schema)
+            rows += self._write_batches(pyarrow, writer, schema, pending)
+        writer.close()
+        return rows
@@ -0,0 +1,44 @@
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+
+
+class GenericQuerySetSerializer(serializers.Field):
+    """
+    Read only field for a GenericForeignKey, the serializer used depends on the model of the related object.
+    When used in a QuerySetSerializer the related objects get loaded with one query per content type, using the
+    select / prefetch plan of the serializer that belongs to that model
+
+    Example:
+        target = GenericQuerySetSerializer({User: UserSerializer, Group: GroupSerializer})
+    """
+    def __init__(self, serializers, **kwargs):
+        """
+
+        :param serializers: dict[models.Model, QuerySetSerializer]
+        :param kwargs:
+        """
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+        self.serializers = serializers
+        self._children = {}
+
+    def get_child(self, model):
+        """
+        Get the (cached) serializer instance for the model
+        :param model: models.Model
+        :return: QuerySetSerializer
+        """
+        if model not in self._children:
+            if model not in self.serializers:
+                raise ImproperlyConfigured(
+                    f'No serializer configured for model {model.__name__} on field {self.field_name}'
+                )
+            # the child is not bound to this field, bound to a non QuerySetSerializer parent it would prefetch per row.
+            # Marked as nested, so it isn't instrumented / governed as the root of a serialization
+            child = self.serializers[model](context=self.context)
+            child.nested = True
+            self._children[model] = child
+        return self._children[model]
+
+    def to_representation(self, value):
+        return self.get_child(type(value)).to_representation(value)
@@ -0,0 +1,167 @@
+import re
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+from django.urls import get_resolver, get_script_prefix, get_urlconf
+from django.utils.encoding import iri_to_uri
+from django.utils.http import RFC3986_SUBDELIMS, escape_leading_slashes
+from django.utils.translation import get_language
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+
+class URLTemplate:
+    """
+    The url pattern of a view name resolved once, urls of other lookup values are filled in without reverse().
+    Mirrors what django.urls.reverse does for a single keyword argument (convert, validate against the pattern,
+    quote), everything rest_framework adds around the path (the scheme and host of the request, preserved query
+    parameters) is taken from the url of the first row
+    """
+    def __init__(self, candidates, kwarg, head='', tail=''):
+        """
+
+        :param candidates: list[tuple[str, re.Pattern, dict, object]], result, pattern, defaults and converter of
+            every url pattern of the view name that takes the keyword argument
+        :param kwarg: str
+        :param head: str
+        :param tail: str
+        """
+        self.candidates = candidates
+        self.kwarg = kwarg
+        self.head = head
+        self.tail = tail
+
+    @classmethod
+    def compile(cls, view_name, kwarg, value, url, request=None, format=None):
+        """
+        :param view_name: str
+        :param kwarg: str, lookup_url_kwarg of the field
+        :param value: the lookup value url got reversed for
+        :param url: str, the url rest_framework reversed for the value
+        :param request: Request | None
+        :param format: str | None
+        :return: URLTemplate | None, None when the pattern can't be templated (reverse() has to be used)
+        """
+        # a format suffix and versioning add keyword arguments or change the view name, namespaced view names are
+        # left to reverse() as well
+        if format is not None or getattr(request, 'versioning_scheme', None) is not None:
+            return None
+        if not isinstance(view_name, str) or ':' in view_name or url is None:
+            return None
+        urlconf = get_urlconf() or settings.ROOT_URLCONF
+        template = cls(get_candidates(urlconf, get_language(), get_script_prefix(), view_name, kwarg), kwarg)
+        path = template.path(value)
+        if path is None or url.count(path) != 1:
+            return None
+        template.head, template.tail = url.split(path)
+        return template
+
+    def path(self, value):
+        """
+        The same as django.urls.reverse(view_name, kwargs={kwarg: value})
+        :param value: object
+        :return: str | None, None when no pattern matches
+        """
+        for result, pattern, defaults, converter in self.candidates:
+            if self.kwarg in defaults and defaults[self.kwarg] != value:
+                continue
+            text = converter.to_url(value) if converter is not None else str(value)
+            candidate = result % {self.kwarg: text}
+            if pattern.search(candidate):
+                return iri_to_uri(escape_leading_slashes(quote(candidate, safe=RFC3986_SUBDELIMS + '/~:@')))
+        return None
+
+    def fill(self, value):
+        """
+        :param value: object
+        :return: str | None, None when reverse() has to be used for this value
+        """
+        path = self.path(value)
+        # build_absolute_uri joins paths with dot segments instead of prefixing them with the host
+        if path is None or (self.head and ('/./' in path or '/../' in path)):
+            return None
+        return f'{self.head}{path}{self.tail}'
+
+
+@lru_cache(maxsize=None)
+def get_candidates(urlconf, language, prefix, view_name, kwarg):
+    """
+    The url patterns of the view name that django.urls.reverse tries for the keyword argument, in the same order
+    :param urlconf: str
+    :param language: str | None, the patterns of the resolver are per active language
+    :param prefix: str, the script prefix
+    :param view_name: str
+    :param kwarg: str
+    :return: list[tuple[str, re.Pattern, dict, object]]
+    """
+    resolver = get_resolver(urlconf)
+    candidates = []
+    for possibility, pattern, defaults, converters in resolver.reverse_dict.getlist(view_name):
+        for result, params in possibility:
+            if {kwarg}.symmetric_difference(params).difference(defaults):
+                continue
+            candidates += [(
+                prefix.replace('%', '%%') + result,
+                re.compile('^%s%s' % (re.escape(prefix), pattern)),
+                defaults,
+                converters.get(kwarg),
+            )]
+    return candidates
+
+
+class TemplatedHyperlinkMixin:
+    """
+    Hyperlinked field that reverses the url of its view name once per serializer instance (so once per request),
+    the urls of the other rows are filled into the template. The urls are the same as the urls of reverse()
+    """
+    def get_url(self, obj, view_name, request, format):
+        if hasattr(obj, 'pk') and obj.pk in (None, ''):
+            return None
+        # stored on the field, every serializer instance gets its own copies of the fields
+        templates = self.__dict__.setdefault('_url_templates', {})
+        key = (view_name, format)
+        if key not in templates:
+            url = super().get_url(obj, view_name, request, format)
+            templates[key] = URLTemplate.compile(
+                view_name, self.lookup_url_kwarg, getattr(obj, self.lookup_field), url, request, format
+            )
+            return url
+        url = templates[key] and templates[key].fill(getattr(obj, self.lookup_field))
+        return url if url is not None else super().get_url(obj, view_name, request, format)
+
+
+@lru_cache(maxsize=None)
+def templated_hyperlink_class(field_class):
+    """
+    :param field_class: type[serializers.HyperlinkedRelatedField]
+    :return: type[TemplatedHyperlinkMixin]
+    """
+    return type(field_class.__name__, (TemplatedHyperlinkMixin, field_class), {'__module__': field_class.__module__})
+
+
+def is_templatable(field):
+    """
+    Only fields that build their urls the way rest_framework does, a custom get_url / reverse is kept
+    :param field: serializers.Field
+    :return: bool
+    """
+    return (
+        isinstance(field, serializers.HyperlinkedRelatedField) and
+        not isinstance(field, TemplatedHyperlinkMixin) and
+        type(field).get_url is serializers.HyperlinkedRelatedField.get_url and
+        getattr(field, 'reverse', None) is reverse
+    )
+
+
+def template_hyperlinks(fields):
+    """
+    Let the hyperlinked fields (also the child of a many=True field) use url templates
+    :param fields: OrderedDict[str, serializers.Field], unbound fields that are not shared yet
+    :return: OrderedDict[str, serializers.Field]
+    """
+    for field in fields.values():
+        relation = field.child_relation if isinstance(field, serializers.ManyRelatedField) else field
+        if is_templatable(relation):
+            relation.__class__ = templated_hyperlink_class(type(relation))
+    return fields
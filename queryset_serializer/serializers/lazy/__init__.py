@@ -0,0 +1,64 @@
+from collections.abc import Sequence
+
+
+class LazyReturnList(Sequence):
+    """
+    Return object of serializer.data when lazy_representation is enabled. The rows are fetched (with the plan of the
+    serializer applied), but every item is only serialized when it is read, and kept once it has been.
+    len() doesn't serialize anything
+    """
+    def __init__(self, instances, to_representation, serializer=None):
+        """
+
+        :param instances: list[object], the fetched rows
+        :param to_representation: Callable[[object], dict]
+        :param serializer: serializers.ListSerializer, backlink for renderers (the same as ReturnList)
+        """
+        self.serializer = serializer
+        self._instances = instances
+        self._to_representation = to_representation
+        self._items = {}
+
+    def __len__(self):
+        return len(self._instances)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('list index out of range')
+        if index not in self._items:
+            self._items[index] = self._to_representation(self._instances[index])
+        return self._items[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def serialized(self):
+        """
+        :return: int, the amount of items that have been serialized
+        """
+        return len(self._items)
+
+    def tolist(self):
+        """
+        Serialize everything, the json encoder of rest_framework uses this
+        :return: list[dict]
+        """
+        return list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (LazyReturnList, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __reduce__(self):
+        # the same as ReturnList, pickling drops the serializer
+        return list, (list(self),)
@@ -1,11 +1,26 @@
-from django.db import models
-from django.db.models import Prefetch
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models
+from django.db.models import F, OuterRef, Prefetch, TextField
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import Cast
+from rest_framework import serializers
+
+from queryset_serializer.db.models import (get_prefetch_queryset,
+                                           get_related_field,
+                                           resolve_prefetch_queryset)
+from queryset_serializer.db.models.functions import (JSONArraySubquery,
+                                                     JSONBoolean, JSONObject,
+                                                     JSONSubquery)
+from queryset_serializer.db.planner import AdaptivePlanner, observed_iterable
 
 
 class _BasePrefetchSerializerList:
     """
     Baseclass from which can be inherited from with exceptions to mimic the behaviour of a Interface/abstract class
     """
+    # the serializer the listing is made for, set by QuerySetSerializer._get_prefetch_listing
+    serializer_class = None
+
     @staticmethod
     def set_serializer_sources(prefetches, declared_fields, prefix) -> None:
         """
@@ -156,3 +171,238 @@ class PrefetchToAttrSerializerList(_BasePrefetchSerializerList):
                 continue
 
         return prefetch_list
+
+
+class AdaptivePrefetchSerializerList(PrefetchToAttrSerializerList):
+    """
+    PrefetchToAttrSerializerList which lets the planner decide per `to one` relation if it gets joined
+    (select_related) or prefetched, based on the rows and distinct related rows observed while fetching.
+    For example a wide model that is related to by many rows, but only a few distinct ones, is cheaper to prefetch.
+    The decisions can be inspected with AdaptivePrefetchSerializerList.planner.explain()
+    """
+    planner = AdaptivePlanner()
+
+    def __init__(self, initial_prefetch_list, queryset, meta, default_meta):
+        super().__init__(initial_prefetch_list, queryset, meta, default_meta)
+        self.meta = meta
+        self.select = []
+        self.demoted = []
+        self.rows = 0
+
+    @property
+    def key(self):
+        """
+        The stats are kept per serializer class, serializers that share (or inherit) a Meta have stats of their own
+        :return: type
+        """
+        return self.serializer_class if self.serializer_class is not None else self.meta
+
+    def select_list(self, select):
+        """
+        Split the selects in the ones that stay joined and the ones that will be prefetched
+        :param select: list[str]
+        :return: list[str], the selects that stay joined
+        """
+        if self.queryset is None:
+            return select
+        self.select, self.demoted = [], []
+        for lookup in select:
+            field = get_related_field(self.queryset.model, lookup)
+            # the relations behind a prefetched relation can't be joined anymore
+            if field is None or any(lookup.startswith(f'{demoted}{LOOKUP_SEP}') for demoted in self.demoted) or \
+                    self.planner.should_prefetch(self.key, lookup, len(field.related_model._meta.concrete_fields)):
+                self.demoted += [lookup]
+            else:
+                self.select += [lookup]
+        return self.select
+
+    def prefetch_list(self):
+        """
+        The prefetched selects come first, these have to be loaded before the prefetches that go trough them.
+        They are prefetched without to_attr so the serializers can keep reading them from the relation
+        :return: list[str | models.Prefetch]
+        """
+        prefetch_list = super().prefetch_list()
+        if self.queryset is None:
+            return prefetch_list
+        demoted = []
+        for lookup in self.demoted:
+            queryset = get_prefetch_queryset(lookup, self.queryset.model)
+            queryset._iterable_class = observed_iterable(queryset._iterable_class, self.observe, lookup)
+            demoted += [Prefetch(lookup, queryset=queryset)]
+        return demoted + prefetch_list
+
+    def iterable_class(self, base):
+        """
+        :param base: type[ModelIterable], the iterable class of the root queryset
+        :return: type[ModelIterable]
+        """
+        return observed_iterable(base, self.observe)
+
+    def observe(self, lookup, instances, duration):
+        """
+        Store the amount of rows and distinct related rows of a fetched branch in the planner
+        :param lookup: str | None, None for the root queryset
+        :param instances: list[models.Model]
+        :param duration: float
+        :return: None
+        """
+        if lookup is not None:
+            self.planner.observe(self.key, lookup, self.rows, len(instances), duration)
+            return
+
+        self.rows = len(instances)
+        self.planner.observe(self.key, None, self.rows, self.rows, duration)
+        for select in self.select:
+            keys = set()
+            for instance in instances:
+                for name in select.split(LOOKUP_SEP):
+                    instance = getattr(instance, name, None) if instance is not None else None
+                if instance is not None:
+                    keys.add(instance.pk)
+            # the joined rows are part of the root query, these have no timing of their own
+            self.planner.observe(self.key, select, self.rows, len(keys))
+
+
+class DatabaseJSONSerializerList(PrefetchSerializerList):
+    """
+    Lets the database render the json of the serializer with (correlated) subqueries, the result never gets loaded
+    into model instances or dicts. If a serializer has a field that can not be rendered by the database
+    it falls back to the PrefetchSerializerList behaviour
+    """
+    # fields of which the representation is the value of the column itself
+    plain_fields = (serializers.CharField, serializers.EmailField, serializers.SlugField, serializers.URLField,
+                    serializers.IntegerField)
+    boolean_fields = (serializers.BooleanField, serializers.NullBooleanField)
+    vendors = ('sqlite', 'postgresql')
+
+    def __init__(self, initial_prefetch_list, queryset, meta, default_meta):
+        super().__init__(initial_prefetch_list, queryset, meta, default_meta)
+        self.base_serializer_class = getattr(
+            meta, 'base_serializer_class', getattr(default_meta, 'base_serializer_class')
+        )
+        self.list_serializer_class = getattr(
+            meta, 'list_serializer_class', getattr(default_meta, 'list_serializer_class')
+        )
+
+    @staticmethod
+    def _has_custom_representation(serializer):
+        """
+        Check if to_representation got overwritten, in that case the database can not know the representation
+        :param serializer: serializers.ModelSerializer
+        :return: bool
+        """
+        from queryset_serializer.serializers import QuerySetSerializer
+        return type(serializer).to_representation is not QuerySetSerializer.to_representation
+
+    def _compile(self, serializer):
+        """
+        Compile all readable fields of the serializer into a single JSONObject
+        :param serializer: serializers.ModelSerializer
+        :return: JSONObject | None, None when a field can not be rendered by the database
+        """
+        if self._has_custom_representation(serializer):
+            return None
+        fields = {}
+        for field in serializer._readable_fields:
+            expression = self._compile_field(field, serializer.Meta.model)
+            if expression is None:
+                return None
+            fields[field.field_name] = expression
+        return JSONObject(**fields)
+
+    def _compile_field(self, field, model):
+        """
+        :param field: serializers.Field
+        :param model: models.Model
+        :return: Expression | None
+        """
+        if field.source == '*' or len(field.source_attrs) != 1:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+
+        if isinstance(field, self.list_serializer_class) and isinstance(field.child, self.base_serializer_class):
+            return self._compile_many(field.child, model_field)
+        if isinstance(field, self.base_serializer_class):
+            return self._compile_one(field, model_field)
+        if model_field.is_relation:
+            return None
+        if type(field) in self.boolean_fields:
+            return JSONBoolean(F(field.source))
+        if type(field) in self.plain_fields:
+            return F(field.source)
+        return None
+
+    def _compile_one(self, serializer, model_field):
+        """
+        A `to one` relation becomes a subquery selecting a single json object
+        :param serializer: serializers.ModelSerializer
+        :param model_field: models.Field
+        :return: JSONSubquery | None
+        """
+        if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+            return None
+        json_object = self._compile(serializer)
+        if json_object is None:
+            return None
+        queryset = model_field.related_model._base_manager.filter(**{
+            model_field.target_field.name: OuterRef(model_field.attname)
+        })
+        return JSONSubquery(queryset.annotate(_json=json_object).values('_json')[:1])
+
+    def _compile_many(self, serializer, model_field):
+        """
+        A `to many` relation becomes a subquery aggregating all json objects into a json array
+        :param serializer: serializers.ModelSerializer
+        :param model_field: models.Field | models.ForeignObjectRel
+        :return: JSONArraySubquery | None
+        """
+        if isinstance(model_field, models.ManyToOneRel):
+            lookup, outer = model_field.field.name, model_field.field.target_field.attname
+        elif isinstance(model_field, models.ManyToManyField):
+            lookup, outer = model_field.related_query_name(), 'pk'
+        elif isinstance(model_field, models.ManyToManyRel):
+            lookup, outer = model_field.field.name, 'pk'
+        else:
+            return None
+        json_object = self._compile(serializer)
+        if json_object is None:
+            return None
+        queryset = model_field.related_model._default_manager.all()
+        prefetch_queryset = getattr(getattr(serializer, 'Meta', None), 'prefetch_queryset', None)
+        if prefetch_queryset is not None:
+            queryset = resolve_prefetch_queryset(prefetch_queryset, queryset, serializer.context)
+        queryset = queryset.filter(**{lookup: OuterRef(outer)})
+        return JSONArraySubquery(queryset.annotate(_json=json_object).values('_json'))
+
+    @staticmethod
+    def _stream(rows):
+        """
+        :param rows: Iterator[str]
+        :return: Iterator[bytes]
+        """
+        yield b'['
+        for index, row in enumerate(rows):
+            # escaped the same way rest_framework.renderers.JSONRenderer does
+            row = row.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode('utf-8')
+            yield b',' + row if index else row
+        yield b']'
+
+    def stream_json(self, serializer):
+        """
+        Compile the serializer into one statement and let the database render the json
+        :param serializer: serializers.ModelSerializer, the child of the list serializer
+        :return: Iterator[bytes] | None, None when the serializer can not be rendered by the database
+        """
+        if self.queryset is None or connections[self.queryset.db].vendor not in self.vendors:
+            return None
+        json_object = self._compile(serializer)
+        if json_object is None:
+            return None
+        rows = self.queryset.select_related(None).prefetch_related(None).annotate(
+            _json=Cast(json_object, TextField())
+        ).values_list('_json', flat=True)
+        return self._stream(rows.iterator())
@@ -0,0 +1,275 @@
+from django.db.models.constants import LOOKUP_SEP
+
+from queryset_serializer.db.models import prefix_lookup
+
+
+class RelationNode:
+    """
+    A single relation (hop) in the RelationPlan trie. Every relation path only exists once in the trie,
+    mentioning the same path multiple times will merge it into the already existing node
+    """
+    def __init__(self, name=None, parent=None, select=False, to_attr=None, queryset=None, fields=None):
+        """
+
+        :param name: str
+        :param parent: RelationNode
+        :param select: bool, True if this relation is `to one` and can be joined (select_related)
+        :param to_attr: str
+        :param queryset: models.QuerySet | Callable, the base queryset of the prefetch (see Meta.prefetch_queryset)
+        :param fields: tuple[str]
+        """
+        self.name = name
+        self.parent = parent
+        self.select = select
+        self.to_attr = to_attr
+        self.queryset = queryset
+        self.fields = tuple(fields) if isinstance(fields, (list, tuple)) else None
+        # {model: serializer_class} for a GenericForeignKey, these can not be prefetched by django
+        self.generic = None
+        # the columns of a `many` relation that is only serialized as ids (or another single column), these get
+        # fetched without model instances. None when the relation needs full instances
+        self.columns = None
+        # only explicit nodes get rendered, implicit nodes are the intermediate relations of a path
+        self.explicit = False
+        self.children = {}
+        # precompute the path once so consumers don't have to split the lookup again
+        self.path = parent.path + (name,) if parent is not None and parent.name is not None else (
+            (name,) if name is not None else ()
+        )
+        self.lookup = LOOKUP_SEP.join(self.path)
+
+    @property
+    def selectable(self):
+        """
+        A node can only be selected if it, and all of its parents, are selectable
+        :return: bool
+        """
+        node = self
+        while node.name is not None:
+            if not node.select:
+                return False
+            node = node.parent
+        return True
+
+    @property
+    def columns_only(self):
+        """
+        A relation can be fetched as columns only when nothing beneath it is needed
+        :return: bool
+        """
+        return self.columns is not None and not self.select and not self.children
+
+    @property
+    def joinable(self):
+        """
+        A relation can be joined into the queryset of its parent when it, and everything beneath it, is `to one`
+        :return: bool
+        """
+        return self.select and all(child.joinable for child in self.children.values())
+
+    def joined_lookups(self):
+        """
+        The lookups (relative to this node) of the relations beneath it that can be joined into its queryset
+        :return: list[str]
+        """
+        return [
+            LOOKUP_SEP.join(node.path[len(self.path):]) for node in self.nodes()
+            if node.explicit and all(parent.joinable for parent in node.parents(self))
+        ]
+
+    def parents(self, until=None):
+        """
+        :param until: RelationNode, stop at this node (exclusive)
+        :return: Iterator[RelationNode], this node and its parents
+        """
+        node = self
+        while node is not None and node is not until and node.name is not None:
+            yield node
+            node = node.parent
+
+    def get_or_create(self, name, select):
+        """
+        Get the child node with the given name, or create it
+        :param name: str
+        :param select: bool
+        :return: RelationNode
+        """
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = RelationNode(name, parent=self, select=select)
+        return node
+
+    def nodes(self):
+        """
+        Iterate all nodes beneath this node, parents will always be returned before their children
+        :return: Iterator[RelationNode]
+        """
+        for child in self.children.values():
+            yield child
+            yield from child.nodes()
+
+    def prefixed(self, prefix, to_attr=None):
+        """
+        Get the prefixed prefetch_to and to_attr for this node, see SerializerPrefetch.apply_prefix for the format
+        :param prefix: str
+        :param to_attr: str
+        :return: tuple[str, str]
+        """
+        return prefix_lookup(self.lookup, prefix, to_attr or self.to_attr)
+
+
+class RelationPlan(RelationNode):
+    """
+    Root of the relation trie, this holds every relation a serializer wants to select or prefetch.
+    Use RelationPlan.as_relations() to render it to flat lists of lookups
+    """
+    def __init__(self):
+        super().__init__()
+        self._cache = {}
+
+    @classmethod
+    def from_relations(cls, database_relations):
+        """
+        Create a plan from a database_relations dict
+        :param database_relations: dict[str, list[str]]
+        :return: RelationPlan
+        """
+        plan = cls()
+        for lookup in database_relations.get('select', []):
+            plan.add(lookup, True)
+        for lookup in database_relations.get('prefetch', []):
+            plan.add(lookup, False)
+        return plan
+
+    def add(self, lookup, select, fields=None, columns=None):
+        """
+        Add a relation to the plan, if the relation already exists it will be merged.
+        When a relation is both selected and prefetched the select wins, since it will already be joined.
+        When a relation is needed with full instances and as columns only, the full instances win
+        :param lookup: str | tuple[str]
+        :param select: bool
+        :param fields: tuple[str]
+        :param columns: tuple[str], only these columns of the relation are needed
+        :return: RelationNode
+        """
+        self._cache = {}
+        path = lookup.split(LOOKUP_SEP) if isinstance(lookup, str) else lookup
+        node = self
+        for name in path[:-1]:
+            node = node.get_or_create(name, select)
+            # select_related on a deeper relation will also join the relations in between
+            if not node.explicit:
+                node.select = node.select or select
+        node = node.get_or_create(path[-1], select)
+        if columns is None:
+            node.columns = None
+        elif not node.explicit or node.columns is not None:
+            node.columns = tuple(sorted(set(node.columns or ()) | set(columns)))
+        node.select = (node.select or select) if node.explicit else select
+        node.explicit = True
+        if fields is not None and node.fields is None:
+            node.fields = tuple(fields) if isinstance(fields, (list, tuple)) else None
+        return node
+
+    def graft(self, name, plan, many, fields=None):
+        """
+        Add the relation `name` and all relations of the plan beneath it
+        :param name: str
+        :param plan: RelationPlan
+        :param many: bool
+        :param fields: tuple[str]
+        :return: RelationNode
+        """
+        node = self.add(name, not many, fields)
+        for child in plan.nodes():
+            if not child.explicit:
+                continue
+            grafted = self.add(node.path + child.path, child.select, child.fields, child.columns)
+            grafted.to_attr = grafted.to_attr or child.to_attr
+            grafted.generic = grafted.generic or child.generic
+            grafted.queryset = grafted.queryset if grafted.queryset is not None else child.queryset
+        return node
+
+    def add_generic(self, lookup, serializers):
+        """
+        Add a GenericForeignKey to the plan, the serializer used for the related object depends on its model
+        :param lookup: str | tuple[str]
+        :param serializers: dict[models.Model, serializers.Serializer]
+        :return: RelationNode
+        """
+        node = self.add(lookup, False)
+        node.generic = dict(serializers)
+        self._cache = {}
+        return node
+
+    def _cached(self, key, get_value):
+        """
+        The plan does not change after the serializer class is created, so the rendered values only get computed once
+        :param key: str
+        :param get_value: Callable
+        :return: object
+        """
+        if key not in self._cache:
+            self._cache[key] = get_value()
+        return self._cache[key]
+
+    def select_nodes(self):
+        """
+        :return: list[RelationNode]
+        """
+        return self._cached('select', lambda: [
+            node for node in self.nodes() if node.explicit and not node.generic and node.selectable
+        ])
+
+    def prefetch_nodes(self):
+        """
+        :return: list[RelationNode]
+        """
+        return self._cached('prefetch', lambda: [
+            node for node in self.nodes()
+            if node.explicit and not node.generic and not node.selectable and not node.columns_only
+        ])
+
+    def column_nodes(self):
+        """
+        The `many` relations of which only some columns are needed, these get loaded without model instances
+        :return: list[RelationNode]
+        """
+        return self._cached('columns', lambda: [
+            node for node in self.nodes() if node.explicit and not node.generic and node.columns_only
+        ])
+
+    def queryset_nodes(self):
+        """
+        The prefetched relations that have a base queryset of their own
+        :return: dict[str, RelationNode], by lookup
+        """
+        return self._cached('queryset', lambda: {
+            node.lookup: node for node in self.prefetch_nodes() if node.queryset is not None
+        })
+
+    def generic_nodes(self):
+        """
+        The GenericForeignKey relations, these get loaded in batches per content type
+        :return: list[RelationNode]
+        """
+        return self._cached('generic', lambda: [node for node in self.nodes() if node.explicit and node.generic])
+
+    def batch_nodes(self):
+        """
+        The `to one` relations at the end of a prefetch branch, these can be loaded by key in one batch per model
+        :return: list[RelationNode]
+        """
+        return self._cached('batch', lambda: [
+            node for node in self.prefetch_nodes() if node.select and not node.children
+        ])
+
+    def as_relations(self):
+        """
+        Render the plan to the select_related / prefetch_related lookups
+        :return: dict[str, list[str]]
+        """
+        return {
+            'select': [node.lookup for node in self.select_nodes()],
+            'prefetch': [node.lookup for node in self.prefetch_nodes()],
+        }
@@ -0,0 +1,39 @@
+from functools import lru_cache
+
+from queryset_serializer.db.loader import get_column_values
+
+
+class ColumnValuesMixin:
+    """
+    Reads the column values ColumnRelationLoader stored on the instance, the relation itself (and its prefetch cache)
+    is left alone. Without stored values (the loader didn't run or fell back to a prefetch) the field reads the
+    relation as usual
+    """
+    def get_attribute(self, instance):
+        values = get_column_values(instance, self.source_attrs[-1]) if len(self.source_attrs) == 1 else None
+        return values if values is not None else super().get_attribute(instance)
+
+
+@lru_cache(maxsize=None)
+def column_values_class(field_class):
+    """
+    :param field_class: type[serializers.ManyRelatedField | serializers.ListSerializer]
+    :return: type[ColumnValuesMixin]
+    """
+    if issubclass(field_class, ColumnValuesMixin):
+        return field_class
+    return type(field_class.__name__, (ColumnValuesMixin, field_class), {'__module__': field_class.__module__})
+
+
+def read_column_values(fields, plan):
+    """
+    Let the fields of the relations that are loaded as columns only read the stored values
+    :param fields: OrderedDict[str, serializers.Field], unbound fields that are not shared yet
+    :param plan: RelationPlan
+    :return: OrderedDict[str, serializers.Field]
+    """
+    names = {node.name for node in plan.column_nodes() if len(node.path) == 1}
+    for name, field in fields.items() if names else ():
+        if (field.source or name) in names:
+            field.__class__ = column_values_class(type(field))
+    return fields
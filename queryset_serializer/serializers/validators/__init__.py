@@ -0,0 +1,257 @@
+from collections.abc import Mapping
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import DataError, connections, models
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import empty
+from rest_framework.relations import PrimaryKeyRelatedField, RelatedField
+from rest_framework.validators import (UniqueTogetherValidator,
+                                       UniqueValidator)
+
+# the UniqueBatch of the list that is being validated
+_active_batch = ContextVar('queryset_serializer_unique_batch', default=None)
+
+# the fields of which the database compares the values the same way python does, the existing values are matched
+# with the values of the items in python
+EXACT_FIELDS = (
+    models.AutoField, models.BigAutoField, models.BooleanField, models.IntegerField, models.NullBooleanField,
+    models.UUIDField,
+)
+# text is compared exactly by the default collations of these backends (MySQL ignores case and trailing spaces)
+EXACT_TEXT_VENDORS = ('postgresql', 'sqlite')
+
+
+def get_unique_batch():
+    """
+    :return: UniqueBatch | None
+    """
+    return _active_batch.get()
+
+
+def has_exact_comparison(model, name, connection):
+    """
+    If the database compares the values of the field the same way python does. A case insensitive collation (citext,
+    a MySQL collation) considers values equal that python doesn't, these constraints are not batched
+    :param model: type[models.Model]
+    :param name: str
+    :param connection: BaseDatabaseWrapper
+    :return: bool
+    """
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    while field.is_relation:
+        if not field.many_to_one and not field.one_to_one:
+            return False
+        field = field.target_field
+    if isinstance(field, EXACT_FIELDS):
+        return True
+    if not isinstance(field, (models.CharField, models.TextField)) or connection.vendor not in EXACT_TEXT_VENDORS:
+        return False
+    db_type = (field.db_type(connection) or '').lower()
+    return 'citext' not in db_type and 'collate' not in db_type
+
+
+def normalize(value):
+    """
+    Make a validated value comparable to the value the database returns for its column
+    :param value: object
+    :return: object
+    """
+    return value.pk if isinstance(value, models.Model) else value
+
+
+class UniqueBatch:
+    """
+    The values of the unique constraints of every item of a list that is being validated, checked against the
+    database with one query per constraint (per chunk of max_query_params values) before the items get validated.
+    While the batch is active the unique validators of the child look their value up in the batch instead of
+    querying, the values of earlier items of the list count as existing.
+    The values are matched in python, only constraints of which the database compares the values the same way are
+    batched (see has_exact_comparison)
+    """
+    def __init__(self):
+        # {validator: set of values}, validators that are not in here query the database as usual
+        self.checked = {}
+        self.existing = {}
+        self.seen = {}
+        self._token = None
+
+    @classmethod
+    def collect(cls, serializer, data):
+        """
+        :param serializer: serializers.Serializer, the child of the list serializer
+        :param data: list[dict], the items that will be validated
+        :return: UniqueBatch
+        """
+        batch = cls()
+        items = [item for item in data if isinstance(item, Mapping)]
+        fields = [field for field in serializer.fields.values() if not field.read_only]
+        for field in fields:
+            for validator in field.validators:
+                if is_batchable(validator):
+                    batch.add(validator, [field.source_attrs[-1]], [field], items)
+        sources = {field.source: field for field in fields}
+        for validator in serializer.validators:
+            if is_batchable(validator) and all(name in sources for name in validator.fields):
+                batch.add(validator, list(validator.fields), [sources[name] for name in validator.fields], items)
+        return batch
+
+    def add(self, validator, names, fields, items):
+        """
+        Fetch the existing values of the constraint of the validator
+        :param validator: UniqueValidator | UniqueTogetherValidator
+        :param names: list[str], the model fields of the constraint
+        :param fields: list[serializers.Field], the serializer fields of the constraint
+        :param items: list[dict]
+        :return: None
+        """
+        queryset = validator.queryset
+        connection = connections[queryset.db]
+        if not all(has_exact_comparison(queryset.model, name, connection) for name in names):
+            # the validator queries per item, the database decides which values are equal
+            return
+        existing = set()
+        try:
+            keys = {tuple(get_value(field, item) for field in fields) for item in items}
+            keys = [key for key in keys if empty not in key and None not in key]
+            size = connection.features.max_query_params
+            size = size // len(names) if size else len(keys) or 1
+            for start in range(0, len(keys), size):
+                chunk = keys[start:start + size]
+                existing.update(
+                    tuple(normalize(value) for value in row)
+                    for row in queryset.filter(**{
+                        f'{name}__in': {key[i] for key in chunk} for i, name in enumerate(names)
+                    }).values_list(*names)
+                )
+        except (TypeError, ValueError, DataError):
+            # unhashable or invalid values, the validator will query per item the same way it does without a batch
+            return
+        validator.__class__ = batched_validator_class(type(validator))
+        self.checked[validator] = set(keys)
+        self.existing[validator] = existing
+        self.seen[validator] = set()
+
+    def conflicts(self, validator, key):
+        """
+        Check the value against the earlier items and the database
+        :param validator: UniqueValidator | UniqueTogetherValidator
+        :param key: tuple
+        :return: bool | None, None when the value wasn't checked against the database up front
+        """
+        if key in self.seen[validator]:
+            return True
+        self.seen[validator].add(key)
+        if key not in self.checked[validator]:
+            return None
+        return key in self.existing[validator]
+
+    def __contains__(self, validator):
+        return validator in self.existing
+
+    def __enter__(self):
+        self._token = _active_batch.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _active_batch.reset(self._token)
+
+
+def get_value(field, item):
+    """
+    The validated value of the field in the item, without running its validators. Related fields would query per
+    item, the primary key of a PrimaryKeyRelatedField is taken from the data
+    :param field: serializers.Field
+    :param item: dict
+    :return: object, empty when the item has no (valid) value
+    """
+    try:
+        is_empty, value = field.validate_empty_values(field.get_value(item))
+        if is_empty:
+            return empty
+        if isinstance(field, PrimaryKeyRelatedField):
+            value = field.pk_field.to_internal_value(value) if field.pk_field is not None else value
+            return field.get_queryset().model._meta.pk.to_python(value)
+        if isinstance(field, RelatedField):
+            return empty
+        return normalize(field.to_internal_value(value))
+    except (ValidationError, DjangoValidationError):
+        return empty
+
+
+def is_batchable(validator):
+    """
+    Only the validators that filter the way rest_framework does, with an exact lookup
+    :param validator: object
+    :return: bool
+    """
+    if isinstance(validator, BatchedValidatorMixin):
+        return True
+    if isinstance(validator, UniqueValidator):
+        base = UniqueValidator
+        if validator.lookup != 'exact':
+            return False
+    elif isinstance(validator, UniqueTogetherValidator):
+        base = UniqueTogetherValidator
+    else:
+        return False
+    return all(
+        getattr(type(validator), name) is getattr(base, name)
+        for name in ('__call__', 'filter_queryset', 'exclude_current_instance')
+    )
+
+
+class BatchedValidatorMixin:
+    """
+    Looks the value up in the active UniqueBatch, without a batch (or on an update) the validator queries
+    """
+    def __call__(self, value):
+        batch = get_unique_batch()
+        if batch is None or self not in batch or self.instance is not None or not self.check(batch, value):
+            return super().__call__(value)
+
+    def check(self, batch, value):
+        """
+        :param batch: UniqueBatch
+        :param value: object
+        :return: bool, False when the validator has to query
+        """
+        raise NotImplementedError('`check` must be implemented.')
+
+
+class BatchedUniqueValidator(BatchedValidatorMixin):
+    def check(self, batch, value):
+        conflicts = batch.conflicts(self, (normalize(value),))
+        if conflicts:
+            raise ValidationError(self.message, code='unique')
+        return conflicts is not None
+
+
+class BatchedUniqueTogetherValidator(BatchedValidatorMixin):
+    def check(self, batch, attrs):
+        self.enforce_required_fields(attrs)
+        key = tuple(normalize(attrs[name]) for name in self.fields)
+        if None in key:
+            return True
+        conflicts = batch.conflicts(self, key)
+        if conflicts:
+            message = self.message.format(field_names=', '.join(self.fields))
+            raise ValidationError(message, code='unique')
+        return conflicts is not None
+
+
+@lru_cache(maxsize=None)
+def batched_validator_class(validator_class):
+    """
+    :param validator_class: type[UniqueValidator | UniqueTogetherValidator]
+    :return: type[BatchedValidatorMixin]
+    """
+    if issubclass(validator_class, BatchedValidatorMixin):
+        return validator_class
+    mixin = BatchedUniqueValidator if issubclass(validator_class, UniqueValidator) else BatchedUniqueTogetherValidator
+    return type(validator_class.__name__, (mixin, validator_class), {'__module__': validator_class.__module__})
@@ -0,0 +1,73 @@
+from django.dispatch import Signal
+
+# Sent when the select / prefetch plan of a serializer gets prepared. cached is False when the plan got built
+# arguments: sender (serializer class), cached, select, prefetch
+plan_prepared = Signal()
+
+# Sent when a branch of the plan got fetched from the database, lookup is None for the root queryset
+# arguments: sender (serializer class), lookup, queries, rows, duration
+branch_fetched = Signal()
+
+# Sent when a root serializer is done with to_representation
+# arguments: sender (serializer class), duration, items
+serialized = Signal()
+
+# Sent when a root list serializer is done encoding its data (see QuerySetListSerializer.encoded_data)
+# arguments: sender (serializer class), duration, size
+encoded = Signal()
+
+SIGNALS = {
+    'plan_prepared': plan_prepared,
+    'branch_fetched': branch_fetched,
+    'serialized': serialized,
+    'encoded': encoded,
+}
+
+
+def has_listeners(*signals):
+    """
+    Check if any of the signals has receivers, this should be checked once per call so nothing gets measured
+    when nothing is subscribed
+    :param signals: Signal
+    :return: bool
+    """
+    return any(signal.has_listeners() for signal in (signals or SIGNALS.values()))
+
+
+class EventCollector:
+    """
+    Collects all sent signals in memory, can be used as context manager
+
+    Example:
+        with EventCollector() as collector:
+            MySerializer(queryset, many=True).data
+        collector.filter('branch_fetched')
+    """
+    def __init__(self):
+        self.events = []
+
+    def receiver(self, signal, sender, **kwargs):
+        name = next(name for name, value in SIGNALS.items() if value is signal)
+        self.events += [dict(kwargs, event=name, sender=sender)]
+
+    def connect(self):
+        for signal in SIGNALS.values():
+            signal.connect(self.receiver, weak=False, dispatch_uid=(id(self), id(signal)))
+
+    def disconnect(self):
+        for signal in SIGNALS.values():
+            signal.disconnect(dispatch_uid=(id(self), id(signal)))
+
+    def filter(self, event):
+        """
+        :param event: str
+        :return: list[dict]
+        """
+        return [value for value in self.events if value['event'] == event]
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
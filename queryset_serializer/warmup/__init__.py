@@ -0,0 +1,148 @@
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils.module_loading import autodiscover_modules
+
+from queryset_serializer.db.models import resolve_lookup
+from queryset_serializer.serializers import (QuerySetSerializer, get_meta,
+                                             get_meta_val)
+
+
+class PlanReport:
+    """
+    Result of checking the plan of a serializer against the _meta of its model
+    """
+    def __init__(self, serializer_class):
+        """
+
+        :param serializer_class: type[QuerySetSerializer]
+        """
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.depth = 0
+        self.queries = 1
+        self.errors = []
+        self.warnings = []
+
+    @property
+    def name(self):
+        return f'{self.serializer_class.__module__}.{self.serializer_class.__qualname__}'
+
+    def check(self):
+        """
+        Check every select / prefetch path of the plan and predict the amount of queries a listing takes:
+        the root queryset, one query per prefetch, one per model of the batched `to one` relations,
+        one per model of a GenericForeignKey and one per relation that is only serialized as ids
+        :return: PlanReport
+        """
+        serializer_class = self.serializer_class
+        plan = serializer_class.database_plan
+        for node in plan.select_nodes():
+            fields = self._resolve(node.lookup, False)
+            if any(field.many_to_many or field.one_to_many for field in fields):
+                self.warnings += [
+                    f"select '{node.lookup}' is a `to many` relation and can't be joined (select_related), "
+                    f"prefetch it instead"
+                ]
+        for node in plan.prefetch_nodes():
+            self._resolve(node.lookup, True)
+        for node in plan.generic_nodes():
+            self._resolve(node.lookup, True)
+            self.queries += len(node.generic)
+        for node in plan.column_nodes():
+            self._resolve(node.lookup, True)
+            self.queries += 1
+
+        self.queries += len(serializer_class._get_prefetch_relations())
+        if plan.batch_nodes() and self._batch_to_one():
+            self.queries += len({
+                getattr(self._field(node.lookup), 'related_model', None) for node in plan.batch_nodes()
+            } - {None})
+        self.depth = max([len(node.path) for node in plan.nodes() if node.explicit] or [0])
+        return self
+
+    def _batch_to_one(self):
+        return get_meta_val(get_meta(self.serializer_class), 'batch_to_one_relations')
+
+    def _field(self, lookup):
+        """
+        :param lookup: str
+        :return: models.Field | None
+        """
+        try:
+            return resolve_lookup(self.model, lookup, True)[-1]
+        except FieldDoesNotExist:
+            return None
+
+    def _resolve(self, lookup, accessor):
+        """
+        :param lookup: str
+        :param accessor: bool
+        :return: list[models.Field]
+        """
+        try:
+            return resolve_lookup(self.model, lookup, accessor)
+        except FieldDoesNotExist as e:
+            self.errors += [f"{'prefetch' if accessor else 'select'} '{lookup}': {e}"]
+            return []
+
+    def warm_up(self):
+        """
+        Compute everything the serializer would otherwise compute on its first use: the rendered plan,
+        the prefixed prefetch paths and the field templates
+        :return: PlanReport
+        """
+        serializer_class = self.serializer_class
+        plan = serializer_class.database_plan
+        for get_nodes in (plan.select_nodes, plan.prefetch_nodes, plan.generic_nodes, plan.batch_nodes,
+                          plan.column_nodes):
+            get_nodes()
+        # SerializerPrefetch caches the prefixed paths (see prefix_lookup)
+        serializer_class._prepare_prefetch_list()
+        if get_meta_val(get_meta(serializer_class), 'share_field_templates'):
+            try:
+                serializer_class().fields
+            except Exception as e:
+                self.errors += [f'fields: {e!r}']
+        return self
+
+    def __str__(self):
+        lines = [f'{self.name} ({self.model._meta.label}): depth {self.depth}, {self.queries} queries']
+        lines += [f'  warning: {warning}' for warning in self.warnings]
+        lines += [f'  error: {error}' for error in self.errors]
+        return '\n'.join(lines)
+
+
+def get_serializer_classes(modules=('serializers',)):
+    """
+    Find every QuerySetSerializer with a (non abstract) model, serializers are only found when their module has been
+    imported. The given modules of every installed app get imported first
+    :param modules: tuple[str], module names that get imported from every installed app
+    :return: list[type[QuerySetSerializer]]
+    """
+    for module in modules:
+        autodiscover_modules(module)
+
+    classes, todo = [], list(QuerySetSerializer.__subclasses__())
+    while todo:
+        serializer_class = todo.pop(0)
+        todo += serializer_class.__subclasses__()
+        model = getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+        if model is not None and not model._meta.abstract and serializer_class not in classes:
+            classes += [serializer_class]
+    return classes
+
+
+def warm_up(serializer_classes=None, modules=('serializers',), raise_errors=True):
+    """
+    Check and precompute the plans of the serializers, so mistakes in database_relations show up at startup instead
+    of at query time and the first request doesn't pay for building them. Can be called from AppConfig.ready
+    :param serializer_classes: list[type[QuerySetSerializer]] | None, None for every serializer that can be found
+    :param modules: tuple[str], see get_serializer_classes
+    :param raise_errors: bool, raise ImproperlyConfigured when a plan has errors
+    :return: list[PlanReport]
+    """
+    if serializer_classes is None:
+        serializer_classes = get_serializer_classes(modules)
+    reports = [PlanReport(serializer_class).check().warm_up() for serializer_class in serializer_classes]
+    if raise_errors and any(report.errors for report in reports):
+        raise ImproperlyConfigured('\n'.join(str(report) for report in reports if report.errors))
+    return reports
@@ -18,13 +18,20 @@ def pytest_configure():
             'django.contrib.auth',
             'django.contrib.contenttypes',
             'django.contrib.staticfiles',
+            'queryset_serializer',
         ],
+        ROOT_URLCONF='tests.urls',
         DATABASES={'default': dict(
             ENGINE='django.db.backends.sqlite3',
             NAME=os.path.join(os.path.curdir, 'd.sqlite'),
             OPTIONS={},
             CONN_MAX_AGE=0,
             TEST={'NAME': 't.db'}
+        ), 'replica': dict(
+            ENGINE='django.db.backends.sqlite3',
+            NAME=os.path.join(os.path.curdir, 'r.sqlite'),
+            OPTIONS={},
+            CONN_MAX_AGE=0,
         )}
     )
     settings.configure(**test_settings)
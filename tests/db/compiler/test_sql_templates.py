@@ -0,0 +1,159 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models.query import ModelIterable
+from django.db.models.sql.compiler import SQLCompiler
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.db.compiler import (SQLTemplateCache,
+                                             compiled_iterable, sql_templates)
+from queryset_serializer.serializers import QuerySetSerializer
+from queryset_serializer.serializers.model import PrefetchSerializerList
+
+
+class TemplatedPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('codename', 'content_type')
+
+
+class TemplatedGroupSerializer(QuerySetSerializer):
+    permissions = TemplatedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        cache_prefetch_sql = True
+
+
+class CompiledGroupSerializer(QuerySetSerializer):
+    permissions = TemplatedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class UnprefixedGroupSerializer(QuerySetSerializer):
+    permissions = TemplatedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        prefetch_listing = PrefetchSerializerList
+        cache_prefetch_sql = True
+
+
+class ContextPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('codename',)
+
+        def prefetch_queryset(queryset, context):
+            return queryset.filter(codename__in=context.get('codenames', []))
+
+
+class ContextGroupSerializer(QuerySetSerializer):
+    permissions = ContextPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        cache_prefetch_sql = True
+
+
+class TestSQLTemplateCache:
+    def test_lru(self):
+        cache = SQLTemplateCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert list(cache.templates) == ['a', 'c']
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_compiled_iterable(self):
+        iterable = compiled_iterable(ModelIterable, (Group, 'permissions'))
+        assert iterable.key == (Group, 'permissions')
+        assert compiled_iterable(ModelIterable, (Group, 'permissions')) is iterable
+        assert compiled_iterable(iterable, (Group, 'other')) is iterable
+
+
+class TestCachedPrefetchSQL:
+    def setup(self):
+        sql_templates.clear()
+        content_types = [
+            ContentType.objects.create(app_label='templated_label', model=f'templated_model_{i}') for i in range(2)
+        ]
+        permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'templated_{i}', content_type=content_types[i % 2])
+            for i in range(4)
+        ]
+        for i in range(4):
+            Group.objects.create(name=f'templated_group_{i}').permissions.add(*permissions[i:i + 2])
+        self.groups = Group.objects.filter(name__startswith='templated_group_').order_by('pk')
+
+    @pytest.fixture()
+    def compiled(self, monkeypatch):
+        calls = []
+        as_sql = SQLCompiler.as_sql
+
+        def counted(compiler, *args, **kwargs):
+            calls.append(compiler.query.model)
+            return as_sql(compiler, *args, **kwargs)
+        monkeypatch.setattr(SQLCompiler, 'as_sql', counted)
+        return calls
+
+    @pytest.mark.django_db()
+    def test_same_data(self):
+        for groups in (self.groups[:2], self.groups[2:]):
+            data = TemplatedGroupSerializer(groups, many=True).data
+            assert data == CompiledGroupSerializer(groups, many=True).data
+
+    @pytest.mark.django_db()
+    def test_templates_reused(self, compiled):
+        TemplatedGroupSerializer(self.groups[:2], many=True).data
+        assert len(sql_templates.templates) == 1
+        del compiled[:]
+        with CaptureQueriesContext(connection) as context:
+            data = TemplatedGroupSerializer(self.groups[2:], many=True).data
+        assert [row['name'] for row in data] == ['templated_group_2', 'templated_group_3']
+        assert [[row['codename'] for row in row['permissions']] for row in data] == [
+            ['templated_2', 'templated_3'], ['templated_3']
+        ]
+        # only the root queryset got compiled, the permissions ran from their template
+        assert compiled == [Group]
+        assert len(context) == 2
+        assert sql_templates.hits == 1
+
+        # another amount of parents is another template
+        TemplatedGroupSerializer(self.groups[:3], many=True).data
+        assert len(sql_templates.templates) == 2
+
+    @pytest.mark.django_db()
+    def test_single_instance(self, compiled):
+        first, second = self.groups[:2]
+        TemplatedGroupSerializer(first).data
+        del compiled[:]
+        data = TemplatedGroupSerializer(second).data
+        assert compiled == []
+        assert data == CompiledGroupSerializer(self.groups.get(pk=second.pk)).data
+
+    @pytest.mark.django_db()
+    def test_context_queryset(self):
+        data = ContextGroupSerializer(self.groups, many=True, context={'codenames': ['templated_1']}).data
+        assert [len(row['permissions']) for row in data] == [1, 1, 0, 0]
+        context = {'codenames': ['templated_2', 'templated_3']}
+        data = ContextGroupSerializer(self.groups, many=True, context=context).data
+        assert [len(row['permissions']) for row in data] == [0, 1, 2, 1]
+        assert sql_templates.templates == {}
+
+    @pytest.mark.django_db()
+    def test_user_lookup(self):
+        # the lookup of the user goes through the permissions of the plan, these run without template
+        groups = self.groups.prefetch_related('permissions__content_type')
+        data = UnprefixedGroupSerializer(groups, many=True).data
+        assert data == CompiledGroupSerializer(self.groups, many=True).data
+        assert sql_templates.templates == {}
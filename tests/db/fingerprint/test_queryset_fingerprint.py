@@ -0,0 +1,107 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.db.fingerprint import QuerySetFingerprint
+from tests.serializer.queryset_serializer_classes import GroupSerializer
+
+
+class TestQuerySetFingerprint:
+    def setup(self):
+        self.content_type = ContentType.objects.create(app_label='fingerprint_label', model='fingerprint_model')
+        self.permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'fingerprint_{i}', content_type=self.content_type)
+            for i in range(3)
+        ]
+        for i in range(3):
+            Group.objects.create(name=f'fingerprint_group_{i}').permissions.add(*self.permissions[:i + 1])
+
+    @pytest.mark.django_db()
+    def test_stable(self):
+        assert GroupSerializer.fingerprint(Group.objects.all()).etag == \
+            GroupSerializer.fingerprint(Group.objects.order_by('-pk')).etag
+
+    @pytest.mark.django_db()
+    def test_extra(self):
+        assert GroupSerializer.fingerprint(Group.objects.all(), 'a').etag != \
+            GroupSerializer.fingerprint(Group.objects.all(), 'b').etag
+
+    @pytest.mark.django_db()
+    def test_relation_changed(self):
+        etag = GroupSerializer.fingerprint(Group.objects.all()).etag
+        Group.objects.get(name='fingerprint_group_0').permissions.add(self.permissions[2])
+        assert GroupSerializer.fingerprint(Group.objects.all()).etag != etag
+
+    @pytest.mark.django_db()
+    def test_updated_in_place(self):
+        # without a version field the columns are part of the fingerprint
+        etag = GroupSerializer.fingerprint(Group.objects.all()).etag
+        Permission.objects.filter(pk=self.permissions[0].pk).update(codename='fingerprint_renamed')
+        assert GroupSerializer.fingerprint(Group.objects.all()).etag != etag
+
+    @pytest.mark.django_db()
+    def test_relation_moved(self):
+        groups = Group.objects.filter(name__in=['fingerprint_group_0', 'fingerprint_group_1'])
+        etag = GroupSerializer.fingerprint(groups).etag
+        # the count, the keys and the columns of the permissions stay the same
+        first, second = groups.order_by('pk')
+        first.permissions.add(self.permissions[1])
+        second.permissions.remove(self.permissions[1])
+        assert GroupSerializer.fingerprint(groups).etag != etag
+
+    @pytest.mark.django_db()
+    def test_relation_moved_versioned(self):
+        groups = Group.objects.filter(name__in=['fingerprint_group_0', 'fingerprint_group_1'])
+        etag = QuerySetFingerprint(groups, ['permissions'], ('codename',)).etag
+        # the count, the keys and the versions of the permissions stay the same, the permission isn't saved
+        first, second = groups.order_by('pk')
+        first.permissions.add(self.permissions[1])
+        second.permissions.remove(self.permissions[1])
+        assert QuerySetFingerprint(groups, ['permissions'], ('codename',)).etag != etag
+
+    @pytest.mark.django_db()
+    def test_row_added(self):
+        etag = GroupSerializer.fingerprint(Group.objects.all()).etag
+        Group.objects.create(name='fingerprint_group_new')
+        assert GroupSerializer.fingerprint(Group.objects.all()).etag != etag
+
+    @pytest.mark.django_db()
+    def test_sliced(self):
+        queryset = Group.objects.order_by('pk')
+        assert GroupSerializer.fingerprint(queryset[:1]).etag != GroupSerializer.fingerprint(queryset[1:2]).etag
+        assert GroupSerializer.fingerprint(queryset[:1]).etag == GroupSerializer.fingerprint(queryset[:1]).etag
+
+    @pytest.mark.django_db()
+    def test_query_count(self):
+        fingerprint = GroupSerializer.fingerprint(Group.objects.all())
+        with CaptureQueriesContext(connection) as context:
+            fingerprint.etag
+            fingerprint.last_modified
+        # one per branch: the groups, the permissions and their content types
+        assert len(context) == 3
+
+    @pytest.mark.django_db()
+    def test_aggregates(self):
+        groups = Group.objects.filter(name__startswith='fingerprint_group_')
+        aggregates = QuerySetFingerprint(groups, ['permissions'], ('codename',)).aggregates()
+        # the groups don't have a version field
+        assert aggregates[None]['count'] == 3
+        assert 'version' not in aggregates[None] and 'rows' in aggregates[None]
+        assert aggregates['permissions']['count'] == 6
+        assert aggregates['permissions']['version'] == 'fingerprint_2'
+        assert 'rows' in aggregates['permissions']
+
+    @pytest.mark.django_db()
+    def test_last_modified(self):
+        # auth models don't have a version field
+        assert GroupSerializer.fingerprint(Group.objects.all()).last_modified is None
+        fingerprint = QuerySetFingerprint(Group.objects.all(), [], ('name',))
+        assert fingerprint.aggregates()[None]['version'] == 'fingerprint_group_2'
+        assert fingerprint.last_modified is None
+
+    @pytest.mark.django_db()
+    def test_complete(self):
+        assert GroupSerializer.fingerprint(Group.objects.all()).complete
+        assert not QuerySetFingerprint(Permission.objects.all(), ['content_type', 'codename'], ()).complete
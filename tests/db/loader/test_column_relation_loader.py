@@ -0,0 +1,230 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, models
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+
+from queryset_serializer.db.loader import RelatedValues, get_column_values
+from queryset_serializer.serializers import (QuerySetMetaSerializer,
+                                             QuerySetSerializer)
+
+
+class IdGroupSerializer(QuerySetSerializer):
+    permissions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    user_set = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions', 'user_set')
+        id_only_relations = True
+
+
+class PlainGroupSerializer(serializers.ModelSerializer):
+    permissions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    user_set = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions', 'user_set')
+
+
+class SlugGroupSerializer(QuerySetSerializer):
+    permissions = serializers.SlugRelatedField(many=True, read_only=True, slug_field='codename')
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        id_only_relations = True
+
+
+class IdContentTypeSerializer(QuerySetSerializer):
+    permission_set = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = ContentType
+        fields = ('model', 'permission_set')
+        id_only_relations = True
+
+
+class GroupIdSerializer(QuerySetSerializer):
+    class Meta:
+        model = Group
+        fields = ('id',)
+
+
+class IdUserSerializer(QuerySetSerializer):
+    groups = GroupIdSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'groups')
+        id_only_relations = True
+
+
+class NestedIdUserSerializer(QuerySetSerializer):
+    groups = SlugGroupSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'groups')
+        id_only_relations = True
+
+
+class FullGroupSerializer(QuerySetSerializer):
+    database_relations = {'select': [], 'prefetch': ['permissions']}
+    permissions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    user_set = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions', 'user_set')
+        id_only_relations = True
+
+
+class DisabledGroupSerializer(QuerySetSerializer):
+    permissions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        id_only_relations = False
+
+
+class DefaultGroupSerializer(QuerySetSerializer):
+    permissions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class Attachment(models.Model):
+    file = models.FileField()
+
+    class Meta:
+        abstract = True
+
+
+class TestColumnNodes:
+    def test_plan(self):
+        assert [(node.lookup, node.columns) for node in IdGroupSerializer.database_plan.column_nodes()] == [
+            ('permissions', ('pk',)), ('user_set', ('pk',))
+        ]
+        assert IdGroupSerializer.database_relations == {'select': [], 'prefetch': []}
+        assert [node.columns for node in SlugGroupSerializer.database_plan.column_nodes()] == [('codename',)]
+        assert [node.columns for node in IdUserSerializer.database_plan.column_nodes()] == [('id',)]
+        assert [node.lookup for node in NestedIdUserSerializer.database_plan.column_nodes()] == [
+            'groups__permissions'
+        ]
+        assert NestedIdUserSerializer.database_relations['prefetch'] == ['groups']
+
+    def test_full_instances_win(self):
+        assert [node.lookup for node in FullGroupSerializer.database_plan.column_nodes()] == ['user_set']
+        assert FullGroupSerializer.database_relations['prefetch'] == ['permissions']
+
+    @pytest.mark.django_db()
+    def test_full_instances_data(self):
+        group = Group.objects.create(name='full_group')
+        group.permissions.add(*Permission.objects.all()[:2])
+        data = FullGroupSerializer(Group.objects.filter(pk=group.pk), many=True).data
+        assert data[0]['permissions'] == PlainGroupSerializer(group).data['permissions']
+
+    def test_disabled(self):
+        assert DisabledGroupSerializer.database_plan.column_nodes() == []
+        assert DefaultGroupSerializer.database_plan.column_nodes() == []
+
+    def test_value_columns(self):
+        assert QuerySetMetaSerializer._is_value_column(Group, 'pk')
+        assert QuerySetMetaSerializer._is_value_column(Group, 'name')
+        # the url of a file needs its storage, a property and a relation are not columns
+        assert not QuerySetMetaSerializer._is_value_column(Attachment, 'file')
+        assert not QuerySetMetaSerializer._is_value_column(ContentType, 'app_labeled_name')
+        assert not QuerySetMetaSerializer._is_value_column(Permission, 'content_type')
+
+
+class TestColumnRelationLoader:
+    def setup(self):
+        content_type = ContentType.objects.create(app_label='column_label', model='column_model')
+        permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'column_{i}', content_type=content_type)
+            for i in range(3)
+        ]
+        for i in range(3):
+            group = Group.objects.create(name=f'column_group_{i}')
+            group.permissions.add(*permissions[:i])
+            for j in range(i):
+                AuthUser.objects.create(username=f'column_user_{i}_{j}').groups.add(group)
+        self.content_type = content_type
+
+    @pytest.mark.django_db()
+    def test_many_to_many(self):
+        expected = PlainGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        with CaptureQueriesContext(connection) as context:
+            data = IdGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        assert sorted(map(dict, data), key=str) == sorted(map(dict, expected), key=str)
+        assert len(context) == 3
+        # only the through table is queried, the permissions are joined for their Meta.ordering only
+        assert context.captured_queries[2]['sql'].startswith('SELECT "auth_user_groups"."group_id"')
+        assert 'JOIN' not in context.captured_queries[2]['sql']
+        assert 'ORDER BY "django_content_type"."app_label"' in context.captured_queries[1]['sql']
+
+    @pytest.mark.django_db()
+    def test_single_instance(self):
+        group = Group.objects.get(name='column_group_2')
+        with CaptureQueriesContext(connection) as context:
+            data = IdGroupSerializer(group).data
+        assert data == PlainGroupSerializer(group).data
+        assert len(context) == 2
+
+    @pytest.mark.django_db()
+    def test_no_instances(self):
+        group = Group.objects.get(name='column_group_2')
+        IdGroupSerializer(group).data
+        related = get_column_values(group, 'permissions')
+        assert len(related) == 2 and all(isinstance(value, RelatedValues) for value in related)
+        # the relation itself is not prefetched, other readers get the model instances
+        assert 'permissions' not in getattr(group, '_prefetched_objects_cache', {})
+        assert all(isinstance(value, Permission) for value in group.permissions.all())
+
+    @pytest.mark.django_db()
+    def test_prefetched_relation(self):
+        group = Group.objects.prefetch_related('permissions').get(name='column_group_2')
+        with CaptureQueriesContext(connection) as context:
+            data = IdGroupSerializer(group).data
+        assert data == PlainGroupSerializer(group).data
+        assert get_column_values(group, 'permissions') is None
+        assert len(context) == 1
+
+    @pytest.mark.django_db()
+    def test_slug(self):
+        data = SlugGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        assert [row['permissions'] for row in data] == [[], ['column_0'], ['column_0', 'column_1']]
+
+    @pytest.mark.django_db()
+    def test_reverse_foreign_key(self):
+        with CaptureQueriesContext(connection) as context:
+            data = IdContentTypeSerializer(ContentType.objects.filter(pk=self.content_type.pk), many=True).data
+        assert data[0]['permission_set'] == list(self.content_type.permission_set.values_list('pk', flat=True))
+        assert len(context) == 2
+
+    @pytest.mark.django_db()
+    def test_nested_serializer(self):
+        users = AuthUser.objects.filter(username__startswith='column_user_').order_by('pk')
+        with CaptureQueriesContext(connection) as context:
+            data = IdUserSerializer(users, many=True).data
+        assert [row['groups'] for row in data] == [[{'id': user.groups.get().pk}] for user in users]
+        assert len(context) == 2
+        assert 'JOIN' not in context.captured_queries[1]['sql']
+
+    @pytest.mark.django_db()
+    def test_nested_plan(self):
+        users = AuthUser.objects.filter(username__startswith='column_user_').order_by('pk')
+        with CaptureQueriesContext(connection) as context:
+            data = NestedIdUserSerializer(users, many=True).data
+        # users, their groups and the codenames of the permissions of the groups
+        assert len(context) == 3
+        assert [row['groups'][0]['permissions'] for row in data] == [
+            ['column_0'], ['column_0', 'column_1'], ['column_0', 'column_1']
+        ]
@@ -0,0 +1,75 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.db.loader import RelationLoader
+from queryset_serializer.db.models import SerializerPrefetch
+from queryset_serializer.serializers.plan import RelationPlan
+from tests.serializer.queryset_serializer_classes import AuthUserSerializer
+
+
+class BatchedAuthUserSerializer(AuthUserSerializer):
+    class Meta(AuthUserSerializer.Meta):
+        batch_to_one_relations = True
+
+
+class TestBatchNodes:
+    def test_batch_nodes(self):
+        assert [node.lookup for node in AuthUserSerializer.database_plan.batch_nodes()] == [
+            'groups__permissions__content_type', 'user_permissions__content_type'
+        ]
+        assert 'user_permissions__content_type' not in BatchedAuthUserSerializer._get_prefetch_relations()
+        assert 'user_permissions__content_type' in AuthUserSerializer._get_prefetch_relations()
+
+
+class TestRelationLoader:
+    def setup(self):
+        self.content_types = [ContentType.objects.create(app_label=f'label_{i}', model='model') for i in range(3)]
+        self.permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'code_{i}', content_type=content_type)
+            for i, content_type in enumerate(self.content_types)
+        ]
+        for i in range(3):
+            group = Group.objects.create(name=f'group_{i}')
+            group.permissions.add(*self.permissions[i:])
+            user = AuthUser.objects.create(username=f'user_{i}')
+            user.groups.add(group)
+            user.user_permissions.add(*self.permissions[:i + 1])
+
+    @pytest.mark.django_db()
+    def test_same_result(self):
+        expected = AuthUserSerializer(AuthUser.objects.order_by('pk'), many=True).data
+        with CaptureQueriesContext(connection) as context:
+            data = BatchedAuthUserSerializer(AuthUser.objects.order_by('pk'), many=True).data
+        assert data == expected
+        # users, groups, group permissions, user permissions and one query for all content types
+        assert len(context) == 5
+
+    @pytest.mark.django_db()
+    def test_single_instance(self):
+        user = AuthUser.objects.get(username='user_2')
+        expected = AuthUserSerializer(user).data
+        with CaptureQueriesContext(connection) as context:
+            data = BatchedAuthUserSerializer(AuthUser.objects.get(username='user_2')).data
+        assert data == expected
+        assert len(context) == 5
+
+    @pytest.mark.django_db()
+    def test_shared_instances(self):
+        groups = list(Group.objects.prefetch_related(SerializerPrefetch('permissions', prefix='PREF_')))
+        plan = RelationPlan()
+        plan.add('permissions', False)
+        plan.add('permissions__content_type', True)
+        with CaptureQueriesContext(connection) as context:
+            RelationLoader(plan.batch_nodes(), 'PREF_').load(groups)
+        assert len(context) == 1
+
+        content_types = {}
+        for group in groups:
+            for permission in group.PREF_permissions:
+                content_type = permission.content_type
+                assert content_types.setdefault(content_type.pk, content_type) is content_type
+        assert len(content_types) == 3
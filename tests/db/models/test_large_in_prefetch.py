@@ -0,0 +1,149 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.db.models import large_in_prefetch
+from queryset_serializer.serializers import QuerySetSerializer
+from queryset_serializer.serializers.model import PrefetchSerializerList
+
+
+class LargeInPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('codename',)
+
+
+class LargeInGroupSerializer(QuerySetSerializer):
+    permissions = LargeInPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class LargeInUserSerializer(QuerySetSerializer):
+    groups = LargeInGroupSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'groups')
+
+
+class ChunkedUserSerializer(LargeInUserSerializer):
+    class Meta(LargeInUserSerializer.Meta):
+        large_prefetch_threshold = 4
+
+
+class SubqueryUserSerializer(LargeInUserSerializer):
+    class Meta(LargeInUserSerializer.Meta):
+        large_prefetch_threshold = 4
+        large_prefetch_subquery = True
+
+
+class UnprefixedGroupSerializer(QuerySetSerializer):
+    permissions = LargeInPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        prefetch_listing = PrefetchSerializerList
+        large_prefetch_threshold = 4
+
+
+def create_users(amount):
+    content_type = ContentType.objects.create(app_label='large_in_label', model='large_in_model')
+    for i in range(amount):
+        group = Group.objects.create(name=f'large_in_group_{i}')
+        group.permissions.add(
+            Permission.objects.create(name='perm', codename=f'large_in_{i}', content_type=content_type)
+        )
+        AuthUser.objects.create(username=f'large_in_user_{i}').groups.add(group)
+    return AuthUser.objects.filter(username__startswith='large_in_user_').order_by('pk')
+
+
+def get_group_queries(context):
+    return [
+        query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT ("auth_user_groups"')
+    ]
+
+
+class TestLargeInPrefetch:
+    @pytest.mark.django_db()
+    def test_chunks(self):
+        users = create_users(10)
+        expected = LargeInUserSerializer(users.all(), many=True).data
+        with CaptureQueriesContext(connection) as context:
+            assert ChunkedUserSerializer(users.all(), many=True).data == expected
+        # users, 3 chunks of groups and 3 chunks of permissions
+        assert len(context) == 7
+        groups = get_group_queries(context)
+        assert [query.split(' IN ')[-1].count(',') + 1 for query in groups] == [4, 4, 2]
+
+    @pytest.mark.django_db()
+    def test_below_threshold(self):
+        users = create_users(4)
+        with CaptureQueriesContext(connection) as context:
+            ChunkedUserSerializer(users.all(), many=True).data
+        assert len(context) == 3
+
+    @pytest.mark.django_db()
+    def test_subquery(self):
+        users = create_users(10)
+        expected = LargeInUserSerializer(users.all(), many=True).data
+        with CaptureQueriesContext(connection) as context:
+            assert SubqueryUserSerializer(users.all(), many=True).data == expected
+        # users, groups with a subquery over the users and 3 chunks of permissions
+        assert len(context) == 5
+        groups, = get_group_queries(context)
+        assert 'IN (SELECT' in groups
+        assert 'large\\_in\\_user\\_%' in groups
+
+    @pytest.mark.django_db()
+    def test_subquery_sliced(self):
+        users = create_users(10)
+        expected = LargeInUserSerializer(users[:8], many=True).data
+        with CaptureQueriesContext(connection) as context:
+            assert SubqueryUserSerializer(users[:8], many=True).data == expected
+        # a sliced queryset falls back to chunks
+        assert len(context) == 5
+
+    @pytest.mark.django_db()
+    def test_instance_list(self):
+        users = list(create_users(10))
+        expected = LargeInUserSerializer(users, many=True).data
+        users = list(AuthUser.objects.filter(pk__in=[user.pk for user in users]).order_by('pk'))
+        with CaptureQueriesContext(connection) as context:
+            assert ChunkedUserSerializer(users, many=True).data == expected
+        assert len(context) == 6
+
+    @pytest.mark.django_db()
+    def test_forward_relation(self):
+        create_users(6)
+        permissions = Permission.objects.filter(codename__startswith='large_in_')
+        prefetch = large_in_prefetch('content_type', Permission, 2, permissions)
+        assert prefetch.queryset.parent_column == 'content_type_id'
+        with CaptureQueriesContext(connection) as context:
+            result = list(permissions.prefetch_related(prefetch))
+        assert len(context) == 2
+        assert {permission.content_type.model for permission in result} == {'large_in_model'}
+
+    @pytest.mark.django_db()
+    def test_subquery_class_cached(self):
+        users = create_users(2)
+        first = large_in_prefetch('groups', AuthUser, 4, users.all())
+        second = large_in_prefetch('groups', AuthUser, 4, users.filter(pk=users[0].pk))
+        assert type(first.queryset) is type(second.queryset)
+        assert first.queryset.parent_queryset is not second.queryset.parent_queryset
+        assert first.queryset.all().parent_column == 'pk'
+
+    @pytest.mark.django_db()
+    def test_user_lookup(self):
+        create_users(6)
+        groups = Group.objects.filter(name__startswith='large_in_group_').order_by('pk')
+        expected = LargeInGroupSerializer(groups, many=True).data
+        # the lookup of the user goes through the permissions of the plan, these can't get a queryset
+        data = UnprefixedGroupSerializer(groups.prefetch_related('permissions__content_type'), many=True).data
+        assert data == expected
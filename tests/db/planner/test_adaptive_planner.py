@@ -0,0 +1,65 @@
+import pytest
+
+from queryset_serializer.db.planner import AdaptivePlanner, BranchStats
+
+
+class TestBranchStats:
+    def test_window(self):
+        stats = BranchStats(2)
+        for rows in [10, 20, 30]:
+            stats.add(rows, 1)
+        assert len(stats) == 2
+        assert stats.rows == 25
+        assert stats.distinct == 1
+        assert stats.duration is None
+
+
+class TestAdaptivePlanner:
+    def setup(self):
+        self.planner = AdaptivePlanner(window=10, max_branches=3, query_cost=100, min_observations=2)
+
+    def test_not_enough_observations(self):
+        self.planner.observe('key', 'a', 100, 1)
+        assert not self.planner.should_prefetch('key', 'a', 10)
+        assert self.planner.explain() == []
+
+    @pytest.mark.parametrize('rows,distinct,width,prefetch', [
+        (100, 1, 10, True),
+        (100, 100, 10, False),
+        (10, 1, 10, False),
+        (20, 1, 10, True),
+    ])
+    def test_should_prefetch(self, rows, distinct, width, prefetch):
+        for _ in range(2):
+            self.planner.observe('key', 'a', rows, distinct)
+        assert self.planner.should_prefetch('key', 'a', width) is prefetch
+        decision, = self.planner.explain('key')
+        assert decision['strategy'] == ('prefetch' if prefetch else 'select')
+        assert decision['saved_cells'] == (rows - distinct) * width
+
+    def test_hysteresis(self):
+        planner = AdaptivePlanner(window=2, query_cost=100, min_observations=2)
+        for _ in range(2):
+            planner.observe('key', 'a', 102, 1)
+        assert planner.should_prefetch('key', 'a', 1)
+        # saves less than the query cost, but more than half of it
+        for _ in range(2):
+            planner.observe('key', 'a', 61, 1)
+        assert planner.should_prefetch('key', 'a', 1)
+        for _ in range(2):
+            planner.observe('key', 'a', 41, 1)
+        assert not planner.should_prefetch('key', 'a', 1)
+
+    def test_max_branches(self):
+        for lookup in ['a', 'b', 'c', 'd']:
+            self.planner.observe('key', lookup, 1, 1)
+        assert self.planner.stats('key', 'a') is None
+        assert len(self.planner.stats('key', 'd')) == 1
+
+    def test_reset(self):
+        for _ in range(2):
+            self.planner.observe('key', 'a', 100, 1)
+        self.planner.should_prefetch('key', 'a', 10)
+        self.planner.reset()
+        assert self.planner.explain() == []
+        assert self.planner.stats('key', 'a') is None
@@ -0,0 +1,109 @@
+import gzip
+import json
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.export import ExportCheckpoint, NDJSONExporter
+from queryset_serializer.serializers import QuerySetSerializer
+
+
+class ExportPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('codename',)
+
+
+class ExportGroupSerializer(QuerySetSerializer):
+    permissions = ExportPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('id', 'name', 'permissions')
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TestNDJSONExporter:
+    def setup(self):
+        content_type = ContentType.objects.create(app_label='export_label', model='export_model')
+        permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'export_{i}', content_type=content_type)
+            for i in range(2)
+        ]
+        for i in range(5):
+            Group.objects.create(name=f'export_group_{i}').permissions.add(*permissions[:i % 3])
+        self.expected = [dict(row) for row in ExportGroupSerializer(Group.objects.order_by('pk'), many=True).data]
+
+    @pytest.fixture(autouse=True)
+    def output(self, tmp_path):
+        self.path = str(tmp_path / 'groups.ndjson.gz')
+
+    def read(self):
+        with gzip.open(self.path, 'rt') as file:
+            return [json.loads(line) for line in file]
+
+    @pytest.mark.django_db()
+    def test_export(self):
+        progress = []
+        with CaptureQueriesContext(connection) as context:
+            checkpoint = NDJSONExporter(ExportGroupSerializer, Group.objects.all(), self.path, batch_size=2).run(
+                progress.append
+            )
+        assert self.read() == self.expected
+        assert (checkpoint.rows, checkpoint.done) == (5, True)
+        # a count, and a query for the groups and their permissions per batch
+        assert len(context) == 1 + 3 * 2
+        assert [value['rows'] for value in progress] == [2, 4, 5]
+        assert all(value['total'] == 5 for value in progress)
+        assert progress[-1]['eta'] == 0
+
+    @pytest.mark.django_db()
+    def test_resume(self):
+        def interrupt(progress):
+            if progress['rows'] == 4:
+                raise Interrupted()
+
+        exporter = NDJSONExporter(ExportGroupSerializer, Group.objects.all(), self.path, batch_size=2)
+        with pytest.raises(Interrupted):
+            exporter.run(interrupt)
+        checkpoint = ExportCheckpoint.load(exporter.checkpoint_path)
+        assert (checkpoint.rows, checkpoint.done) == (4, False)
+        assert checkpoint.last_pk == self.expected[3]['id']
+        # a batch that didn't finish writing
+        with open(self.path, 'ab') as file:
+            file.write(b'partial')
+
+        with CaptureQueriesContext(connection) as context:
+            checkpoint = exporter.run()
+        assert self.read() == self.expected
+        assert (checkpoint.rows, checkpoint.done) == (5, True)
+        assert len(context) == 1 + 2
+
+        # nothing is left to export
+        with CaptureQueriesContext(connection) as context:
+            exporter.run()
+        assert len(context) == 0
+
+    @pytest.mark.django_db()
+    def test_other_serializer(self):
+        NDJSONExporter(ExportGroupSerializer, Group.objects.all(), self.path).run()
+        with pytest.raises(ValueError, match='ExportGroupSerializer'):
+            NDJSONExporter(ExportPermissionSerializer, Permission.objects.all(), self.path).run()
+
+    @pytest.mark.django_db()
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'export_ndjson', 'tests.export.test_ndjson_exporter.ExportGroupSerializer', self.path, '--batch-size', '3',
+            stdout=out
+        )
+        assert self.read() == self.expected
+        assert '3/5 rows' in out.getvalue() and '5/5 rows' in out.getvalue()
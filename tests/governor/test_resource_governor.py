@@ -0,0 +1,165 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models.query import ModelIterable
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.governor import (BudgetExceeded, ResourceGovernor,
+                                          get_governor, governed_iterable)
+from queryset_serializer.serializers import (QuerySetSerializer,
+                                             override_config)
+from queryset_serializer.serializers.model import PrefetchSerializerList
+
+
+class GovernedPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename')
+
+
+class GovernedGroupSerializer(QuerySetSerializer):
+    permissions = GovernedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class LimitedGroupSerializer(QuerySetSerializer):
+    permissions = GovernedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        max_rows = 3
+        max_branch_rows = 10
+
+
+class UnprefixedGroupSerializer(QuerySetSerializer):
+    permissions = GovernedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        prefetch_listing = PrefetchSerializerList
+        max_queries = 50
+
+
+class TestResourceGovernor:
+    def test_no_budgets(self):
+        assert ResourceGovernor.from_meta(GovernedGroupSerializer.Meta) is None
+        assert get_governor() is None
+
+    def test_governed_iterable(self):
+        iterable = governed_iterable(ModelIterable, 'permissions')
+        assert issubclass(iterable, ModelIterable) and iterable.lookup == 'permissions'
+        assert governed_iterable(ModelIterable, 'permissions') is iterable
+        assert governed_iterable(iterable) is iterable
+
+    def test_rows(self):
+        governor = ResourceGovernor(max_rows=1, max_branch_rows=2)
+        governor.add_row()
+        governor.add_row('permissions')
+        governor.add_row('permissions')
+        with pytest.raises(BudgetExceeded) as info:
+            governor.add_row('permissions')
+        assert (info.value.budget, info.value.limit, info.value.lookup) == ('max_branch_rows', 2, 'permissions')
+        assert info.value.usage['branch_rows'] == {'permissions': 3}
+        with pytest.raises(BudgetExceeded, match='max_rows=1'):
+            governor.add_row()
+
+
+class TestGovernedSerialization:
+    def setup(self):
+        content_type = ContentType.objects.create(app_label='governed_label', model='governed_model')
+        permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'governed_{i}', content_type=content_type)
+            for i in range(4)
+        ]
+        for i in range(5):
+            Group.objects.create(name=f'governed_group_{i}').permissions.add(*permissions[:i])
+
+    @pytest.mark.django_db()
+    def test_within_budget(self):
+        serializer = LimitedGroupSerializer(Group.objects.order_by('pk')[:3], many=True)
+        data = serializer.data
+        assert data == GovernedGroupSerializer(Group.objects.order_by('pk')[:3], many=True).data
+        assert serializer.budget_usage['rows'] == 3
+        assert serializer.budget_usage['branch_rows'] == {'permissions': 3}
+        assert serializer.budget_usage['budgets']['max_rows'] == 3
+
+    @pytest.mark.django_db()
+    def test_max_rows(self):
+        with CaptureQueriesContext(connection) as context:
+            with pytest.raises(BudgetExceeded) as info:
+                LimitedGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        assert info.value.budget == 'max_rows' and info.value.sender is LimitedGroupSerializer
+        assert info.value.usage['rows'] == 4
+        # stopped before the permissions got prefetched
+        assert len(context) == 1
+
+    @pytest.mark.django_db()
+    def test_max_branch_rows(self):
+        with override_config(max_rows=None, max_branch_rows=5):
+            with pytest.raises(BudgetExceeded) as info:
+                GovernedGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        assert (info.value.budget, info.value.lookup) == ('max_branch_rows', 'permissions')
+
+    @pytest.mark.django_db()
+    def test_max_queries(self):
+        with override_config(max_queries=1):
+            with pytest.raises(BudgetExceeded) as info:
+                GovernedGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        # raised before the second query got executed
+        assert info.value.budget == 'max_queries' and info.value.usage['queries'] == 2
+        with override_config(max_queries=2):
+            assert len(GovernedGroupSerializer(Group.objects.all(), many=True).data) == 5
+
+    @pytest.mark.django_db()
+    def test_user_lookup(self):
+        # the lookup of the user goes through the permissions of the plan, these can't get a queryset
+        queryset = Group.objects.prefetch_related('permissions__content_type').order_by('pk')
+        serializer = UnprefixedGroupSerializer(queryset, many=True)
+        assert serializer.data == GovernedGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        assert serializer.budget_usage['queries'] == 3
+
+    @pytest.mark.django_db()
+    def test_max_duration(self):
+        with override_config(max_duration=0):
+            with pytest.raises(BudgetExceeded, match='max_duration'):
+                GovernedGroupSerializer(Group.objects.all(), many=True).data
+
+    @pytest.mark.django_db()
+    def test_single_instance(self):
+        group = Group.objects.get(name='governed_group_4')
+        with override_config(max_branch_rows=3):
+            serializer = GovernedGroupSerializer(group)
+            with pytest.raises(BudgetExceeded):
+                serializer.data
+        with override_config(max_branch_rows=4, max_queries=1):
+            serializer = GovernedGroupSerializer(group)
+            assert len(serializer.data['permissions']) == 4
+            # the prefetch of the permissions runs in the governor of the serialization
+            assert serializer.budget_usage['queries'] == 1
+            assert serializer.budget_usage['branch_rows'] == {'permissions': 4}
+
+    @pytest.mark.django_db()
+    def test_instance_list(self):
+        groups = list(Group.objects.order_by('pk'))
+        with override_config(max_queries=0):
+            serializer = GovernedGroupSerializer(groups, many=True)
+            with pytest.raises(BudgetExceeded, match='max_queries'):
+                serializer.data
+        with override_config(max_queries=1):
+            serializer = GovernedGroupSerializer(groups, many=True)
+            assert [len(group['permissions']) for group in serializer.data] == [0, 1, 2, 3, 4]
+            assert serializer.budget_usage['queries'] == 1
+
+    @pytest.mark.django_db()
+    def test_outer_governor(self):
+        with ResourceGovernor(max_queries=10) as governor:
+            GovernedGroupSerializer(Group.objects.all(), many=True).data
+            GovernedGroupSerializer(Group.objects.all(), many=True).data
+        assert governor.usage()['queries'] == 4
+        assert get_governor() is None
@@ -0,0 +1,140 @@
+from io import StringIO
+
+import pytest
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+
+from queryset_serializer.indexes import (IndexReport, advise_indexes,
+                                         get_constraints, get_requirements)
+from queryset_serializer.serializers import QuerySetSerializer
+
+
+class AdvisedLogEntrySerializer(QuerySetSerializer):
+    class Meta:
+        model = LogEntry
+        fields = ('object_repr',)
+
+
+class AdvisedContentTypeSerializer(QuerySetSerializer):
+    class Meta:
+        model = ContentType
+        fields = ('model',)
+
+
+class AdvisedPermissionSerializer(QuerySetSerializer):
+    content_type = AdvisedContentTypeSerializer()
+
+    class Meta:
+        model = Permission
+        fields = ('codename', 'content_type')
+
+
+class AdvisedGroupSerializer(QuerySetSerializer):
+    permissions = AdvisedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class AdvisedNameSerializer(QuerySetSerializer):
+    class Meta:
+        model = Group
+        fields = ('name',)
+
+
+class AdvisedGroupPermissionSerializer(QuerySetSerializer):
+    group_set = AdvisedNameSerializer(many=True)
+
+    class Meta:
+        model = Permission
+        fields = ('codename', 'group_set')
+
+
+class AdvisedUserSerializer(QuerySetSerializer):
+    logentry_set = AdvisedLogEntrySerializer(many=True)
+    groups = AdvisedGroupSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'logentry_set', 'groups')
+
+
+def drop_index(table, column):
+    for name, constraint in get_constraints('default', table).items():
+        if constraint['index'] and not constraint['unique'] and constraint['columns'] == [column]:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP INDEX "{name}"')
+
+
+class TestRequirements:
+    def test_relations(self):
+        through = Group.permissions.through
+        requirements = [
+            (requirement.kind, requirement.model, requirement.columns)
+            for lookup, select in (('permissions', False), ('group_set', False), ('content_type', True))
+            for requirement in get_requirements(
+                Permission if lookup != 'permissions' else Group, lookup, select
+            )
+        ]
+        assert requirements == [
+            ('prefetch', through, ('group_id',)),
+            ('prefetch', through, ('permission_id',)),
+            ('select', ContentType, ('id',)),
+        ]
+        assert get_requirements(Group, 'missing', False) == []
+
+
+class TestIndexAdvisor:
+    @pytest.mark.django_db()
+    def test_indexed(self):
+        report = IndexReport(AdvisedUserSerializer).check()
+        requirements = report.requirements
+        assert [(requirement.lookup, requirement.table, requirement.status) for requirement in requirements] == [
+            ('logentry_set', 'django_admin_log', 'indexed'),
+            ('groups', 'auth_user_groups', 'indexed'),
+            ('groups__permissions', 'auth_group_permissions', 'indexed'),
+            ('groups__permissions__content_type', 'django_content_type', 'indexed'),
+        ]
+        assert report.missing == report.non_leading == []
+
+    @pytest.mark.django_db()
+    def test_missing_and_non_leading(self):
+        drop_index('django_admin_log', 'user_id')
+        # still the second column of the unique (group_id, permission_id)
+        drop_index('auth_group_permissions', 'group_id')
+        drop_index('auth_group_permissions', 'permission_id')
+        report = IndexReport(AdvisedUserSerializer).check()
+        assert [requirement.lookup for requirement in report.missing] == ['logentry_set']
+        assert report.missing[0].suggestion() == (
+            "models.Index(fields=['user'], name='logentry_user_idx') in LogEntry.Meta.indexes"
+        )
+        assert report.non_leading == []
+
+        group_report, permission_report = advise_indexes([AdvisedGroupSerializer, AdvisedGroupPermissionSerializer])
+        assert [str(requirement) for requirement in group_report.requirements] == [
+            "prefetch 'permissions' uses auth_group_permissions (group_id)",
+            "select 'permissions__content_type' uses django_content_type (id)",
+        ]
+        assert group_report.missing == group_report.non_leading == []
+        assert [str(requirement) for requirement in permission_report.non_leading] == [
+            "prefetch 'group_set' uses auth_group_permissions (permission_id)"
+        ]
+
+    @pytest.mark.django_db()
+    def test_command(self):
+        out = StringIO()
+        call_command('advise_indexes', 'tests.indexes.test_index_advisor.AdvisedUserSerializer', stdout=out)
+        assert 'AdvisedUserSerializer (auth.User): 4 branches, 0 missing, 0 non-leading indexes' in out.getvalue()
+        drop_index('django_admin_log', 'user_id')
+        with pytest.raises(CommandError, match='1 serializers, 1 missing, 0 non-leading indexes'):
+            call_command(
+                'advise_indexes', 'tests.indexes.test_index_advisor.AdvisedUserSerializer', '--fail-on-missing',
+                stdout=out
+            )
+        assert "missing: prefetch 'logentry_set' uses django_admin_log (user_id)" in out.getvalue()
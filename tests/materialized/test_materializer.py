@@ -0,0 +1,181 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from queryset_serializer import materialized
+from queryset_serializer.materialized import (Materializer, _registry,
+                                              get_materializer, materialize)
+from queryset_serializer.models import (DirtyRepresentation,
+                                        MaterializedRepresentation)
+from queryset_serializer.serializers import QuerySetSerializer
+
+
+class MaterializedContentTypeSerializer(QuerySetSerializer):
+    class Meta:
+        model = ContentType
+        fields = ('model',)
+
+
+class MaterializedPermissionSerializer(QuerySetSerializer):
+    content_type = MaterializedContentTypeSerializer()
+
+    class Meta:
+        model = Permission
+        fields = ('codename', 'content_type')
+
+
+class MaterializedGroupSerializer(QuerySetSerializer):
+    permissions = MaterializedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class TestMaterializerPaths:
+    def test_paths(self):
+        materializer = Materializer(MaterializedGroupSerializer)
+        assert materializer.key.endswith('test_materializer.MaterializedGroupSerializer')
+        assert materializer.paths == {
+            Group: [''], Permission: ['permissions'], ContentType: ['permissions__content_type']
+        }
+        assert get_materializer(MaterializedGroupSerializer) is None
+
+
+class TestMaterializer:
+    def setup(self):
+        materialize(MaterializedGroupSerializer, batch_size=2)
+        self.materializer = get_materializer(MaterializedGroupSerializer)
+        self.content_type = ContentType.objects.create(app_label='materialized_label', model='materialized_model')
+        self.permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'materialized_{i}', content_type=self.content_type)
+            for i in range(3)
+        ]
+        for i in range(3):
+            Group.objects.create(name=f'materialized_group_{i}').permissions.add(*self.permissions[:i + 1])
+        self.groups = Group.objects.filter(name__startswith='materialized_group_').order_by('-name')
+
+    def teardown(self):
+        # the signal receivers only do work while something is materialized
+        _registry.pop(MaterializedGroupSerializer)
+        del MaterializedGroupSerializer._materializer
+
+    def expected(self):
+        return JSONRenderer().render(MaterializedGroupSerializer(self.groups.all(), many=True).data)
+
+    def dirty(self):
+        return set(DirtyRepresentation.objects.values_list('object_pk', flat=True))
+
+    @pytest.mark.django_db()
+    def test_rebuild(self):
+        # every group got marked when it was created and when its permissions got added
+        assert self.dirty() == {str(pk) for pk in self.groups.values_list('pk', flat=True)}
+        assert self.materializer.rebuild() == 3
+        assert self.dirty() == set()
+        assert MaterializedRepresentation.objects.filter(version=1).count() == 3
+
+        with CaptureQueriesContext(connection) as context:
+            data = MaterializedGroupSerializer(self.groups.all(), many=True).encoded_data
+        assert data == self.expected()
+        # the primary keys and the stored json of both chunks
+        assert len(context) == 3
+
+    @pytest.mark.django_db()
+    def test_changes(self):
+        self.materializer.rebuild()
+        groups = {group.name: str(group.pk) for group in self.groups}
+
+        self.permissions[1].name = 'renamed'
+        self.permissions[1].save()
+        assert self.dirty() == {groups['materialized_group_1'], groups['materialized_group_2']}
+        # the dirty objects are serialized live until they got refreshed
+        assert MaterializedGroupSerializer(self.groups.all(), many=True).encoded_data == self.expected()
+        assert self.materializer.refresh() == 2
+        assert self.dirty() == set()
+
+        self.content_type.model = 'renamed_model'
+        self.content_type.save()
+        assert len(self.dirty()) == 3
+        self.materializer.refresh()
+        assert MaterializedGroupSerializer(self.groups.all(), many=True).encoded_data == self.expected()
+
+        # both sides of the relation are marked, every group with the removed permission
+        Group.objects.get(name='materialized_group_0').permissions.remove(self.permissions[0])
+        assert self.dirty() == set(groups.values())
+        self.materializer.refresh()
+        self.permissions[2].group_set.clear()
+        assert self.dirty() == {groups['materialized_group_2']}
+        self.materializer.refresh()
+        assert MaterializedGroupSerializer(self.groups.all(), many=True).encoded_data == self.expected()
+
+    @pytest.mark.django_db()
+    def test_deleted_and_stale(self):
+        self.materializer.rebuild()
+        Group.objects.get(name='materialized_group_0').delete()
+        self.materializer.refresh()
+        assert MaterializedRepresentation.objects.count() == 2
+
+        MaterializedRepresentation.objects.update(data='{}')
+        self.materializer.version = 2
+        assert MaterializedGroupSerializer(self.groups.all(), many=True).encoded_data == self.expected()
+
+    @pytest.mark.django_db()
+    def test_command(self):
+        out = StringIO()
+        call_command('refresh_materialized', stdout=out)
+        assert 'MaterializedGroupSerializer: 3 objects rendered' in out.getvalue()
+        assert MaterializedRepresentation.objects.count() == 3
+        assert 'materialized_label' not in out.getvalue()
+        with pytest.raises(CommandError, match='is not materialized'):
+            call_command(
+                'refresh_materialized', 'tests.materialized.test_materializer.MaterializedPermissionSerializer'
+            )
+
+    @pytest.mark.django_db()
+    def test_command_autodiscover(self, monkeypatch):
+        # a fresh process only knows the serializers of the modules the command imports
+        imported = []
+
+        def autodiscover_modules(module):
+            imported.append(module)
+            materialize(MaterializedPermissionSerializer)
+        monkeypatch.setattr(materialized, 'autodiscover_modules', autodiscover_modules)
+        out = StringIO()
+        try:
+            call_command('refresh_materialized', '--module', 'materialized', stdout=out)
+        finally:
+            _registry.pop(MaterializedPermissionSerializer)
+            del MaterializedPermissionSerializer._materializer
+        assert imported == ['materialized']
+        assert 'MaterializedPermissionSerializer: 0 objects rendered' in out.getvalue()
+        assert 'MaterializedGroupSerializer: 3 objects rendered' in out.getvalue()
+
+
+@pytest.mark.django_db(databases=['default', 'replica'])
+class TestMaterializerDatabase:
+    def setup(self):
+        materialize(MaterializedGroupSerializer)
+        self.materializer = get_materializer(MaterializedGroupSerializer)
+
+    def teardown(self):
+        _registry.pop(MaterializedGroupSerializer)
+        del MaterializedGroupSerializer._materializer
+
+    def test_mark(self):
+        group = Group.objects.db_manager('replica').create(name='materialized_replica_group')
+        # the queue is stored in the database of the changed object
+        assert list(DirtyRepresentation.objects.using('replica').values_list('object_pk', flat=True)) == [
+            str(group.pk)
+        ]
+        assert not DirtyRepresentation.objects.exists()
+        assert self.materializer.refresh(using='replica') == 1
+        assert not DirtyRepresentation.objects.using('replica').exists()
+        stored = MaterializedRepresentation.objects.using('replica').get()
+        assert stored.object_pk == str(group.pk) and not MaterializedRepresentation.objects.exists()
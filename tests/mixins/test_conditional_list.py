@@ -0,0 +1,72 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import generics
+from rest_framework.test import APIRequestFactory
+
+from queryset_serializer.mixins import ConditionalListModelMixin
+from tests.serializer.queryset_serializer_classes import GroupSerializer
+
+
+class GroupListView(ConditionalListModelMixin, generics.GenericAPIView):
+    queryset = Group.objects.all()
+    serializer_class = GroupSerializer
+    authentication_classes = ()
+    permission_classes = ()
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class TestConditionalListModelMixin:
+    def setup(self):
+        self.view = GroupListView.as_view()
+        self.factory = APIRequestFactory()
+        content_type = ContentType.objects.create(app_label='conditional_label', model='conditional_model')
+        self.permission = Permission.objects.create(name='perm', codename='conditional', content_type=content_type)
+        Group.objects.create(name='conditional_group').permissions.add(self.permission)
+
+    @pytest.mark.django_db()
+    def test_etag(self):
+        response = self.view(self.factory.get('/groups/'))
+        assert response.status_code == 200
+        assert response['ETag'].startswith('"')
+        assert response.data == GroupSerializer(Group.objects.all(), many=True).data
+
+    @pytest.mark.django_db()
+    def test_not_modified(self):
+        etag = self.view(self.factory.get('/groups/'))['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.view(self.factory.get('/groups/', HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 304
+        assert response['ETag'] == etag
+        # only the aggregates of the groups, the permissions and their content types
+        assert len(context) == 3
+
+    @pytest.mark.django_db()
+    def test_weak_etag(self):
+        etag = self.view(self.factory.get('/groups/'))['ETag']
+        assert self.view(self.factory.get('/groups/', HTTP_IF_NONE_MATCH=f'W/{etag}')).status_code == 304
+
+    @pytest.mark.django_db()
+    def test_modified(self):
+        etag = self.view(self.factory.get('/groups/'))['ETag']
+        Group.objects.create(name='conditional_group_2').permissions.add(self.permission)
+        response = self.view(self.factory.get('/groups/', HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+
+    @pytest.mark.django_db()
+    def test_query_string(self):
+        etag = self.view(self.factory.get('/groups/'))['ETag']
+        assert self.view(self.factory.get('/groups/?page=2', HTTP_IF_NONE_MATCH=etag)).status_code == 200
+
+    @pytest.mark.django_db()
+    def test_updated_in_place(self):
+        etag = self.view(self.factory.get('/groups/'))['ETag']
+        Permission.objects.filter(pk=self.permission.pk).update(codename='conditional_renamed')
+        response = self.view(self.factory.get('/groups/', HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 200
+        assert response['ETag'] != etag
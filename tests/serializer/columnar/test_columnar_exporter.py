@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.serializers import QuerySetSerializer
+from tests.serializer.queryset_serializer_classes import ContentTypeSerializer
+
+
+class ColumnarGroupSerializer(QuerySetSerializer):
+    class Meta:
+        model = Group
+        fields = ('id', 'name')
+
+
+class ColumnarPermissionSerializer(QuerySetSerializer):
+    content_type = ContentTypeSerializer()
+    group_set = ColumnarGroupSerializer(many=True)
+
+    class Meta:
+        model = Permission
+        fields = ('codename', 'content_type', 'group_set')
+
+
+def create_permissions(amount):
+    content_type = ContentType.objects.create(app_label='columnar_label', model='columnar_model')
+    for i in range(amount):
+        permission = Permission.objects.create(name='perm', codename=f'columnar_{i}', content_type=content_type)
+        for j in range(i % 3):
+            Group.objects.create(name=f'columnar_group_{i}_{j}').permissions.add(permission)
+    return Permission.objects.filter(codename__startswith='columnar_').order_by('pk')
+
+
+class TestColumnarExporter:
+    @pytest.mark.django_db()
+    def test_names(self):
+        exporter = ColumnarPermissionSerializer(Permission.objects.none(), many=True).columnar()
+        # the order of the fields of the serializer
+        assert exporter.names() == ['codename', 'content_type.app_label', 'content_type.model', 'group_set']
+
+    @pytest.mark.django_db()
+    def test_columns(self):
+        permissions = create_permissions(5)
+        data = ColumnarPermissionSerializer(permissions.all(), many=True).data
+
+        chunks = list(ColumnarPermissionSerializer(permissions.all(), many=True).columnar(chunk_size=2).columns())
+        assert [len(chunk['codename']) for chunk in chunks] == [2, 2, 1]
+        columns = {name: [value for chunk in chunks for value in chunk[name]] for name in chunks[0]}
+        assert columns['codename'] == [row['codename'] for row in data]
+        assert columns['content_type.model'] == [row['content_type']['model'] for row in data]
+        assert columns['group_set'] == [row['group_set'] for row in data]
+
+    @pytest.mark.django_db()
+    def test_query_count(self):
+        permissions = create_permissions(5)
+        with CaptureQueriesContext(connection) as context:
+            list(ColumnarPermissionSerializer(permissions.all(), many=True).columnar(chunk_size=2).columns())
+        # the permissions (with the content types joined) and the groups per chunk
+        assert len(context) == 4
+
+    @pytest.mark.django_db()
+    def test_prefetch_queryset(self):
+        permissions = create_permissions(5)
+        groups = Group.objects.filter(name__endswith='_0')
+        chunks = list(ColumnarPermissionSerializer(
+            permissions.prefetch_related(Prefetch('group_set', queryset=groups)), many=True
+        ).columnar(chunk_size=2).columns())
+        # the queryset of the Prefetch given by the caller is kept
+        assert [len(groups) for chunk in chunks for groups in chunk['group_set']] == [0, 1, 1, 0, 1]
+
+    @pytest.mark.django_db()
+    def test_instance_list(self):
+        permissions = create_permissions(3)
+        chunks = list(ColumnarPermissionSerializer(list(permissions), many=True).columnar().columns())
+        assert chunks[0]['codename'] == ['columnar_0', 'columnar_1', 'columnar_2']
+
+    @pytest.mark.django_db()
+    def test_csv(self):
+        permissions = create_permissions(3)
+        file = io.StringIO()
+        assert ColumnarPermissionSerializer(permissions.all(), many=True).columnar().to_csv(file) == 3
+        rows = list(csv.reader(io.StringIO(file.getvalue())))
+        assert rows[0] == ['codename', 'content_type.app_label', 'content_type.model', 'group_set']
+        assert rows[2][0] == 'columnar_1'
+        assert [group['name'] for group in json.loads(rows[2][3])] == ['columnar_group_1_0']
+        assert rows[2][2] == 'columnar_model'
+
+    @pytest.mark.django_db()
+    def test_arrow(self):
+        pyarrow = pytest.importorskip('pyarrow')
+        permissions = create_permissions(3)
+        file = io.BytesIO()
+        assert ColumnarPermissionSerializer(permissions.all(), many=True).columnar(chunk_size=2).to_arrow(file) == 3
+        table = pyarrow.ipc.open_stream(file.getvalue()).read_all()
+        assert table.column('codename').to_pylist() == ['columnar_0', 'columnar_1', 'columnar_2']
+
+    @pytest.mark.django_db()
+    def test_arrow_null_first_chunk(self):
+        pyarrow = pytest.importorskip('pyarrow')
+        permissions = create_permissions(3)
+        data = ColumnarPermissionSerializer(permissions.all(), many=True).data
+        file = io.BytesIO()
+        # the first permission has no groups, the type of group_set is only known from the second chunk
+        assert ColumnarPermissionSerializer(permissions.all(), many=True).columnar(chunk_size=1).to_arrow(file) == 3
+        table = pyarrow.ipc.open_stream(file.getvalue()).read_all()
+        assert table.schema.field('codename').type == pyarrow.string()
+        assert table.column('group_set').to_pylist() == [
+            [dict(group) for group in row['group_set']] for row in data
+        ]
+
+    def test_fields(self):
+        exporter = ColumnarPermissionSerializer(Permission.objects.none(), many=True).columnar()
+        assert [(name, type(field).__name__) for name, field in exporter.node.fields()] == [
+            ('codename', 'CharField'), ('content_type.app_label', 'CharField'), ('content_type.model', 'CharField'),
+            ('group_set', 'QuerySetListSerializer')
+        ]
+
+    @pytest.mark.django_db()
+    def test_arrow_empty(self):
+        pyarrow = pytest.importorskip('pyarrow')
+        file = io.BytesIO()
+        assert ColumnarPermissionSerializer(Permission.objects.none(), many=True).columnar().to_arrow(file) == 0
+        table = pyarrow.ipc.open_stream(file.getvalue()).read_all()
+        assert table.num_rows == 0
+        assert table.column_names == ['codename', 'content_type.app_label', 'content_type.model', 'group_set']
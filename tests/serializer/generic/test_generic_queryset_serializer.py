@@ -0,0 +1,155 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, models
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.serializers import (QuerySetSerializer,
+                                             override_config)
+from queryset_serializer.serializers.generic import GenericQuerySetSerializer
+from queryset_serializer.signals import EventCollector
+from tests.serializer.queryset_serializer_classes import PermissionSerializer
+
+
+class Activity(models.Model):
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    target = GenericForeignKey()
+
+    class Meta:
+        app_label = 'rest_framework'
+
+
+class ActivityPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename')
+
+
+class ActivityGroupSerializer(QuerySetSerializer):
+    permissions = ActivityPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class ActivityUserSerializer(QuerySetSerializer):
+    groups = ActivityGroupSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'groups')
+
+
+class ActivitySerializer(QuerySetSerializer):
+    target = GenericQuerySetSerializer({AuthUser: ActivityUserSerializer, Group: ActivityGroupSerializer})
+
+    class Meta:
+        model = Activity
+        fields = ('id', 'target')
+
+
+class ActivityContentTypeSerializer(QuerySetSerializer):
+    activity_set = ActivitySerializer(many=True)
+
+    class Meta:
+        model = ContentType
+        fields = ('model', 'activity_set')
+
+
+@pytest.fixture(scope='module')
+def activity_table(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        with connection.schema_editor() as editor:
+            editor.create_model(Activity)
+        yield
+        with connection.schema_editor() as editor:
+            editor.delete_model(Activity)
+
+
+def create_activities(amount):
+    permission = Permission.objects.first()
+    for i in range(amount):
+        group = Group.objects.create(name=f'activity_group_{i}')
+        group.permissions.add(permission)
+        user = AuthUser.objects.create(username=f'activity_user_{i}')
+        user.groups.add(group)
+        Activity.objects.create(target=group)
+        Activity.objects.create(target=user)
+
+
+@pytest.mark.usefixtures('activity_table')
+class TestGenericQuerySetSerializer:
+    def test_database_relations(self):
+        assert ActivitySerializer.database_relations == {'select': [], 'prefetch': []}
+        assert [node.lookup for node in ActivitySerializer.database_plan.generic_nodes()] == ['target']
+        assert [node.lookup for node in ActivityContentTypeSerializer.database_plan.generic_nodes()] == [
+            'activity_set__target'
+        ]
+
+    @pytest.mark.django_db()
+    def test_representation(self):
+        create_activities(2)
+        data = ActivitySerializer(Activity.objects.order_by('pk'), many=True).data
+        for activity, item in zip(Activity.objects.order_by('pk'), data):
+            if isinstance(activity.target, AuthUser):
+                assert item['target'] == ActivityUserSerializer(activity.target).data
+            else:
+                assert item['target'] == ActivityGroupSerializer(activity.target).data
+
+    @pytest.mark.parametrize('amount', [1, 5])
+    @pytest.mark.django_db()
+    def test_query_count(self, amount):
+        create_activities(amount)
+        # make sure the content types are cached
+        ContentType.objects.get_for_models(Activity, AuthUser, Group, Permission)
+
+        with CaptureQueriesContext(connection) as context:
+            ActivitySerializer(Activity.objects.all(), many=True).data
+        # activities, users, user groups, groups, group permissions (twice)
+        assert len(context) == 6
+
+    @pytest.mark.django_db()
+    def test_nested(self):
+        create_activities(3)
+        ContentType.objects.get_for_models(Activity, AuthUser, Group, Permission)
+
+        content_types = ContentType.objects.filter(activity__isnull=False).distinct()
+        with CaptureQueriesContext(connection) as context:
+            data = ActivityContentTypeSerializer(content_types, many=True).data
+        assert len(context) == 7
+        assert sum(len(item['activity_set']) for item in data) == 6
+
+    @pytest.mark.django_db()
+    def test_serialized_once(self):
+        create_activities(2)
+        with EventCollector() as collector, override_config(max_queries=50):
+            serializer = ActivitySerializer(Activity.objects.all(), many=True)
+            serializer.data
+        # the targets are part of the serialization of the activities
+        assert [(event['sender'], event['items']) for event in collector.filter('serialized')] == [
+            (ActivitySerializer, 4)
+        ]
+        children = serializer.child.fields['target']._children.values()
+        assert len(children) == 2 and not any(hasattr(child, 'budget_usage') for child in children)
+        assert serializer.budget_usage['queries'] == 6
+
+    @pytest.mark.django_db()
+    def test_single_instance(self):
+        create_activities(1)
+        activity = Activity.objects.filter(content_type=ContentType.objects.get_for_model(Group)).first()
+        expected = ActivityGroupSerializer(Group.objects.get(pk=activity.object_id)).data
+        assert ActivitySerializer(activity).data['target'] == expected
+
+    @pytest.mark.django_db()
+    def test_missing_serializer(self):
+        Activity.objects.create(target=Permission.objects.first())
+        with pytest.raises(ImproperlyConfigured):
+            ActivitySerializer(Activity.objects.all(), many=True).data
+
+    def test_permission_serializer_unaffected(self):
+        assert PermissionSerializer.database_plan.generic_nodes() == []
@@ -0,0 +1,169 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, re_path
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from queryset_serializer.serializers import QuerySetSerializer
+from queryset_serializer.serializers.hyperlink import (TemplatedHyperlinkMixin,
+                                                       URLTemplate)
+
+
+def view(request, **kwargs):
+    return None
+
+
+urlpatterns = [
+    path('groups/<int:pk>/', view, name='group-detail'),
+    path('permissions/<slug:codename>/', view, name='permission-detail'),
+    path('content-types/<str:model>/', view, name='contenttype-detail'),
+    re_path(r'^users/(?P<username>[a-z_ ]+)/$', view, name='user-detail'),
+]
+
+
+class LinkedGroupSerializer(QuerySetSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='group-detail')
+    permissions = serializers.HyperlinkedRelatedField(
+        many=True, read_only=True, view_name='permission-detail', lookup_field='codename'
+    )
+
+    class Meta:
+        model = Group
+        fields = ('url', 'name', 'permissions')
+        id_only_relations = True
+
+
+class PlainLinkedGroupSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='group-detail')
+    permissions = serializers.HyperlinkedRelatedField(
+        many=True, read_only=True, view_name='permission-detail', lookup_field='codename'
+    )
+
+    class Meta:
+        model = Group
+        fields = ('url', 'name', 'permissions')
+
+
+class LinkedPermissionSerializer(QuerySetSerializer):
+    content_type = serializers.HyperlinkedRelatedField(
+        read_only=True, view_name='contenttype-detail', lookup_field='model', lookup_url_kwarg='model'
+    )
+    group_set = serializers.HyperlinkedRelatedField(many=True, read_only=True, view_name='group-detail')
+
+    class Meta:
+        model = Permission
+        fields = ('codename', 'content_type', 'group_set')
+        id_only_relations = False
+
+
+class LinkedUserSerializer(QuerySetSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='user-detail', lookup_field='username')
+
+    class Meta:
+        model = AuthUser
+        fields = ('url',)
+
+
+class PlainLinkedUserSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='user-detail', lookup_field='username')
+
+    class Meta:
+        model = AuthUser
+        fields = ('url',)
+
+
+class TestHyperlinkPlan:
+    def test_column_relation(self):
+        assert [(node.lookup, node.columns) for node in LinkedGroupSerializer.database_plan.column_nodes()] == [
+            ('permissions', ('codename',))
+        ]
+
+    def test_prefetched_relations(self):
+        assert LinkedPermissionSerializer.database_relations == {'select': ['content_type'], 'prefetch': ['group_set']}
+
+    def test_fields(self):
+        fields = LinkedGroupSerializer().fields
+        assert isinstance(fields['url'], TemplatedHyperlinkMixin)
+        assert isinstance(fields['url'], serializers.HyperlinkedIdentityField)
+        assert isinstance(fields['permissions'].child_relation, TemplatedHyperlinkMixin)
+
+
+@pytest.mark.urls(__name__)
+class TestTemplatedHyperlinks:
+    def setup(self):
+        content_type = ContentType.objects.create(app_label='linked_label', model='linked_model')
+        permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'linked_{i}', content_type=content_type)
+            for i in range(3)
+        ]
+        for i in range(4):
+            Group.objects.create(name=f'linked_group_{i}').permissions.add(*permissions[:i])
+        self.context = {'request': None}
+        self.request = Request(APIRequestFactory().get('/groups/', {'format': 'json'}))
+
+    @pytest.fixture(autouse=True)
+    def reverse_calls(self, monkeypatch):
+        from rest_framework import reverse
+        self.calls = []
+        django_reverse = reverse.django_reverse
+
+        def counted(*args, **kwargs):
+            self.calls += [args]
+            return django_reverse(*args, **kwargs)
+        monkeypatch.setattr(reverse, 'django_reverse', counted)
+
+    @pytest.mark.django_db()
+    def test_same_urls(self):
+        groups = Group.objects.filter(name__startswith='linked_group_').order_by('pk')
+        for context in ({'request': None}, {'request': self.request}):
+            expected = PlainLinkedGroupSerializer(groups.all(), many=True, context=context).data
+            self.calls = []
+            with CaptureQueriesContext(connection) as queries:
+                data = LinkedGroupSerializer(groups.all(), many=True, context=context).data
+            assert data == expected
+            # reversed once per field, the permissions are fetched as codenames only
+            assert len(self.calls) == 2
+            assert len(queries) == 2
+        assert data[1]['url'] == f'http://testserver/groups/{groups[1].pk}/?format=json'
+
+    @pytest.mark.django_db()
+    def test_prefetched_relations(self):
+        permissions = Permission.objects.filter(codename__startswith='linked_').order_by('pk')
+        expected = [
+            {'codename': permission.codename, 'content_type': '/content-types/linked_model/',
+             'group_set': [f'/groups/{group.pk}/' for group in permission.group_set.all()]}
+            for permission in permissions
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            assert LinkedPermissionSerializer(permissions, many=True, context=self.context).data == expected
+        assert len(queries) == 2
+
+    @pytest.mark.django_db()
+    def test_quoted_and_unmatched_values(self):
+        for username in ('linked user', 'linked_user', 'Linked'):
+            AuthUser.objects.create(username=username)
+        users = AuthUser.objects.filter(username__in=['linked user', 'linked_user']).order_by('pk')
+        data = LinkedUserSerializer(users, many=True, context=self.context).data
+        assert data == PlainLinkedUserSerializer(users, many=True, context=self.context).data
+        assert data[0]['url'] == '/users/linked%20user/'
+        # a value that doesn't match the pattern fails the same way as reverse()
+        users = AuthUser.objects.filter(username__in=['linked user', 'linked_user', 'Linked']).order_by('pk')
+        with pytest.raises(ImproperlyConfigured):
+            PlainLinkedUserSerializer(users, many=True, context=self.context).data
+        with pytest.raises(ImproperlyConfigured):
+            LinkedUserSerializer(users, many=True, context=self.context).data
+
+    @pytest.mark.django_db()
+    def test_template(self):
+        group = Group.objects.first()
+        template = URLTemplate.compile('group-detail', 'pk', group.pk, f'/groups/{group.pk}/')
+        assert template.fill(12) == '/groups/12/'
+        assert template.fill('x') is None
+        assert URLTemplate.compile('group-detail', 'pk', group.pk, f'/groups/{group.pk}/', format='json') is None
+        assert URLTemplate.compile('admin:group-detail', 'pk', group.pk, f'/groups/{group.pk}/') is None
@@ -0,0 +1,125 @@
+import pickle
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from queryset_serializer.serializers import (QuerySetSerializer,
+                                             override_config)
+from queryset_serializer.serializers.lazy import LazyReturnList
+
+
+class LazyPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename')
+
+
+class EagerGroupSerializer(QuerySetSerializer):
+    permissions = LazyPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class LazyGroupSerializer(QuerySetSerializer):
+    permissions = LazyPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        lazy_representation = True
+
+
+class TestLazyReturnList:
+    def setup(self):
+        self.calls = []
+        self.data = LazyReturnList(list(range(5)), self.to_representation)
+
+    def to_representation(self, value):
+        self.calls += [value]
+        return {'value': value}
+
+    def test_len(self):
+        assert len(self.data) == 5
+        assert self.calls == []
+
+    def test_index(self):
+        assert self.data[1] == {'value': 1}
+        assert self.data[-1] == {'value': 4}
+        assert self.data[1] == {'value': 1}
+        assert self.calls == [1, 4]
+        assert self.data.serialized == 2
+        with pytest.raises(IndexError):
+            self.data[5]
+
+    def test_slice(self):
+        assert self.data[1:3] == [{'value': 1}, {'value': 2}]
+        assert self.data[::-2] == [{'value': 4}, {'value': 2}, {'value': 0}]
+
+    def test_iterate(self):
+        for item in self.data:
+            if item['value'] == 1:
+                break
+        assert self.calls == [0, 1]
+        assert list(self.data) == [{'value': value} for value in range(5)]
+        assert self.calls == list(range(5))
+
+    def test_list_semantics(self):
+        assert self.data == [{'value': value} for value in range(5)]
+        assert {'value': 3} in self.data
+        assert self.data.index({'value': 3}) == 3
+        assert repr(self.data) == repr([{'value': value} for value in range(5)])
+        assert pickle.loads(pickle.dumps(self.data)) == self.data.tolist()
+
+
+class TestLazyRepresentation:
+    def setup(self):
+        content_type = ContentType.objects.create(app_label='lazy_label', model='lazy_model')
+        permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'lazy_{i}', content_type=content_type)
+            for i in range(3)
+        ]
+        for i in range(4):
+            Group.objects.create(name=f'lazy_group_{i}').permissions.add(*permissions[:i])
+
+    @pytest.mark.django_db()
+    def test_lazy(self):
+        expected = EagerGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        with CaptureQueriesContext(connection) as context:
+            data = LazyGroupSerializer(Group.objects.order_by('pk'), many=True).data
+            assert isinstance(data, LazyReturnList)
+            assert len(data) == 4 and data.serialized == 0
+            assert data[2] == expected[2] and data.serialized == 1
+            assert data == expected
+        # the rows and the prefetches are fetched once
+        assert len(context) == 2
+
+    @pytest.mark.django_db()
+    def test_nested_lists(self):
+        data = LazyGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        assert isinstance(data[1]['permissions'], list)
+
+    @pytest.mark.django_db()
+    def test_render(self):
+        expected = EagerGroupSerializer(Group.objects.order_by('pk'), many=True).data
+        serializer = LazyGroupSerializer(Group.objects.order_by('pk'), many=True)
+        assert serializer.data.serializer is serializer
+        assert JSONRenderer().render(serializer.data) == JSONRenderer().render(expected)
+        assert serializer.encoded_data == JSONRenderer().render(expected)
+
+    @pytest.mark.django_db()
+    def test_override_config(self):
+        with override_config(lazy_representation=True):
+            data = EagerGroupSerializer(Group.objects.order_by('pk'), many=True).data
+            assert isinstance(data, LazyReturnList)
+            assert data[0] == {'name': 'lazy_group_0', 'permissions': []}
+
+    @pytest.mark.django_db()
+    def test_single_instance(self):
+        data = LazyGroupSerializer(Group.objects.first()).data
+        assert not isinstance(data, LazyReturnList)
@@ -0,0 +1,99 @@
+import pytest
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.db.planner import AdaptivePlanner
+from queryset_serializer.serializers import QuerySetSerializer
+from queryset_serializer.serializers.model import \
+    AdaptivePrefetchSerializerList
+from tests.serializer.queryset_serializer_classes import (
+    ContentTypeSerializer, PermissionSerializer)
+
+
+class RecordingPrefetchSerializerList(AdaptivePrefetchSerializerList):
+    planner = AdaptivePlanner(query_cost=10, min_observations=2)
+
+
+class AdaptivePermissionSerializer(QuerySetSerializer):
+    content_type = ContentTypeSerializer()
+
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename', 'content_type')
+        prefetch_listing = RecordingPrefetchSerializerList
+
+
+class SharedMetaPermissionSerializer(QuerySetSerializer):
+    content_type = ContentTypeSerializer()
+
+    Meta = AdaptivePermissionSerializer.Meta
+
+
+class TestAdaptivePrefetchSerializerList:
+    def setup(self):
+        RecordingPrefetchSerializerList.planner.reset()
+        self.key = AdaptivePermissionSerializer
+
+    def create_permissions(self, content_types, amount):
+        content_types = [
+            ContentType.objects.create(app_label='adaptive_label', model=f'adaptive_model_{i}')
+            for i in range(content_types)
+        ]
+        for i in range(amount):
+            Permission.objects.create(
+                name='perm', codename=f'adaptive_{i}', content_type=content_types[i % len(content_types)]
+            )
+        return Permission.objects.filter(codename__startswith='adaptive_').order_by('pk')
+
+    @pytest.mark.django_db()
+    def test_demote_select(self):
+        permissions = self.create_permissions(1, 10)
+        expected = PermissionSerializer(permissions.all(), many=True).data
+
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as context:
+                assert AdaptivePermissionSerializer(permissions.all(), many=True).data == expected
+            assert len(context) == 1
+        stats = RecordingPrefetchSerializerList.planner.stats(self.key, 'content_type')
+        assert (stats.rows, stats.distinct) == (10, 1)
+
+        with CaptureQueriesContext(connection) as context:
+            assert AdaptivePermissionSerializer(permissions.all(), many=True).data == expected
+        # the content type is prefetched instead of joined
+        assert len(context) == 2
+        assert 'JOIN' not in context.captured_queries[0]['sql']
+        decision, = RecordingPrefetchSerializerList.planner.explain(self.key)
+        assert decision['lookup'] == 'content_type'
+        assert decision['strategy'] == 'prefetch'
+        assert decision['width'] == 3
+
+        # the prefetched branch keeps being observed
+        assert len(RecordingPrefetchSerializerList.planner.stats(self.key, 'content_type')) == 3
+
+    @pytest.mark.django_db()
+    def test_keep_select(self):
+        permissions = self.create_permissions(10, 10)
+        for _ in range(3):
+            with CaptureQueriesContext(connection) as context:
+                AdaptivePermissionSerializer(permissions.all(), many=True).data
+            assert len(context) == 1
+        decision, = RecordingPrefetchSerializerList.planner.explain(self.key)
+        assert decision['strategy'] == 'select'
+
+    @pytest.mark.django_db()
+    def test_single_instance(self):
+        permission = self.create_permissions(1, 1).first()
+        assert AdaptivePermissionSerializer(permission).data == PermissionSerializer(permission).data
+
+    @pytest.mark.django_db()
+    def test_per_serializer(self):
+        permissions = self.create_permissions(1, 10)
+        for _ in range(2):
+            AdaptivePermissionSerializer(permissions.all(), many=True).data
+        SharedMetaPermissionSerializer(permissions.all(), many=True).data
+        # the serializers share their Meta, but not their stats
+        assert len(RecordingPrefetchSerializerList.planner.stats(self.key, 'content_type')) == 2
+        assert len(RecordingPrefetchSerializerList.planner.stats(SharedMetaPermissionSerializer, 'content_type')) == 1
+        assert RecordingPrefetchSerializerList.planner.stats(AdaptivePermissionSerializer.Meta, 'content_type') is None
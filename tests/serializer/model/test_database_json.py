@@ -0,0 +1,107 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from queryset_serializer.serializers import QuerySetSerializer
+from queryset_serializer.serializers.model import DatabaseJSONSerializerList
+
+
+class JSONContentTypeSerializer(QuerySetSerializer):
+    class Meta:
+        model = ContentType
+        fields = ('id', 'app_label', 'model')
+        prefetch_listing = DatabaseJSONSerializerList
+
+
+class JSONPermissionSerializer(QuerySetSerializer):
+    content_type = JSONContentTypeSerializer()
+
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename', 'content_type')
+        prefetch_listing = DatabaseJSONSerializerList
+
+
+class JSONGroupSerializer(QuerySetSerializer):
+    permissions = JSONPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        prefetch_listing = DatabaseJSONSerializerList
+
+
+class JSONUserSerializer(QuerySetSerializer):
+    groups = JSONGroupSerializer(many=True)
+    user_permissions = JSONPermissionSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('id', 'username', 'first_name', 'is_active', 'groups', 'user_permissions')
+        prefetch_listing = DatabaseJSONSerializerList
+
+
+class JSONGroupMembersSerializer(JSONGroupSerializer):
+    members = serializers.SlugRelatedField(source='user_set', slug_field='username', many=True, read_only=True)
+
+    class Meta(JSONGroupSerializer.Meta):
+        fields = ('name', 'members')
+
+
+class TestDatabaseJSONSerializerList:
+    def setup(self):
+        content_types = [ContentType.objects.create(app_label=f'json_{i}', model='mé') for i in range(3)]
+        permissions = [
+            Permission.objects.create(name=f'perm "{i}"\n', codename=f'code_{i}', content_type=content_type)
+            for i, content_type in enumerate(content_types)
+        ]
+        groups = [Group.objects.create(name=f'group  {i}') for i in range(3)]
+        for i, group in enumerate(groups):
+            group.permissions.add(*permissions[i:])
+        for i in range(4):
+            user = AuthUser.objects.create(username=f'user_{i}', first_name='üser', is_active=bool(i % 2))
+            user.groups.add(*groups[:i])
+            user.user_permissions.add(*permissions[:i])
+
+    test_data_equivalence = [
+        (JSONUserSerializer, AuthUser),
+        (JSONGroupSerializer, Group),
+        (JSONPermissionSerializer, Permission),
+        (JSONContentTypeSerializer, ContentType),
+    ]
+
+    @pytest.mark.parametrize('serializer_class,model', test_data_equivalence)
+    @pytest.mark.django_db()
+    def test_equivalence(self, serializer_class, model):
+        expected = JSONRenderer().render(serializer_class(model.objects.order_by('pk'), many=True).data)
+
+        serializer = serializer_class(model.objects.order_by('pk'), many=True)
+        with CaptureQueriesContext(connection) as context:
+            encoded = serializer.encoded_data
+        assert encoded == expected
+        assert len(context) == 1
+
+    @pytest.mark.django_db()
+    def test_empty(self):
+        serializer = JSONUserSerializer(AuthUser.objects.none(), many=True)
+        assert serializer.encoded_data == b'[]'
+
+    @pytest.mark.django_db()
+    def test_fallback(self):
+        serializer = JSONGroupMembersSerializer(Group.objects.order_by('pk'), many=True)
+        assert serializer.child._stream_json(serializer.instance) is None
+
+        expected = JSONRenderer().render(JSONGroupMembersSerializer(Group.objects.order_by('pk'), many=True).data)
+        assert serializer.encoded_data == expected
+
+    @pytest.mark.django_db()
+    def test_streaming(self):
+        serializer = JSONContentTypeSerializer(ContentType.objects.order_by('pk'), many=True)
+        chunks = list(serializer.stream_json())
+        assert chunks[0] == b'[' and chunks[-1] == b']'
+        assert len(chunks) == ContentType.objects.count() + 2
@@ -0,0 +1,62 @@
+import pytest
+
+from queryset_serializer.serializers.plan import RelationPlan
+
+
+class TestRelationPlan:
+    test_data_from_relations = [
+        ({'select': ['a', 'a__b'], 'prefetch': ['a__c', 'd']}, ['a', 'a__b'], ['a__c', 'd']),
+        # mentioned twice only results in one lookup
+        ({'select': ['a', 'a'], 'prefetch': ['d', 'd', 'd__e']}, ['a'], ['d', 'd__e']),
+        # a select that is also prefetched will only be selected
+        ({'select': ['a'], 'prefetch': ['a', 'a__b']}, ['a'], ['a__b']),
+        # a select beneath a prefetch can not be joined
+        ({'select': ['d__e'], 'prefetch': ['d']}, [], ['d', 'd__e']),
+        ({'select': [], 'prefetch': []}, [], []),
+    ]
+
+    @pytest.mark.parametrize('relations,expected_select,expected_prefetch', test_data_from_relations)
+    def test_from_relations(self, relations, expected_select, expected_prefetch):
+        rendered = RelationPlan.from_relations(relations).as_relations()
+        assert rendered['select'] == expected_select
+        assert rendered['prefetch'] == expected_prefetch
+
+    test_data_graft = [
+        (False, ['x', 'x__a', 'x__a__b'], ['x__a__c', 'x__d', 'x__d__e']),
+        (True, [], ['x', 'x__a', 'x__a__b', 'x__a__c', 'x__d', 'x__d__e']),
+    ]
+
+    @pytest.mark.parametrize('many,expected_select,expected_prefetch', test_data_graft)
+    def test_graft(self, many, expected_select, expected_prefetch):
+        child = RelationPlan.from_relations({'select': ['a', 'a__b'], 'prefetch': ['a__c', 'd', 'd__e']})
+        plan = RelationPlan()
+        plan.graft('x', child, many, ('a', 'd'))
+        # grafting the same relation twice should not result in duplicates
+        plan.graft('x', child, many)
+
+        rendered = plan.as_relations()
+        assert rendered['select'] == expected_select
+        assert rendered['prefetch'] == expected_prefetch
+        assert plan.children['x'].fields == ('a', 'd')
+
+    def test_nodes_order(self):
+        plan = RelationPlan.from_relations({'select': [], 'prefetch': ['a__b__c', 'd', 'a', 'a__b']})
+        lookups = [node.lookup for node in plan.nodes()]
+        assert lookups == ['a', 'a__b', 'a__b__c', 'd']
+        assert [node.path for node in plan.nodes()][2] == ('a', 'b', 'c')
+
+    test_data_prefixed = [
+        ('a', None, ('P_a', 'P_a')),
+        ('a__b__c', None, ('P_a__P_b__P_c', 'P_c')),
+        ('a__b__c', 'attr', ('P_a__P_b__P_attr', 'P_attr')),
+    ]
+
+    @pytest.mark.parametrize('lookup,to_attr,expected', test_data_prefixed)
+    def test_prefixed(self, lookup, to_attr, expected):
+        node = RelationPlan().add(lookup, False)
+        assert node.prefixed('P_', to_attr) == expected
+
+    def test_as_relations_is_copy(self):
+        plan = RelationPlan.from_relations({'select': ['a'], 'prefetch': []})
+        plan.as_relations()['select'].append('b')
+        assert plan.as_relations()['select'] == ['a']
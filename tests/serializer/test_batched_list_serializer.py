@@ -0,0 +1,151 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+
+from queryset_serializer.serializers import (BatchedListSerializer,
+                                             QuerySetSerializer)
+from queryset_serializer.serializers.model import PrefetchSerializerList
+
+
+class BatchedPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename')
+
+
+class BatchedGroupSerializer(QuerySetSerializer):
+    permissions = BatchedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class BatchedContentTypeSerializer(QuerySetSerializer):
+    permission_set = BatchedPermissionSerializer(many=True)
+
+    class Meta:
+        model = ContentType
+        fields = ('model', 'permission_set')
+
+
+class PlainUserSerializer(serializers.ModelSerializer):
+    groups = BatchedGroupSerializer(many=True)
+    full_name = serializers.CharField(source='get_full_name')
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'full_name', 'groups')
+
+
+class BatchedUserSerializer(PlainUserSerializer):
+    class Meta(PlainUserSerializer.Meta):
+        list_serializer_class = BatchedListSerializer
+
+
+class BatchedPlainPermissionSerializer(serializers.ModelSerializer):
+    content_type = BatchedContentTypeSerializer()
+
+    class Meta:
+        model = Permission
+        fields = ('codename', 'content_type')
+        list_serializer_class = BatchedListSerializer
+
+
+class NestedGroupUserSerializer(QuerySetSerializer):
+    groups = BatchedGroupSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'groups')
+        prefetch_listing = PrefetchSerializerList
+
+
+class DottedSourceSerializer(serializers.ModelSerializer):
+    siblings = BatchedPermissionSerializer(source='content_type.permission_set', many=True)
+
+    class Meta:
+        model = Permission
+        fields = ('codename', 'siblings')
+
+
+def create_users(amount):
+    content_type = ContentType.objects.create(app_label='batched_label', model='batched_model')
+    permissions = [
+        Permission.objects.create(name=f'perm_{i}', codename=f'batched_{i}', content_type=content_type)
+        for i in range(3)
+    ]
+    for i in range(amount):
+        group = Group.objects.create(name=f'batched_group_{i}')
+        group.permissions.add(*permissions[:i % 3 + 1])
+        AuthUser.objects.create(username=f'batched_user_{i}').groups.add(group)
+
+
+class TestBatchedListSerializer:
+    @pytest.mark.parametrize('amount', [1, 5])
+    @pytest.mark.django_db()
+    def test_query_count(self, amount):
+        create_users(amount)
+        with CaptureQueriesContext(connection) as context:
+            BatchedUserSerializer(AuthUser.objects.filter(username__startswith='batched_user_'), many=True).data
+        # users, groups and permissions
+        assert len(context) == 3
+
+    @pytest.mark.django_db()
+    def test_same_as_unbatched(self):
+        create_users(4)
+        users = AuthUser.objects.filter(username__startswith='batched_user_').order_by('pk')
+        expected = PlainUserSerializer(users, many=True).data
+        with CaptureQueriesContext(connection) as context:
+            assert BatchedUserSerializer(users, many=True).data == expected
+        assert len(context) < 3 * len(expected)
+
+    @pytest.mark.parametrize('amount', [1, 5])
+    @pytest.mark.django_db()
+    def test_to_one(self, amount):
+        create_users(1)
+        for i in range(amount):
+            content_type = ContentType.objects.create(app_label='batched_label', model=f'batched_model_{i}')
+            Permission.objects.create(name='perm', codename=f'batched_to_one_{i}', content_type=content_type)
+
+        permissions = Permission.objects.filter(codename__startswith='batched_').order_by('pk')
+        expected = [
+            {'codename': permission.codename, 'content_type': BatchedContentTypeSerializer(
+                ContentType.objects.get(pk=permission.content_type_id)
+            ).data} for permission in permissions
+        ]
+        with CaptureQueriesContext(connection) as context:
+            data = BatchedPlainPermissionSerializer(permissions.all(), many=True).data
+        # permissions, content types and the permissions of the content types
+        assert len(context) == 3
+        assert data == expected
+
+    @pytest.mark.django_db()
+    def test_prefetched_instance(self):
+        create_users(1)
+        group = Group.objects.get(name='batched_group_0')
+        expected = BatchedGroupSerializer(group).data
+        with CaptureQueriesContext(connection) as context:
+            # the plan is already loaded on the instance, django skips the relations that are cached
+            assert BatchedGroupSerializer(group).data == expected
+        assert len(context) == 0
+
+    @pytest.mark.django_db()
+    def test_is_prefetched(self):
+        create_users(1)
+        group = Group.objects.prefetch_related('permissions').get(name='batched_group_0')
+        assert BatchedGroupSerializer._is_prefetched(group)
+        assert not BatchedGroupSerializer._is_prefetched(Group.objects.get(name='batched_group_0'))
+        user = AuthUser.objects.get(username='batched_user_0')
+        # every level of the plan is checked, the permissions of the groups are not loaded yet
+        users = AuthUser.objects.filter(pk=user.pk)
+        assert not NestedGroupUserSerializer._is_prefetched(users.prefetch_related('groups').get())
+        assert NestedGroupUserSerializer._is_prefetched(users.prefetch_related('groups__permissions').get())
+
+    def test_dotted_source(self):
+        # a relation of a relation is serialized per row
+        assert BatchedListSerializer._get_nested(DottedSourceSerializer()) == []
@@ -0,0 +1,112 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, models
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.serializers import QuerySetSerializer
+from queryset_serializer.serializers.model import PrefetchSerializerList
+
+
+class DefaultRouter:
+    """
+    Router that reads everything from the default database, like a router for a primary / replica setup would
+    """
+    def db_for_read(self, model, **hints):
+        return 'default'
+
+
+class AliasPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename')
+
+
+class AliasGroupSerializer(QuerySetSerializer):
+    permissions = AliasPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class UnprefixedGroupSerializer(QuerySetSerializer):
+    permissions = AliasPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        prefetch_listing = PrefetchSerializerList
+
+
+class ReplicaGroupSerializer(AliasGroupSerializer):
+    class Meta(AliasGroupSerializer.Meta):
+        database_alias = 'replica'
+
+
+@pytest.mark.django_db(databases=['default', 'replica'])
+class TestDatabaseAlias:
+    @pytest.fixture(autouse=True)
+    def router(self, settings):
+        settings.DATABASE_ROUTERS = [f'{__name__}.DefaultRouter']
+
+    def setup(self):
+        content_type = ContentType.objects.db_manager('replica').create(app_label='alias_label', model='alias_model')
+        permissions = [
+            Permission.objects.db_manager('replica').create(
+                name=f'perm_{i}', codename=f'alias_{i}', content_type=content_type
+            ) for i in range(2)
+        ]
+        for i in range(2):
+            Group.objects.db_manager('replica').create(name=f'alias_group_{i}').permissions.add(*permissions)
+
+    def test_root_database(self):
+        groups = Group.objects.using('replica').filter(name__startswith='alias_group_').order_by('pk')
+        with CaptureQueriesContext(connections['default']) as context:
+            data = AliasGroupSerializer(groups, many=True).data
+        assert len(context) == 0
+        assert [len(group['permissions']) for group in data] == [2, 2]
+
+    def test_user_prefetch(self):
+        groups = Group.objects.using('replica').filter(name__startswith='alias_group_').prefetch_related(
+            models.Prefetch('permissions', queryset=Permission.objects.order_by('-codename'))
+        )
+        with CaptureQueriesContext(connections['default']) as context:
+            data = AliasGroupSerializer(groups, many=True).data
+        assert len(context) == 0
+        assert [permission['codename'] for permission in data[0]['permissions']] == ['alias_1', 'alias_0']
+
+    def test_user_lookup_through_plan(self):
+        # the lookup of the user goes through the permissions of the plan, the permissions are routed once
+        groups = Group.objects.using('replica').filter(name__startswith='alias_group_').prefetch_related(
+            'permissions__content_type', 'permissions'
+        )
+        with CaptureQueriesContext(connections['default']) as context:
+            data = UnprefixedGroupSerializer(groups, many=True).data
+        assert len(context) == 0
+        assert [len(group['permissions']) for group in data] == [2, 2]
+        assert {permission.content_type.model for permission in data.serializer.instance[0].permissions.all()} == {
+            'alias_model'
+        }
+
+    def test_database_alias(self):
+        with CaptureQueriesContext(connections['default']) as context:
+            data = ReplicaGroupSerializer(Group.objects.filter(name__startswith='alias_group_'), many=True).data
+        assert len(context) == 0
+        assert [len(group['permissions']) for group in data] == [2, 2]
+
+    def test_database_alias_single_instance(self):
+        group = Group.objects.using('replica').get(name='alias_group_0')
+        group._state.db = 'default'
+        with CaptureQueriesContext(connections['default']) as context:
+            data = ReplicaGroupSerializer(group).data
+        assert len(context) == 0
+        assert len(data['permissions']) == 2
+
+    def test_database_alias_fingerprint(self):
+        fingerprint = ReplicaGroupSerializer.fingerprint(Group.objects.filter(name__startswith='alias_group_'))
+        assert fingerprint.aggregates()['permissions']['count'] == 4
+
+    def test_without_root_database(self):
+        # without using() the router decides, the groups only exist on the replica
+        assert AliasGroupSerializer(Group.objects.filter(name__startswith='alias_group_'), many=True).data == []
@@ -0,0 +1,103 @@
+import copy
+from unittest import mock
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from rest_framework import serializers
+
+from queryset_serializer.serializers import (QuerySetSerializer, copy_field,
+                                             get_meta, get_meta_val)
+from tests.serializer.queryset_serializer_classes import (AuthUserSerializer,
+                                                          GroupSerializer)
+
+
+class TemplatePermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename')
+
+
+class TemplateGroupSerializer(QuerySetSerializer):
+    permissions = TemplatePermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('id', 'name', 'permissions')
+        share_field_templates = True
+
+
+class OwnedGroupSerializer(QuerySetSerializer):
+    owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
+    class Meta:
+        model = Group
+        fields = ('name', 'owner')
+        share_field_templates = True
+
+
+class UnsharedGroupSerializer(TemplateGroupSerializer):
+    class Meta(TemplateGroupSerializer.Meta):
+        share_field_templates = False
+
+
+class TestFieldTemplates:
+    def test_built_once(self):
+        TemplateGroupSerializer().fields
+        with mock.patch.object(serializers.ModelSerializer, 'get_fields') as get_fields:
+            for _ in range(3):
+                TemplateGroupSerializer().fields
+        assert get_fields.call_count == 0
+
+    def test_unshared(self):
+        UnsharedGroupSerializer().fields
+        with mock.patch('copy.deepcopy', wraps=copy.deepcopy) as deepcopy:
+            UnsharedGroupSerializer().fields
+        assert deepcopy.call_count > 0
+
+    def test_no_deepcopy(self):
+        TemplateGroupSerializer().fields
+        with mock.patch('copy.deepcopy', wraps=copy.deepcopy) as deepcopy:
+            TemplateGroupSerializer().fields
+        assert deepcopy.call_count == 0
+
+    def test_per_class(self):
+        assert list(TemplateGroupSerializer().fields) == ['id', 'name', 'permissions']
+        assert list(TemplatePermissionSerializer().fields) == ['name', 'codename']
+
+    def test_bound_per_instance(self):
+        first = TemplateGroupSerializer(context={'name': 'first'})
+        second = TemplateGroupSerializer(context={'name': 'second'})
+        assert first.fields['name'] is not second.fields['name']
+        assert first.fields['permissions'].parent is first
+        assert first.fields['permissions'].child.parent is first.fields['permissions']
+        assert first.fields['permissions'].child.context == {'name': 'first'}
+        assert second.fields['permissions'].child.context == {'name': 'second'}
+        assert first.fields['permissions'].child.fields['name'].root is first
+
+    def test_copy_field(self):
+        field = serializers.ListField(child=serializers.CharField())
+        clone = copy_field(field)
+        assert clone is not field
+        assert clone.child is not field.child
+        assert clone.child.parent is clone
+        assert clone.error_messages == field.error_messages and clone.error_messages is not field.error_messages
+
+    def test_request_state_not_shared(self):
+        first, second = OwnedGroupSerializer(context={}), OwnedGroupSerializer(context={})
+        assert first.fields['owner'].default is not second.fields['owner'].default
+        assert first.fields['owner'].style is not second.fields['owner'].style
+
+    def test_disabled_by_default(self):
+        assert not get_meta_val(get_meta(TemplatePermissionSerializer), 'share_field_templates')
+
+    @pytest.mark.django_db()
+    def test_data(self):
+        group = Group.objects.create(name='template_group')
+        group.permissions.add(*Permission.objects.all()[:2])
+        assert TemplateGroupSerializer(Group.objects.all(), many=True).data == \
+            UnsharedGroupSerializer(Group.objects.all(), many=True).data
+        user = AuthUser.objects.create(username='template_user')
+        user.groups.add(group)
+        assert AuthUserSerializer(AuthUser.objects.all(), many=True).data[0]['groups'] == \
+            GroupSerializer(Group.objects.all(), many=True).data
@@ -0,0 +1,106 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import generics, pagination
+from rest_framework.test import APIRequestFactory
+
+from queryset_serializer.serializers import QuerySetSerializer
+from tests.serializer.queryset_serializer_classes import PermissionSerializer
+
+
+class ListPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename')
+
+
+class ListGroupSerializer(QuerySetSerializer):
+    permissions = ListPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class ListUserSerializer(QuerySetSerializer):
+    groups = ListGroupSerializer(many=True)
+    user_permissions = ListPermissionSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'groups', 'user_permissions')
+
+
+class UserPagination(pagination.PageNumberPagination):
+    page_size = 3
+
+
+class UserListView(generics.ListAPIView):
+    queryset = AuthUser.objects.filter(username__startswith='list_user_').order_by('pk')
+    serializer_class = ListUserSerializer
+    pagination_class = UserPagination
+    authentication_classes = ()
+    permission_classes = ()
+
+
+def create_users(amount):
+    content_type = ContentType.objects.create(app_label='list_label', model='list_model')
+    permissions = [
+        Permission.objects.create(name=f'perm_{i}', codename=f'list_{i}', content_type=content_type)
+        for i in range(3)
+    ]
+    for i in range(amount):
+        group = Group.objects.create(name=f'list_group_{i}')
+        group.permissions.add(*permissions)
+        user = AuthUser.objects.create(username=f'list_user_{i}')
+        user.groups.add(group)
+        user.user_permissions.add(permissions[i % 3])
+
+
+class TestInstanceList:
+    @pytest.mark.parametrize('amount', [1, 5])
+    @pytest.mark.django_db()
+    def test_query_count(self, amount):
+        create_users(amount)
+        users = list(AuthUser.objects.filter(username__startswith='list_user_').order_by('pk'))
+        with CaptureQueriesContext(connection) as context:
+            ListUserSerializer(users, many=True).data
+        # groups, group permissions and user permissions
+        assert len(context) == 3
+
+    @pytest.mark.django_db()
+    def test_same_as_queryset(self):
+        create_users(3)
+        queryset = AuthUser.objects.filter(username__startswith='list_user_').order_by('pk')
+        expected = ListUserSerializer(queryset, many=True).data
+        assert ListUserSerializer(list(queryset.all()), many=True).data == expected
+        assert ListUserSerializer(tuple(queryset.all()), many=True).data == expected
+        assert ListUserSerializer((user for user in queryset.all()), many=True).data == expected
+
+    @pytest.mark.django_db()
+    def test_select(self):
+        create_users(1)
+        permissions = list(Permission.objects.filter(codename__startswith='list_'))
+        with CaptureQueriesContext(connection) as context:
+            data = PermissionSerializer(permissions, many=True).data
+        # the content types are fetched with one query instead of joined
+        assert len(context) == 1
+        assert {permission['content_type']['model'] for permission in data} == {'list_model'}
+
+    @pytest.mark.django_db()
+    def test_empty(self):
+        assert ListUserSerializer([], many=True).data == []
+
+    @pytest.mark.django_db()
+    def test_pagination(self):
+        create_users(5)
+        view = UserListView.as_view()
+        with CaptureQueriesContext(connection) as context:
+            response = view(APIRequestFactory().get('/users/'))
+        assert response.status_code == 200
+        assert [user['username'] for user in response.data['results']] == ['list_user_0', 'list_user_1', 'list_user_2']
+        # count, page, groups, group permissions and user permissions
+        assert len(context) == 5
@@ -0,0 +1,193 @@
+import threading
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+
+from queryset_serializer.serializers import (QuerySetSerializer, check_parent,
+                                             get_budget_overrides, get_meta,
+                                             get_meta_val, get_scoped_meta,
+                                             override_config)
+from queryset_serializer.serializers.model import (
+    PrefetchSerializerList, PrefetchToAttrSerializerList)
+
+
+class ScopedPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('codename',)
+
+
+class ScopedGroupSerializer(QuerySetSerializer):
+    permissions = ScopedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class ScopedUserSerializer(QuerySetSerializer):
+    groups = ScopedGroupSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'groups')
+
+
+class PlainGroupSerializer(QuerySetSerializer):
+    permissions = ScopedPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        prefetch_listing = PrefetchSerializerList
+
+
+class PlainUserSerializer(QuerySetSerializer):
+    groups = PlainGroupSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'groups')
+        prefetch_listing = PrefetchSerializerList
+
+
+class TestScopedMeta:
+    def test_override(self):
+        assert get_meta_val(get_meta(ScopedUserSerializer), 'prefetch_listing') is PrefetchToAttrSerializerList
+        with override_config(prefetch_listing=PrefetchSerializerList):
+            meta = get_meta(ScopedUserSerializer)
+            assert get_meta_val(meta, 'prefetch_listing') is PrefetchSerializerList
+            assert meta is get_meta(ScopedUserSerializer)
+            assert issubclass(meta, ScopedUserSerializer.Meta)
+        assert get_meta(ScopedUserSerializer) is ScopedUserSerializer.Meta
+
+    def test_nested(self):
+        with override_config(prefetch_to_attr_prefix='A_', batch_to_one_relations=True):
+            with override_config(prefetch_to_attr_prefix='B_'):
+                meta = get_meta(ScopedUserSerializer)
+                assert get_meta_val(meta, 'prefetch_to_attr_prefix') == 'B_'
+                assert get_meta_val(meta, 'batch_to_one_relations') is True
+            assert get_meta_val(get_meta(ScopedUserSerializer), 'prefetch_to_attr_prefix') == 'A_'
+
+    def test_unknown(self):
+        with pytest.raises(TypeError, match='prefetch_lsting'):
+            with override_config(prefetch_lsting=PrefetchSerializerList):
+                pass
+
+    def test_unhashable(self):
+        with override_config(fingerprint_version_fields=['updated_at']):
+            meta = get_meta(ScopedUserSerializer)
+            assert get_meta_val(meta, 'fingerprint_version_fields') == ('updated_at',)
+            assert meta is get_meta(ScopedUserSerializer)
+        with pytest.raises(TypeError, match='fingerprint_version_fields'):
+            with override_config(fingerprint_version_fields={'updated_at': 1}):
+                pass
+
+    def test_class_option(self):
+        with pytest.raises(TypeError, match='id_only_relations'):
+            with override_config(id_only_relations=True):
+                pass
+
+    def test_budgets(self):
+        with override_config(max_duration=2.5, max_rows=10):
+            assert get_meta(ScopedUserSerializer) is ScopedUserSerializer.Meta
+            with override_config(prefetch_listing=PrefetchSerializerList, max_rows=20):
+                assert get_meta(ScopedUserSerializer).scoped_options == (('prefetch_listing', PrefetchSerializerList),)
+                assert get_budget_overrides() == {'max_duration': 2.5, 'max_rows': 20}
+            assert get_budget_overrides() == {'max_duration': 2.5, 'max_rows': 10}
+            assert ScopedUserSerializer._has_budgets()
+        assert get_budget_overrides() == {}
+        assert not ScopedUserSerializer._has_budgets()
+
+    def test_bounded(self):
+        assert get_scoped_meta.cache_info().maxsize is not None
+
+    def test_check_parent(self):
+        serializer = ScopedPermissionSerializer()
+        serializer.bind('permission', serializers.Serializer())
+        assert check_parent(serializer)
+        # the parent is one of the (scoped) base serializers, it applies the plan itself
+        with override_config(base_serializer_class=serializers.Serializer):
+            assert not check_parent(serializer)
+
+    def test_thread_local(self):
+        listings = {}
+        entered, done = threading.Event(), threading.Event()
+
+        def serve():
+            entered.wait()
+            listings['thread'] = get_meta_val(get_meta(ScopedUserSerializer), 'prefetch_listing')
+            done.set()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        with override_config(prefetch_listing=PrefetchSerializerList):
+            entered.set()
+            done.wait()
+            listings['main'] = get_meta_val(get_meta(ScopedUserSerializer), 'prefetch_listing')
+        thread.join()
+        assert listings == {'thread': PrefetchToAttrSerializerList, 'main': PrefetchSerializerList}
+
+
+class TestScopedSerializer:
+    def setup(self):
+        content_type = ContentType.objects.create(app_label='scoped_label', model='scoped_model')
+        permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'scoped_{i}', content_type=content_type)
+            for i in range(2)
+        ]
+        for i in range(2):
+            group = Group.objects.create(name=f'scoped_group_{i}')
+            group.permissions.add(*permissions)
+            AuthUser.objects.create(username=f'scoped_user_{i}').groups.add(group)
+
+    def serialize(self, serializer_class):
+        with CaptureQueriesContext(connection) as context:
+            serializer = serializer_class(AuthUser.objects.order_by('pk'), many=True)
+            data = serializer.data
+        assert len(context) == 3
+        return serializer.instance, data
+
+    @pytest.mark.django_db()
+    def test_prefetch_listing(self):
+        users, expected = self.serialize(ScopedUserSerializer)
+        assert hasattr(users[0], 'PREF_groups')
+
+        with override_config(prefetch_listing=PrefetchSerializerList):
+            users, data = self.serialize(ScopedUserSerializer)
+        assert data == expected
+        assert not hasattr(users[0], 'PREF_groups')
+        assert 'groups' in users[0]._prefetched_objects_cache
+
+        # the class itself is unchanged
+        assert ScopedUserSerializer().fields['groups'].source == 'PREF_groups'
+
+    @pytest.mark.django_db()
+    def test_prefix(self):
+        _, expected = self.serialize(ScopedUserSerializer)
+        with override_config(prefetch_to_attr_prefix='SCOPED_'):
+            users, data = self.serialize(ScopedUserSerializer)
+            assert ScopedUserSerializer().fields['groups'].source == 'SCOPED_groups'
+        assert data == expected
+        assert hasattr(users[0], 'SCOPED_groups') and hasattr(users[0].SCOPED_groups[0], 'SCOPED_permissions')
+
+    @pytest.mark.django_db()
+    def test_to_attr(self):
+        _, expected = self.serialize(PlainUserSerializer)
+        with override_config(prefetch_listing=PrefetchToAttrSerializerList):
+            users, data = self.serialize(PlainUserSerializer)
+        assert data == expected
+        assert hasattr(users[0], 'PREF_groups') and hasattr(users[0].PREF_groups[0], 'PREF_permissions')
+        assert PlainUserSerializer().fields['groups'].source == 'groups'
+
+    @pytest.mark.django_db()
+    def test_unshared(self):
+        _, expected = self.serialize(ScopedUserSerializer)
+        with override_config(prefetch_listing=PrefetchSerializerList, share_field_templates=False):
+            _, data = self.serialize(ScopedUserSerializer)
+        assert data == expected
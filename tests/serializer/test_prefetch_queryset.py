@@ -0,0 +1,137 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Prefetch, Value
+from django.db.models.functions import Concat
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+
+from queryset_serializer.serializers import (BatchedListSerializer,
+                                             QuerySetSerializer,
+                                             override_config)
+from queryset_serializer.serializers.model import PrefetchSerializerList
+
+
+class ContentTypeModelSerializer(QuerySetSerializer):
+    class Meta:
+        model = ContentType
+        fields = ('model',)
+
+
+class ActivePermissionSerializer(QuerySetSerializer):
+    label = serializers.CharField(read_only=True)
+    content_type = ContentTypeModelSerializer()
+
+    class Meta:
+        model = Permission
+        fields = ('codename', 'label', 'content_type')
+        prefetch_queryset = Permission.objects.filter(codename__startswith='active_').order_by('-codename').annotate(
+            label=Concat('codename', Value('!'))
+        )
+
+
+class ContextPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('codename', 'name')
+
+        def prefetch_queryset(queryset, context):
+            return queryset.filter(codename__in=context.get('codenames', [])).order_by('codename')
+
+
+class ActiveGroupSerializer(QuerySetSerializer):
+    permissions = ActivePermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class ContextGroupSerializer(QuerySetSerializer):
+    permissions = ContextPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        id_only_relations = True
+
+
+class PlainGroupSerializer(serializers.ModelSerializer):
+    permissions = ActivePermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        list_serializer_class = BatchedListSerializer
+
+
+class TestPrefetchQuerysetPlan:
+    def test_plan(self):
+        nodes = ActiveGroupSerializer.database_plan.queryset_nodes()
+        assert list(nodes) == ['permissions']
+        assert nodes['permissions'].joined_lookups() == ['content_type']
+        assert ActiveGroupSerializer.database_relations == {
+            'select': [], 'prefetch': ['permissions', 'permissions__content_type']
+        }
+
+    def test_single_column(self):
+        # a filtered relation can't be fetched as columns only
+        assert ContextGroupSerializer.database_plan.column_nodes() == []
+
+
+class TestPrefetchQueryset:
+    def setup(self):
+        content_type = ContentType.objects.create(app_label='pq_label', model='pq_model')
+        permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'{state}_{i}', content_type=content_type)
+            for i, state in enumerate(['active', 'inactive', 'active', 'inactive'])
+        ]
+        Group.objects.create(name='pq_group').permissions.add(*permissions)
+        self.groups = Group.objects.filter(name='pq_group')
+        self.expected = [
+            {'codename': codename, 'label': f'{codename}!', 'content_type': {'model': 'pq_model'}}
+            for codename in ('active_2', 'active_0')
+        ]
+
+    @pytest.mark.django_db()
+    def test_filtered_ordered_annotated(self):
+        with CaptureQueriesContext(connection) as context:
+            data = ActiveGroupSerializer(self.groups, many=True).data
+        assert data[0]['permissions'] == self.expected
+        # the groups and the filtered permissions, their content types are joined
+        assert len(context) == 2
+        assert 'LIKE' in context.captured_queries[1]['sql']
+        assert 'JOIN "django_content_type"' in context.captured_queries[1]['sql']
+
+    @pytest.mark.django_db()
+    def test_context(self):
+        data = ContextGroupSerializer(self.groups, many=True, context={'codenames': ['inactive_3', 'active_0']}).data
+        assert [row['codename'] for row in data[0]['permissions']] == ['active_0', 'inactive_3']
+        assert ContextGroupSerializer(self.groups, many=True).data[0]['permissions'] == []
+
+    @pytest.mark.django_db()
+    def test_instances(self):
+        group = self.groups.get()
+        assert ActiveGroupSerializer(group).data['permissions'] == self.expected
+        data = ContextGroupSerializer([self.groups.get()], many=True, context={'codenames': ['active_2']}).data
+        assert [row['codename'] for row in data[0]['permissions']] == ['active_2']
+
+    @pytest.mark.django_db()
+    def test_prefetch_listing(self):
+        with override_config(prefetch_listing=PrefetchSerializerList):
+            data = ActiveGroupSerializer(self.groups, many=True).data
+        assert data[0]['permissions'] == self.expected
+
+    @pytest.mark.django_db()
+    def test_given_prefetch_is_kept(self):
+        queryset = Permission.objects.filter(codename='active_0').annotate(label=Concat('codename', Value('?')))
+        data = ActiveGroupSerializer(self.groups.prefetch_related(Prefetch('permissions', queryset)), many=True).data
+        assert [row['label'] for row in data[0]['permissions']] == ['active_0?']
+
+    @pytest.mark.django_db()
+    def test_plain_parent(self):
+        with CaptureQueriesContext(connection) as context:
+            data = PlainGroupSerializer(self.groups, many=True).data
+        assert data[0]['permissions'] == self.expected
+        assert len(context) == 3
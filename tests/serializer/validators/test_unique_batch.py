@@ -0,0 +1,140 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+
+from queryset_serializer.serializers import (QuerySetSerializer,
+                                             override_config)
+from queryset_serializer.serializers.validators import (BatchedValidatorMixin,
+                                                        get_unique_batch,
+                                                        has_exact_comparison,
+                                                        is_batchable)
+
+
+class UniqueGroupSerializer(QuerySetSerializer):
+    class Meta:
+        model = Group
+        fields = ('name',)
+        batch_unique_validation = True
+
+
+class UniquePermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename', 'content_type')
+        batch_unique_validation = True
+
+
+class PlainPermissionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Permission
+        fields = ('name', 'codename', 'content_type')
+
+
+class CaseInsensitiveValidator(UniqueValidator):
+    def filter_queryset(self, value, queryset):
+        return queryset.filter(name__iexact=value)
+
+
+class TestIsBatchable:
+    def test_validators(self):
+        queryset = Group.objects.all()
+        assert is_batchable(UniqueValidator(queryset))
+        assert not is_batchable(UniqueValidator(queryset, lookup='iexact'))
+        assert not is_batchable(CaseInsensitiveValidator(queryset))
+        assert not is_batchable(object())
+
+
+class TestExactComparison:
+    def test_fields(self):
+        assert has_exact_comparison(Group, 'id', connection)
+        assert has_exact_comparison(Permission, 'content_type', connection)
+        assert not has_exact_comparison(Permission, 'group', connection)
+        assert not has_exact_comparison(Group, 'unknown', connection)
+
+    def test_text(self):
+        assert has_exact_comparison(Group, 'name', connection) == (connection.vendor in ('postgresql', 'sqlite'))
+        mysql = type('Connection', (), {'vendor': 'mysql'})()
+        assert not has_exact_comparison(Group, 'name', mysql)
+
+
+class TestUniqueBatch:
+    def setup(self):
+        self.content_type = ContentType.objects.create(app_label='unique_label', model='unique_model')
+        Group.objects.create(name='unique_existing')
+        Permission.objects.create(name='existing', codename='unique_existing', content_type=self.content_type)
+        self.permissions = [
+            {'name': f'perm_{i}', 'codename': f'unique_{i}', 'content_type': self.content_type.pk} for i in range(5)
+        ]
+
+    @pytest.mark.django_db()
+    def test_single_query_per_constraint(self):
+        serializer = UniquePermissionSerializer(data=self.permissions, many=True)
+        with CaptureQueriesContext(connection) as context:
+            assert serializer.is_valid(), serializer.errors
+        # the unique together check, and the content type of every item
+        assert len([query for query in context if 'IN' in query['sql']]) == 1
+        assert len(context) == 6
+        assert isinstance(serializer.child.validators[0], BatchedValidatorMixin)
+        assert get_unique_batch() is None
+
+    @pytest.mark.django_db()
+    def test_same_errors(self):
+        data = self.permissions + [
+            {'name': 'again', 'codename': 'unique_existing', 'content_type': self.content_type.pk},
+            {'name': 'missing'},
+        ]
+        serializer = UniquePermissionSerializer(data=data, many=True)
+        assert not serializer.is_valid()
+        plain = PlainPermissionSerializer(data=data, many=True)
+        assert not plain.is_valid()
+        assert serializer.errors == plain.errors
+        assert serializer.errors[5] == {
+            'non_field_errors': ['The fields content_type, codename must make a unique set.']
+        }
+
+    @pytest.mark.django_db()
+    def test_unique_field(self):
+        data = [{'name': 'unique_new'}, {'name': 'unique_existing'}, {'name': ''}, {'name': 'unique_other'}]
+        with CaptureQueriesContext(connection) as context:
+            serializer = UniqueGroupSerializer(data=data, many=True)
+            assert not serializer.is_valid()
+        assert len(context) == 1
+        assert serializer.errors == [
+            {}, {'name': ['group with this name already exists.']}, {'name': ['This field may not be blank.']}, {}
+        ]
+
+    @pytest.mark.django_db()
+    def test_duplicates_in_payload(self):
+        data = [{'name': 'unique_new'}, {'name': 'unique_other'}, {'name': 'unique_new'}]
+        serializer = UniqueGroupSerializer(data=data, many=True)
+        assert not serializer.is_valid()
+        assert serializer.errors == [{}, {}, {'name': ['group with this name already exists.']}]
+
+    @pytest.mark.django_db()
+    def test_inexact_collation(self, monkeypatch):
+        # the existing values could differ in case, every item queries
+        monkeypatch.setattr(connection, 'vendor', 'mysql')
+        data = [{'name': 'UNIQUE_EXISTING'}, {'name': 'unique_new'}]
+        with CaptureQueriesContext(connection) as context:
+            serializer = UniqueGroupSerializer(data=data, many=True)
+            serializer.is_valid()
+        assert len(context) == 2
+        assert not any(
+            isinstance(validator, BatchedValidatorMixin) for validator in serializer.child.fields['name'].validators
+        )
+
+    @pytest.mark.django_db()
+    def test_disabled(self):
+        data = [{'name': f'unique_{i}'} for i in range(3)]
+        with override_config(batch_unique_validation=False):
+            with CaptureQueriesContext(connection) as context:
+                assert UniqueGroupSerializer(data=data, many=True).is_valid()
+        assert len(context) == 3
+        # a single item still queries, also with a batched validator
+        with CaptureQueriesContext(connection) as context:
+            assert UniqueGroupSerializer(data=data[0]).is_valid()
+        assert len(context) == 1
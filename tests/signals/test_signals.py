@@ -0,0 +1,111 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.query import ModelIterable
+
+from queryset_serializer.serializers import QuerySetSerializer
+from queryset_serializer.serializers.model import PrefetchSerializerList
+from queryset_serializer.signals import (EventCollector, has_listeners,
+                                         plan_prepared)
+from tests.serializer.queryset_serializer_classes import (AuthUserSerializer,
+                                                          GroupSerializer,
+                                                          PermissionSerializer)
+
+
+class UnprefixedGroupSerializer(QuerySetSerializer):
+    permissions = PermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+        prefetch_listing = PrefetchSerializerList
+
+
+class TestEventCollector:
+    def test_no_listeners(self):
+        assert not has_listeners()
+        with EventCollector():
+            assert has_listeners()
+        assert not has_listeners()
+
+    def test_plan_built(self):
+        with EventCollector() as collector:
+            class SignalGroupSerializer(QuerySetSerializer):
+                class Meta:
+                    model = Group
+                    fields = ('name',)
+
+        assert collector.filter('plan_prepared') == [{
+            'event': 'plan_prepared', 'sender': SignalGroupSerializer, 'cached': False, 'select': [], 'prefetch': []
+        }]
+
+    def test_disconnect(self):
+        collector = EventCollector()
+        collector.connect()
+        collector.disconnect()
+        assert not plan_prepared.has_listeners()
+
+
+class TestInstrumentation:
+    def setup(self):
+        content_type = ContentType.objects.create(app_label='signal_label', model='signal_model')
+        permissions = [
+            Permission.objects.create(name=f'perm_{i}', codename=f'signal_{i}', content_type=content_type)
+            for i in range(3)
+        ]
+        for i in range(2):
+            group = Group.objects.create(name=f'signal_group_{i}')
+            group.permissions.add(*permissions)
+            user = AuthUser.objects.create(username=f'signal_user_{i}')
+            user.groups.add(group)
+            user.user_permissions.add(permissions[i])
+
+    @pytest.mark.django_db()
+    def test_not_instrumented(self):
+        serializer = AuthUserSerializer(AuthUser.objects.all(), many=True)
+        assert serializer.instance._iterable_class is ModelIterable
+
+    @pytest.mark.django_db()
+    def test_branch_fetched(self):
+        expected = AuthUserSerializer(AuthUser.objects.order_by('pk'), many=True).data
+        with EventCollector() as collector:
+            data = AuthUserSerializer(AuthUser.objects.order_by('pk'), many=True).data
+        assert data == expected
+
+        rows = {event['lookup']: event['rows'] for event in collector.filter('branch_fetched')}
+        assert rows[None] == 2
+        assert rows['groups'] == 2
+        assert rows['groups__permissions'] == 6
+        assert rows['user_permissions'] == 2
+        assert all(event['sender'] is AuthUserSerializer for event in collector.filter('branch_fetched'))
+        assert all(event['queries'] == 1 for event in collector.filter('branch_fetched'))
+
+    @pytest.mark.django_db()
+    def test_plan_and_serialized(self):
+        with EventCollector() as collector:
+            GroupSerializer(Group.objects.all(), many=True).data
+            GroupSerializer(Group.objects.first()).data
+
+        plans = collector.filter('plan_prepared')
+        assert plans and all(event['cached'] for event in plans)
+        assert plans[0]['prefetch'] == GroupSerializer.database_relations['prefetch']
+
+        assert [event['items'] for event in collector.filter('serialized')] == [2, 1]
+        assert all(event['duration'] >= 0 for event in collector.filter('serialized'))
+
+    @pytest.mark.django_db()
+    def test_encoded(self):
+        with EventCollector() as collector:
+            data = GroupSerializer(Group.objects.all(), many=True).encoded_data
+        assert collector.filter('encoded')[0]['size'] == len(data)
+
+    @pytest.mark.django_db()
+    def test_user_lookup(self):
+        # the lookup of the user goes through the permissions of the plan, these can't get a queryset
+        queryset = Group.objects.prefetch_related('permissions__content_type').order_by('pk')
+        expected = UnprefixedGroupSerializer(queryset.all(), many=True).data
+        with EventCollector() as collector:
+            data = UnprefixedGroupSerializer(queryset.all(), many=True).data
+        assert data == expected
+        assert [event['lookup'] for event in collector.filter('branch_fetched')] == [None]
@@ -0,0 +1,133 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import User as AuthUser
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from queryset_serializer.serializers import QuerySetSerializer
+from queryset_serializer.warmup import (PlanReport, get_serializer_classes,
+                                        resolve_lookup, warm_up)
+from tests.serializer.queryset_serializer_classes import UserSerializer
+
+
+class WarmUpPermissionSerializer(QuerySetSerializer):
+    class Meta:
+        model = Permission
+        fields = ('codename',)
+
+
+class WarmUpGroupSerializer(QuerySetSerializer):
+    permissions = WarmUpPermissionSerializer(many=True)
+
+    class Meta:
+        model = Group
+        fields = ('name', 'permissions')
+
+
+class WarmUpUserSerializer(QuerySetSerializer):
+    groups = WarmUpGroupSerializer(many=True)
+    user_permissions = WarmUpPermissionSerializer(many=True)
+
+    class Meta:
+        model = AuthUser
+        fields = ('username', 'groups', 'user_permissions')
+
+
+class BrokenSerializer(QuerySetSerializer):
+    database_relations = {'select': ['permissions'], 'prefetch': ['permissions__nope', 'user']}
+
+    class Meta:
+        model = Group
+        fields = ('name',)
+
+
+class TestResolveLookup:
+    def test_forward(self):
+        assert [field.name for field in resolve_lookup(AuthUser, 'groups__permissions__content_type')] == [
+            'groups', 'permissions', 'content_type'
+        ]
+
+    def test_accessor(self):
+        assert resolve_lookup(Group, 'user_set', True)[0].related_model is AuthUser
+        with pytest.raises(Exception, match="prefetched as 'user_set'"):
+            resolve_lookup(Group, 'user', True)
+        assert resolve_lookup(Group, 'user')[0].related_model is AuthUser
+
+    def test_missing(self):
+        with pytest.raises(Exception, match="has no relation 'nope'"):
+            resolve_lookup(AuthUser, 'groups__nope')
+
+
+class TestPlanReport:
+    def test_valid(self):
+        report = PlanReport(WarmUpUserSerializer).check()
+        assert report.errors == [] and report.warnings == []
+        assert report.depth == 2
+        assert report.queries == 4
+
+    def test_broken(self):
+        report = PlanReport(BrokenSerializer).check()
+        assert len(report.warnings) == 1 and "'permissions'" in report.warnings[0]
+        assert len(report.errors) == 2
+        assert "'permissions__nope'" in str(report) and "'user_set'" in str(report)
+
+    @pytest.mark.django_db()
+    def test_predicted_queries(self):
+        content_type = ContentType.objects.create(app_label='warmup_label', model='warmup_model')
+        permission = Permission.objects.create(name='warmup', codename='warmup', content_type=content_type)
+        group = Group.objects.create(name='warmup_group')
+        group.permissions.add(permission)
+        for i in range(3):
+            user = AuthUser.objects.create(username=f'warmup_user_{i}')
+            user.groups.add(group)
+            user.user_permissions.add(permission)
+
+        with CaptureQueriesContext(connection) as context:
+            WarmUpUserSerializer(AuthUser.objects.all(), many=True).data
+        assert len(context) == PlanReport(WarmUpUserSerializer).check().queries
+
+
+class TestWarmUp:
+    def test_field_templates(self):
+        class WarmUpTemplateSerializer(QuerySetSerializer):
+            class Meta:
+                model = Group
+                fields = ('name',)
+                share_field_templates = True
+
+        report, = warm_up([WarmUpTemplateSerializer])
+        assert report.errors == []
+        assert list(WarmUpTemplateSerializer.__dict__['_field_templates']) == ['name']
+
+    def test_raise_errors(self):
+        with pytest.raises(ImproperlyConfigured, match='BrokenSerializer'):
+            warm_up([WarmUpUserSerializer, BrokenSerializer])
+        reports = warm_up([WarmUpUserSerializer, BrokenSerializer], raise_errors=False)
+        assert [bool(report.errors) for report in reports] == [False, True]
+
+    def test_get_serializer_classes(self):
+        classes = get_serializer_classes()
+        assert WarmUpUserSerializer in classes and BrokenSerializer in classes
+        # the model of this serializer is abstract
+        assert UserSerializer not in classes
+
+
+class TestWarmUpCommand:
+    def test_report(self):
+        out = StringIO()
+        call_command('warmup_serializers', 'tests.warmup.test_warmup.WarmUpUserSerializer', stdout=out)
+        assert 'WarmUpUserSerializer (auth.User): depth 2, 4 queries' in out.getvalue()
+        assert '1 serializers, 0 errors, 0 warnings' in out.getvalue()
+
+    def test_errors(self):
+        out = StringIO()
+        with pytest.raises(CommandError, match='1 serializers, 2 errors, 1 warnings'):
+            call_command('warmup_serializers', 'tests.warmup.test_warmup.BrokenSerializer', stdout=out)
+        assert "warning: select 'permissions'" in out.getvalue()
+        assert "error: prefetch 'user'" in out.getvalue()